@@ -0,0 +1,423 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# asyncio counterparts of the blocking node and cluster operations
+#
+# These coroutines back Node.astart(), Node.astop(), Node.awatch_log_for(),
+# Node.await_binary_interface(), Node.anodetool() and their Cluster
+# equivalents, so that many nodes can be driven from a single event loop.
+# Everything that waits (log tailing, pid files, sockets, processes) yields
+# to the loop; the short configuration steps run inline. This module needs
+# python 3.5+ and is only imported when one of those methods is called.
+#
+
+import asyncio
+import functools
+import os
+import shlex
+import signal
+import time
+import warnings
+
+from ccmlib import common, cqlprobe, extension, gossip, procwatch, timeline
+from ccmlib.logarchive import RotatingLogReader
+from ccmlib.logmatch import MultiPatternMatcher
+from ccmlib.logtail import LogCapture, file_change_waiter
+from ccmlib.node import (NODE_STOP_TIMEOUT_IN_SECS, NODE_WAIT_TIMEOUT_IN_SECS, NodeError, TimeoutError, ToolError,
+                         _current_marks, _gossip_expectations, _gossip_tracker_for)
+from six import string_types
+
+# lines read from a log before yielding to the event loop
+_LINES_PER_STEP = 1000
+
+
+class FileChangeWaiter(object):
+    """
+    Waits for log files to change without blocking the event loop: the inotify
+    descriptor of the underlying waiter is registered with the loop, and
+    waiting falls back to asyncio.sleep() when inotify cannot be used.
+    """
+
+    def __init__(self, paths):
+        self._waiter = file_change_waiter(paths)
+        self._loop = asyncio.get_event_loop()
+        self._changed = asyncio.Event()
+        self._fd = self._waiter.fileno()
+        if self._fd is not None:
+            self._loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self):
+        if self._waiter.drain():
+            self._changed.set()
+
+    async def wait(self, timeout):
+        """
+        Returns True as soon as a watched file changes, or False after timeout
+        seconds.
+        """
+        if self._fd is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._changed.clear()
+
+    def close(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._waiter.close()
+
+
+def _check_process(node, process, verbose):
+    # returns True once the output of a terminated process was printed
+    process.poll()
+    if process.returncode is None:
+        return False
+    node.print_process_output(node.name, process, verbose)
+    if process.returncode != 0:
+        raise RuntimeError()  # same as Node.watch_log_for
+    return True
+
+
+async def watch_log_for(node, exprs, from_mark=None, timeout=600, process=None, verbose=False,
+                        filename='system.log', error_on_pid_terminated=False):
+    """
+    Coroutine version of Node.watch_log_for, with the same arguments, result
+    and errors.
+    """
+    start = time.time()
+    tofind = MultiPatternMatcher([exprs] if isinstance(exprs, string_types) else exprs)
+    if tofind.is_done():
+        return None
+    matchings = []
+    capture = LogCapture(node.watch_log_for_head_lines, node.watch_log_for_tail_lines)
+    log_file = os.path.join(node.log_directory(), filename)
+    output_read = False
+
+    waiter = FileChangeWaiter([log_file])
+    try:
+        while not os.path.exists(log_file):
+            await waiter.wait(.5)
+            TimeoutError.raise_if_passed(start=start, timeout=timeout, node=node.name,
+                                         msg="Timed out waiting for {} to be created.".format(log_file))
+            if process and not output_read:
+                output_read = _check_process(node, process, verbose)
+
+        with RotatingLogReader(log_file, from_mark) as reader:
+            while True:
+                if process and not output_read and not common.is_win():
+                    output_read = _check_process(node, process, verbose)
+
+                read = 0
+                while True:
+                    next_line = reader.readline()
+                    if next_line is None:
+                        break
+                    _, line = next_line
+                    capture.add(line)
+                    match_start = time.time()
+                    for _, m in tofind.match(line):
+                        matchings.append((line, m))
+                    if tofind.is_done():
+                        return matchings[0] if isinstance(exprs, string_types) else matchings
+                    capture.match_time += time.time() - match_start
+                    read += 1
+                    if read == _LINES_PER_STEP:
+                        break
+
+                if read == _LINES_PER_STEP:
+                    # more to read, let the other tasks run in between
+                    await asyncio.sleep(0)
+                    continue
+
+                await waiter.wait(1)
+
+                if error_on_pid_terminated:
+                    node.raise_node_error_if_cassandra_process_is_terminated()
+
+                TimeoutError.raise_if_passed(start=start, timeout=timeout, node=node.name, stats=capture.stats(),
+                                             msg="Missing: {exprs} not found in {f} ({lines} lines, {bytes} bytes read):\n{reads}"
+                                             .format(exprs=[e.pattern for e in tofind.pending()], f=filename,
+                                                     lines=capture.lines_read, bytes=capture.bytes_read,
+                                                     reads=capture.format()))
+
+                if process and not error_on_pid_terminated:
+                    if common.is_win():
+                        if not node.is_running():
+                            return None
+                    else:
+                        process.poll()
+                        if process.returncode == 0:
+                            common.debug("{pid} or its child process terminated. watch_for_logs() for {l} will not continue.".format(
+                                pid=process.pid, l=[e.pattern for e in tofind.pending()]))
+                            return None
+    finally:
+        waiter.close()
+
+
+async def watch_logs_for_gossip(expectations, state, timeout, filename='system.log'):
+    """
+    Coroutine version of node.watch_logs_for_alive (state is gossip.UP) and
+    node.watch_logs_for_death (state is gossip.DOWN).
+    """
+    expectations = _gossip_expectations(expectations)
+    if not expectations:
+        return
+    if timeout is None:
+        timeout = max(node.watch_log_for_alive_timeout for node, _, _ in expectations)
+    tracker = _gossip_tracker_for(expectations, filename)
+    if tracker is None:
+        await asyncio.gather(*[watch_log_for(node, node._alive_exprs(others) if state == gossip.UP else node._death_exprs(others),
+                                             from_mark=mark, timeout=timeout, filename=filename)
+                               for node, others, mark in expectations])
+        return
+    expectations = _current_marks(expectations, filename)
+    start = time.time()
+    while True:
+        # the tracker answers from memory, so it is just asked again until done
+        missing = tracker.wait_for(expectations, state, 0)
+        if not missing:
+            return
+        if time.time() - start > timeout:
+            missing = ["{}: {}".format(node.name, [other.name for other in others]) for node, others in missing]
+            raise TimeoutError.create(start=start, timeout=timeout,
+                                      msg="Nodes not seen {state} in {f}:\n {missing}".format(
+                                          state=state, f=filename, missing="\n ".join(missing)))
+        await asyncio.sleep(.1)
+
+
+async def check_socket_listening(itf, timeout=60):
+    """
+    Coroutine version of common.check_socket_listening.
+    """
+    end = time.time() + timeout
+    while time.time() <= end:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(itf[0], itf[1]), max(end - time.time(), .2))
+            writer.close()
+            return True
+        except (OSError, asyncio.TimeoutError):
+            await asyncio.sleep(.2)
+    return False
+
+
+async def check_native_transport(itf, timeout=60, tcp_only=False):
+    """
+    Coroutine version of cqlprobe.check_native_transport.
+    """
+    end = time.time() + timeout
+    delay = cqlprobe.INITIAL_RETRY_DELAY
+    while time.time() <= end:
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(itf[0], itf[1]), max(end - time.time(), .2))
+            if tcp_only:
+                return True
+            writer.write(cqlprobe.OPTIONS_FRAME)
+            data = b''
+            ready = None
+            while ready is None:
+                chunk = await asyncio.wait_for(reader.read(64), cqlprobe.ATTEMPT_TIMEOUT)
+                if not chunk:
+                    break
+                data += chunk
+                ready = cqlprobe.parse_response(data)
+            if ready:
+                return True
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            if writer is not None:
+                writer.close()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, cqlprobe.MAX_RETRY_DELAY)
+    return False
+
+
+async def wait_for_binary_interface(node, **kwargs):
+    """
+    Coroutine version of Node.wait_for_binary_interface.
+    """
+    timeout = kwargs.get('timeout', NODE_WAIT_TIMEOUT_IN_SECS)
+    kwargs['timeout'] = timeout
+
+    if node.pid:
+        kwargs['error_on_pid_terminated'] = True
+
+    if node.cluster.version() >= '1.2':
+        await watch_log_for(node, "Starting listening for CQL clients", **kwargs)
+
+    binary_itf = node.network_interfaces['binary']
+    if await check_native_transport(binary_itf, timeout=timeout, tcp_only=node._binary_interface_requires_tls()):
+        if node.start_timeline is not None:
+            node.start_timeline.record(timeline.BINARY_READY)
+    else:
+        warnings.warn("Binary interface %s:%s is not listening after %s seconds, node may have failed to start."
+                      % (binary_itf[0], binary_itf[1], timeout))
+
+
+async def wait_for_running(node, process, timeout_s):
+    """
+    Coroutine version of Node._wait_for_running: waits for the pid file to be
+    written and the process it names to run.
+    """
+    pidfile = os.path.join(node.get_path(), 'cassandra.pid')
+    deadline = time.time() + timeout_s
+    while True:
+        if os.path.isfile(pidfile) and os.stat(pidfile).st_size > 0:
+            node._update_pid(process)
+            if node.is_running():
+                return True
+        if time.time() >= deadline:
+            return node.is_running()
+        await asyncio.sleep(.1)
+
+
+async def nodetool(node, cmd):
+    """
+    Coroutine version of Node.nodetool, running nodetool as an asyncio
+    subprocess. Returns (stdout, stderr, exit status) and raises ToolError on
+    failure.
+    """
+    args = [node.get_tool('nodetool'), '-h', 'localhost', '-p', str(node.jmx_port)] + shlex.split(cmd)
+    process = await asyncio.create_subprocess_exec(*args, env=node.get_tool_env('nodetool'),
+                                                   stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    out, err = await process.communicate()
+    out, err = out.decode(), err.decode()
+    if process.returncode != 0:
+        raise ToolError(['nodetool', '-h', 'localhost', '-p', str(node.jmx_port)] + shlex.split(cmd),
+                        process.returncode, out, err)
+    return out, err, process.returncode
+
+
+async def start(node, wait_other_notice=True, wait_for_binary_proto=False, update_pid=True, **kwargs):
+    """
+    Coroutine version of Node.start, with the same arguments. The node is
+    launched by Node.start() itself, which returns as soon as the launch script
+    is spawned when asked not to wait; the waits are then done here.
+    """
+    marks = []
+    if wait_other_notice:
+        marks = [(other, other.mark_log()) for other in list(node.cluster.nodes.values()) if other.is_live()]
+
+    process = node.start(update_pid=False, wait_other_notice=False, wait_for_binary_proto=False, **kwargs)
+
+    if update_pid or wait_for_binary_proto:
+        if not await wait_for_running(node, process, timeout_s=7):
+            raise NodeError("Node {n} is not running".format(n=node.name), process)
+        node.start_timeline.record(timeline.PID_VISIBLE)
+
+    timeout = wait_other_notice if common.is_int_not_bool(wait_other_notice) else None
+    if wait_other_notice:
+        await watch_logs_for_gossip([(other, node, mark) for other, mark in marks], gossip.UP, timeout)
+
+    if common.is_int_not_bool(wait_for_binary_proto):
+        await wait_for_binary_interface(node, from_mark=node.mark, timeout=wait_for_binary_proto)
+    elif wait_for_binary_proto:
+        await wait_for_binary_interface(node, from_mark=node.mark)
+
+    node.save_startup_timeline()
+    return process
+
+
+async def stop(node, wait=True, wait_other_notice=False, signal_event=signal.SIGTERM, **kwargs):
+    """
+    Coroutine version of Node.stop, with the same arguments and result. The
+    signal is sent by Node.stop() itself, called without waiting.
+    """
+    marks = []
+    if wait_other_notice and node.is_running():
+        marks = [(other, other.mark_log()) for other in list(node.cluster.nodes.values())
+                 if other.is_live() and other is not node]
+
+    if not node.stop(wait=False, wait_other_notice=False, signal_event=signal_event, **kwargs):
+        return False
+
+    if wait_other_notice:
+        await watch_logs_for_gossip([(other, node, mark) for other, mark in marks], gossip.DOWN, 600)
+
+    if wait and node.is_running():
+        await wait_for_exit(node, NODE_STOP_TIMEOUT_IN_SECS)
+        if node.is_running():
+            raise NodeError("Problem stopping node %s" % node.name)
+    return True
+
+
+async def wait_for_exit(node, timeout):
+    """
+    Returns True as soon as the Cassandra process of node exits, or False
+    after timeout seconds. The pidfd of the process is registered with the
+    loop when there is one, the process is polled otherwise.
+    """
+    with node._exit_watcher() as watcher:
+        fd = watcher.fileno()
+        if fd is None:
+            deadline = time.time() + timeout
+            while not watcher.has_exited():
+                if time.time() > deadline:
+                    return False
+                await asyncio.sleep(procwatch.POLL_INTERVAL)
+            return True
+        loop = asyncio.get_event_loop()
+        exited = asyncio.Event()
+        loop.add_reader(fd, exited.set)
+        try:
+            await asyncio.wait_for(exited.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return watcher.has_exited()
+        finally:
+            loop.remove_reader(fd)
+
+
+async def cluster_start(cluster, **kwargs):
+    """
+    Coroutine version of Cluster.start, with the same arguments, result and
+    errors. Cluster.start() already launches the nodes and waits for all of
+    them together, so it is run as is in the default executor of the loop
+    rather than reimplemented here.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(cluster.start, **kwargs))
+
+
+async def cluster_stop(cluster, wait=True, signal_event=signal.SIGTERM, **kwargs):
+    """
+    Coroutine version of Cluster.stop: all the nodes are stopped concurrently.
+    """
+    extension.pre_cluster_stop(cluster)
+    nodes = list(cluster.nodes.values())
+    stopped = await asyncio.gather(*[stop(node, wait=wait, signal_event=signal_event, kill_strays=False, **kwargs)
+                                     for node in nodes])
+    not_running = [node for node, was_running in zip(nodes, stopped) if not was_running]
+    cluster.kill_stray_processes(not_running)
+    extension.post_cluster_stop(cluster)
+    return not_running
+
+
+async def cluster_nodetool(cluster, cmd):
+    """
+    Coroutine version of Cluster.nodetool: runs nodetool on every running
+    node concurrently.
+    """
+    await asyncio.gather(*[nodetool(node, cmd) for node in list(cluster.nodes.values()) if node.is_running()])
+    return cluster
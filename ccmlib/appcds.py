@@ -0,0 +1,190 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# application class data sharing
+#
+# When CCM_APPCDS is set, JVMs started by ccm map the classes of Cassandra
+# from a dynamic AppCDS archive (JDK 13+) instead of loading them from the
+# jars. There is one archive for the nodes and one for each tool (nodetool,
+# sstableloader, ...), whose classpaths and main classes differ, per install
+# directory and JDK, cached in the repository directory. The first JVM of a
+# kind finding no archive dumps one when it
+# exits (-XX:ArchiveClassesAtExit); the JVM writes the header of an archive
+# last, so a dump is known to be complete once its magic number is there,
+# and it is then renamed into place by the next JVM to start.
+#
+# An archive is only used with a classpath starting like the one it was
+# dumped with, so the conf directory of the node, which holds no classes, is
+# moved to the end of the classpath. The JVM silently ignores an archive it
+# cannot use, e.g. after the JDK was updated in place.
+#
+
+from __future__ import absolute_import
+
+import glob
+import hashlib
+import logging
+import os
+import struct
+import time
+import uuid
+
+from ccmlib import common
+
+logger = logging.getLogger(__name__)
+
+APPCDS_ENV = 'CCM_APPCDS'
+MIN_JDK_VERSION = 13
+
+SERVER = 'server'
+
+# time after which a dump that did not happen (e.g. the JVM was killed) is
+# given up on
+DUMP_TIMEOUT = 3600
+
+_DYNAMIC_ARCHIVE_MAGIC = 0xf00baba8
+_PENDING_SUFFIX = '.pending'
+
+CLASSPATH_FIXUP = """
+### ccm AppCDS: classes first, so that nodes share a classpath prefix ###
+CLASSPATH="${CLASSPATH#$CASSANDRA_CONF:}:$CASSANDRA_CONF"
+"""
+
+# JAVA_HOME -> major version
+_jdk_versions = {}
+
+
+def is_enabled():
+    return bool(os.environ.get(APPCDS_ENV)) and not common.is_win()
+
+
+def _jdk_version(java_home):
+    if java_home not in _jdk_versions:
+        _jdk_versions[java_home] = common.get_jdk_version_int(os.path.join(java_home, 'bin', 'java'))
+    return _jdk_versions[java_home]
+
+
+def tool_kind(tool):
+    """
+    Returns the kind of the JVMs of the tool named tool (e.g. 'nodetool'), to
+    pass to jvm_options().
+    """
+    return 'tool-' + tool
+
+
+def _jars_fingerprint(install_dir):
+    # rebuilding the install directory invalidates its archives
+    digest = hashlib.sha1()
+    for pattern in ('*.jar', os.path.join('build', '*.jar'), os.path.join('lib', '*.jar')):
+        for jar in sorted(glob.glob(os.path.join(install_dir, pattern))):
+            st = os.stat(jar)
+            digest.update('{}:{}:{}\n'.format(jar, st.st_size, int(st.st_mtime)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def archive_dir(install_dir, java_home, jdk_version):
+    """
+    Returns the directory of the archives of an install directory and JDK.
+    """
+    digest = hashlib.sha1()
+    for part in (os.path.realpath(install_dir), os.path.realpath(java_home), _jars_fingerprint(install_dir)):
+        digest.update(part.encode('utf-8') + b'\0')
+    return os.path.join(common.get_default_path(), 'repository', '_appcds',
+                        '{}-jdk{}'.format(digest.hexdigest()[:16], jdk_version))
+
+
+def is_complete(path):
+    """
+    Returns True if path is a complete dynamic archive.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4)
+    except (IOError, OSError):
+        return False
+    return len(head) == 4 and _DYNAMIC_ARCHIVE_MAGIC in (struct.unpack('<I', head)[0], struct.unpack('>I', head)[0])
+
+
+def _promote(archive):
+    # renames a complete dump into place, returns whether a dump is pending
+    pending = False
+    now = time.time()
+    for dump in glob.glob(archive + '.*' + _PENDING_SUFFIX):
+        try:
+            if not os.path.exists(archive) and is_complete(dump):
+                os.rename(dump, archive)
+                logger.info("AppCDS archive {} is ready".format(archive))
+            elif os.path.exists(archive) or now - os.path.getmtime(dump) > DUMP_TIMEOUT:
+                os.remove(dump)
+            else:
+                pending = True
+        except OSError:
+            # promoted or removed by another ccm
+            pass
+    return pending
+
+
+def jvm_options(kind, install_dir, env):
+    """
+    Returns the JVM options making a JVM of kind (SERVER or a tool_kind()) of
+    install_dir run by env (its JAVA_HOME) use the archive of its install
+    directory and JDK, or dump it when there is none and no other JVM is
+    dumping it. Returns [] when AppCDS is disabled or not supported.
+    """
+    java_home = env.get('JAVA_HOME')
+    if not is_enabled() or not java_home:
+        return []
+    jdk_version = _jdk_version(java_home)
+    if jdk_version is None or jdk_version < MIN_JDK_VERSION:
+        return []
+    directory = archive_dir(install_dir, java_home, jdk_version)
+    archive = os.path.join(directory, kind + '.jsa')
+    if not os.path.exists(archive):
+        pending = _promote(archive)
+        if not os.path.exists(archive):
+            if pending:
+                return []
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            dump = '{}.{}{}'.format(archive, uuid.uuid4().hex, _PENDING_SUFFIX)
+            # the placeholder tells other JVMs that a dump is coming, the JVM
+            # replaces it when it exits
+            open(dump, 'w').close()
+            logger.info("Dumping AppCDS archive {} when the JVM exits".format(archive))
+            return ['-XX:ArchiveClassesAtExit=' + dump]
+    return ['-XX:SharedArchiveFile=' + archive]
+
+
+def add_options(kind, install_dir, env, var='JVM_OPTS'):
+    """
+    Appends the jvm_options() of kind to the variable var of env. Returns
+    env.
+    """
+    options = jvm_options(kind, install_dir, env)
+    if options:
+        env[var] = ' '.join([env.get(var, '')] + options).strip()
+    return env
+
+
+def share_classpath(include_file):
+    """
+    Moves the conf directory to the end of the classpath built by the
+    cassandra.in.sh include_file of a node, if AppCDS is enabled.
+    """
+    if is_enabled() and os.path.exists(include_file):
+        with open(include_file, 'a') as f:
+            f.write(CLASSPATH_FIXUP)
@@ -18,7 +18,6 @@
 # ccm clusters
 from __future__ import absolute_import
 
-import itertools
 import os
 import random
 import re
@@ -27,14 +26,21 @@ import signal
 import subprocess
 import threading
 import time
+import warnings
 from collections import OrderedDict, defaultdict, namedtuple
 from distutils.version import LooseVersion #pylint: disable=import-error, no-name-in-module
 
 import yaml
 from six import print_
 
-from ccmlib import common, extension, repository
-from ccmlib.node import Node, NodeError, TimeoutError
+from ccmlib import common, cqlprobe, extension, images, procwatch, repository
+from ccmlib.gossip import GossipStateTracker
+from ccmlib.logbus import LogBus, LogSubscriber
+from ccmlib.logcatalog import LogCatalog
+from ccmlib.logerrors import ErrorSummary
+from ccmlib.timeline import BINARY_READY, PID_VISIBLE
+from ccmlib.node import (NODE_WAIT_TIMEOUT_IN_SECS, Node, NodeError, TimeoutError, _ErrorBlockAssembler,
+                         watch_logs_for, watch_logs_for_alive)
 from six.moves import xrange
 try:
     from urllib.parse import urlparse
@@ -43,6 +49,218 @@ except ImportError:
 
 
 DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS = int(os.environ.get('CCM_CLUSTER_START_DEFAULT_TIMEOUT', 120))
+# cassandra should not take more than 2 minutes to shutdown, as in Node.stop
+DEFAULT_CLUSTER_STOP_TIMEOUT_IN_SECS = 127
+# how long killed nodes are given to go away
+_KILL_TIMEOUT_IN_SECS = 10
+
+def _start_waves(nodes, seeds, max_concurrency=None):
+    """
+    Splits the nodes to start in the waves Cluster.start() launches them by:
+    the ones in seeds first, then the others, by at most max_concurrency.
+    """
+    first = [node for node in nodes if node in seeds]
+    groups = [first, [node for node in nodes if node not in first]]
+    waves = []
+    for group in groups:
+        size = max_concurrency or len(group) or 1
+        waves.extend(group[i:i + size] for i in range(0, len(group), size))
+    return waves
+
+
+def _restart_waves(nodes, max_unavailable=1, per_dc=True):
+    """
+    Splits the nodes to restart in the waves Cluster.rolling_restart()
+    restarts them by: at most max_unavailable nodes per data center in each
+    wave if per_dc, at most max_unavailable nodes in all otherwise.
+    """
+    if max_unavailable < 1:
+        raise common.ArgumentError('max_unavailable must be at least 1, got {}'.format(max_unavailable))
+    if not per_dc:
+        return [nodes[i:i + max_unavailable] for i in range(0, len(nodes), max_unavailable)]
+    dcs = OrderedDict()
+    for node in nodes:
+        dcs.setdefault(node.data_center, []).append(node)
+    waves = []
+    for dc_nodes in dcs.values():
+        for i, start in enumerate(range(0, len(dc_nodes), max_unavailable)):
+            if i == len(waves):
+                waves.append([])
+            waves[i].extend(dc_nodes[start:start + max_unavailable])
+    return waves
+
+
+class _LauncherOutputs(object):
+    """
+    Prints the output of the launcher processes of started nodes once they
+    exit, as Node.watch_log_for(process=...) does for a single node, each
+    one once however many waits check it.
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self._printed = set()
+
+    def check(self, started):
+        # raises RuntimeError if a launcher failed, as watch_log_for does
+        for node, p, _ in started:
+            if p is None or node.name in self._printed or p.poll() is None:
+                continue
+            self._printed.add(node.name)
+            node.print_process_output(node.name, p, self.verbose)
+            if p.returncode != 0:
+                raise RuntimeError()
+
+    def print_exited(self, started):
+        # on failure, the output of the launchers that exited is of help
+        try:
+            self.check(started)
+        except RuntimeError:
+            pass
+
+
+def _check_started_nodes_running(started, outputs):
+    outputs.check(started)
+    for node, p, _ in started:
+        if not node._is_pid_running():
+            raise NodeError("C* process of {} terminated while starting".format(node.name), p)
+
+
+def _watch_started_logs_for(started, expr, timeout, outputs):
+    # fails as soon as one of the nodes dies, printing the output of their
+    # launchers; raises RuntimeError if one of them failed
+    watchers = [node._exit_watcher() for node, _, _ in started]
+    try:
+        watch_logs_for([(node, expr, mark) for node, _, mark in started], timeout=timeout,
+                       check=lambda: _check_started_nodes_running(started, outputs),
+                       wake_fds=procwatch.exit_fds(watchers))
+    except (NodeError, TimeoutError):
+        outputs.print_exited(started)
+        raise
+    finally:
+        for watcher in watchers:
+            watcher.close()
+
+
+NodeStop = namedtuple('NodeStop', ['node', 'duration', 'killed'])
+NodeStop.__doc__ = """
+How a node stopped during Cluster.stop(): duration is the number of seconds
+between the stop of the cluster being requested and the node being down, and
+killed tells whether it had to be killed when the stop timed out.
+"""
+
+
+RestartWave = namedtuple('RestartWave', ['nodes', 'stop_duration', 'start_duration', 'duration'])
+RestartWave.__doc__ = """
+A wave of Cluster.rolling_restart(): the names of its nodes, the seconds
+they took to stop, then to start again until they answered CQL requests and
+were seen UP by the other running nodes, and the whole duration of the wave.
+"""
+
+
+def _wait_for_stopped(nodes, start, timeout, kill_on_timeout):
+    """
+    Waits for all the nodes, signaled at start, to be down. Returns the
+    NodeStop of each of them.
+    """
+    stops = []
+    remaining = OrderedDict((node, node._exit_watcher()) for node in nodes)
+    killed = False
+    deadline = start + timeout
+    try:
+        while remaining:
+            for node in list(remaining):
+                if not node.is_running():
+                    remaining.pop(node).close()
+                    stops.append(NodeStop(node.name, time.time() - start, killed))
+            if not remaining:
+                break
+            if time.time() > deadline:
+                if not kill_on_timeout or killed:
+                    raise NodeError("Problem stopping node(s) {}".format(", ".join(node.name for node in remaining)))
+                for node in remaining:
+                    common.warning("{} did not stop in {} seconds, killing it".format(node.name, timeout))
+                    node.stop(wait=False, signal_event=signal.SIGKILL)
+                killed = True
+                deadline = time.time() + _KILL_TIMEOUT_IN_SECS
+            # returns as soon as one of the nodes exits
+            procwatch.wait_for_any_exit(list(remaining.values()), max(0, min(1, deadline - time.time())))
+    finally:
+        for watcher in remaining.values():
+            watcher.close()
+    return stops
+
+
+class _LogErrorWatcher(LogSubscriber):
+    """
+    Log bus subscriber collecting the errors logged by the nodes of a cluster,
+    for Cluster.actively_watch_logs_for_error().
+    """
+
+    def __init__(self, bus, on_error_call, interval, summarize=False):
+        LogSubscriber.__init__(self)
+        self.bus = bus
+        self.on_error_call = on_error_call
+        self.interval = interval
+        self.summarize = summarize
+        self._assemblers = defaultdict(_ErrorBlockAssembler)
+        self._last_line = {}
+        self._errordata = OrderedDict()
+        self._last_report = 0
+        self._done = threading.Event()
+
+    def on_line(self, event, match):
+        error = self._assemblers[event.node].add(event.offset, event.line.rstrip('\r\n'), event.end - event.offset)
+        self._last_line[event.node] = time.time()
+        self._add(event.node, error)
+
+    def on_reset(self, node):
+        self._add(node, self._assemblers[node].flush())
+
+    def on_caught_up(self):
+        now = time.time()
+        # a stack trace is only known to be complete once the next log event
+        # is written; one left alone for interval seconds is reported as is
+        for node, assembler in self._assemblers.items():
+            if now - self._last_line.get(node, 0) >= self.interval:
+                self._add(node, assembler.flush())
+        if self._errordata and now - self._last_report >= self.interval:
+            self._report()
+
+    def _add(self, node, error):
+        if error is not None:
+            self._errordata.setdefault(node, []).append(error)
+
+    def _report(self):
+        errordata, self._errordata = self._errordata, OrderedDict()
+        self._last_report = time.time()
+        if self.summarize:
+            summary = ErrorSummary()
+            for node, errors in errordata.items():
+                for block, start, _ in errors:
+                    summary.add(node, block, start)
+            self.on_error_call(summary)
+        else:
+            self.on_error_call(OrderedDict((node, [block for block, _, _ in errors]) for node, errors in errordata.items()))
+
+    def is_alive(self):
+        return not self._done.is_set()
+
+    def join(self, timeout=None):
+        if self._done.is_set():
+            return
+        try:
+            # do a final pass to make sure we got to the very end of the files
+            self.bus.poll()
+            self.bus.unsubscribe(self)
+            for node, assembler in self._assemblers.items():
+                self._add(node, assembler.flush())
+            if self._errordata:
+                self._report()
+        finally:
+            common.debug("Log-watching stopped.")
+            self._done.set()
+
 
 class Cluster(object):
 
@@ -73,6 +291,13 @@ class Cluster(object):
         self._debug = []
         self._trace = []
         self.data_dir_count = 1
+        self._log_bus = None
+        self._gossip_tracker = None
+        self._log_catalog = None
+        # NodeStops of the last stop()
+        self.last_stop = []
+        # RestartWaves of the last rolling_restart()
+        self.last_rolling_restart = []
 
         if self.name.lower() == "current":
             raise RuntimeError("Cannot name a cluster 'current'.")
@@ -155,89 +380,87 @@ class Cluster(object):
 
         return self
 
-    def actively_watch_logs_for_error(self, on_error_call, interval=1):
+    def actively_watch_logs_for_error(self, on_error_call, interval=1, summarize=False):
         """
-        Begins a thread that repeatedly scans system.log for new errors, every interval seconds.
-        (The first pass covers the entire log contents written at that point,
-        subsequent scans cover newly appended log messages).
+        Begins watching system.log for new errors, through the log bus of the
+        cluster. (The first report covers the entire log contents written at
+        that point, subsequent ones cover newly appended log messages).
 
         Reports new errors, by calling the provided callback with an OrderedDictionary
-        mapping node name to a list of error lines.
+        mapping node name to a list of error lines, at most every interval seconds.
+        If summarize is True, the callback is given a ccmlib.logerrors.ErrorSummary
+        of the new errors instead, with one exemplar per distinct error.
 
-        Returns the thread itself, which should be .join()'ed to wrap up execution,
+        Returns the watcher, which should be .join()'ed to wrap up execution,
         otherwise will run until the main thread exits.
         """
-        class LogWatchingThread(threading.Thread):
-            """
-            This class is embedded here for now, because it is used only from
-            within Cluster, and depends on cluster.nodelist().
-            """
+        bus = self.log_bus()
+        return bus.add_subscriber(_LogErrorWatcher(bus, on_error_call, interval, summarize), replay=True)
 
-            def __init__(self, cluster):
-                super(LogWatchingThread, self).__init__()
-                self.cluster = cluster
-                self.daemon = True  # set so that thread will exit when main thread exits
-                self.req_stop_event = threading.Event()
-                self.done_event = threading.Event()
-                self.log_positions = defaultdict(int)
-
-            def scan(self):
-                errordata = OrderedDict()
-
-                try:
-                    for node in self.cluster.nodelist():
-                        scan_from_mark = self.log_positions[node.name]
-                        next_time_scan_from_mark = node.mark_log()
-                        if next_time_scan_from_mark == scan_from_mark:
-                            # log hasn't advanced, nothing to do for this node
-                            continue
-                        else:
-                            errors = node.grep_log_for_errors_from(seek_start=scan_from_mark)
-                        self.log_positions[node.name] = next_time_scan_from_mark
-                        if errors:
-                            errordata[node.name] = errors
-                except IOError as e:
-                    if 'No such file or directory' in str(e.strerror):
-                        pass  # most likely log file isn't yet written
-
-                    # in the case of unexpected error, report this thread to the callback
-                    else:
-                        errordata['log_scanner'] = [[str(e)]]
-
-                return errordata
+    def summarize_log_errors(self, filename='system.log'):
+        """
+        Returns the errors of the given log of every node, after their
+        mark_log_for_errors() mark, grouped by fingerprint into a single
+        ccmlib.logerrors.ErrorSummary.
+        """
+        summary = ErrorSummary()
+        for node in self.nodelist():
+            summary.update(node.summarize_log_errors(filename))
+        return summary
 
-            def scan_and_report(self):
-                errordata = self.scan()
+    def log_bus(self):
+        """
+        Returns the LogBus of this cluster, starting it on first use. It tails
+        the system.log of every node in a background thread and publishes the
+        lines to its subscribers (see LogBus.subscribe()).
+        """
+        if self._log_bus is None:
+            self._log_bus = LogBus(self)
+        return self._log_bus.start()
 
-                if errordata:
-                    on_error_call(errordata)
+    def log_records(self, filename='system.log', **filters):
+        """
+        Returns the records (ccmlib.logrecords.LogRecord) of the given log file
+        of every node matching filters (see Node.log_records()), ordered by
+        timestamp.
+        """
+        records = []
+        for node in self.nodelist():
+            records.extend(node.log_records(filename, **filters))
+        records.sort(key=lambda record: record.timestamp)
+        return records
 
-            def run(self):
-                common.debug("Log-watching thread starting.")
+    def log_catalog(self):
+        """
+        Returns the LogCatalog of this cluster, a SQLite database (logs.db in
+        the cluster directory) of the log records of its nodes. It is only
+        loaded by LogCatalog.ingest(), or by query_logs().
+        """
+        if self._log_catalog is None:
+            self._log_catalog = LogCatalog(os.path.join(self.get_path(), 'logs.db'))
+        return self._log_catalog
 
-                # run until stop gets requested by .join()
-                while not self.req_stop_event.is_set():
-                    self.scan_and_report()
-                    time.sleep(interval)
+    def query_logs(self, text=None, ingest=True, **filters):
+        """
+        Returns the records (ccmlib.logcatalog.CatalogRecord) of the logs of
+        every node containing text and matching filters (see
+        LogCatalog.query()), ordered by timestamp. Unless ingest is False, the
+        records logged since the last query are loaded in the catalog first.
+        """
+        catalog = self.log_catalog()
+        if ingest:
+            catalog.ingest(self.nodelist())
+        return catalog.query(text, **filters)
 
-                try:
-                    # do a final scan to make sure we got to the very end of the files
-                    self.scan_and_report()
-                finally:
-                    common.debug("Log-watching thread exiting.")
-                    # done_event signals that the scan completed a final pass
-                    self.done_event.set()
-
-            def join(self, timeout=None):
-                # signals to the main run() loop that a stop is requested
-                self.req_stop_event.set()
-                # now wait for the main loop to get through a final log scan, and signal that it's done
-                self.done_event.wait(timeout=interval * 2)  # need to wait at least interval seconds before expecting thread to finish. 2x for safety.
-                super(LogWatchingThread, self).join(timeout)
-
-        log_watcher = LogWatchingThread(self)
-        log_watcher.start()
-        return log_watcher
+    def gossip_tracker(self):
+        """
+        Returns the GossipStateTracker of this cluster, subscribing it to the
+        log bus on first use. It records which node sees which peer UP or DOWN.
+        """
+        bus = self.log_bus()
+        if self._gossip_tracker is None:
+            self._gossip_tracker = bus.add_subscriber(GossipStateTracker(bus), replay=True)
+        return self._gossip_tracker
 
     def get_install_dir(self):
         common.validate_install_dir(self.__install_dir)
@@ -346,24 +569,7 @@ class Cluster(object):
             if tokens is not None and i - 1 < len(tokens):
                 tk = tokens[i - 1]
             dc = dcs[i - 1] if i - 1 < len(dcs) else None
-
-            binary = None
-            if self.cassandra_version() >= '1.2':
-                if use_single_interface:
-                    #Always leave 9042 and 9043 clear, in case someone defaults to adding
-                    # a node with those ports
-                    binary = (ipformat % 1, 9042 + 2 + (i * 2))
-                else:
-                    binary = (ipformat % i, 9042)
-            thrift = None
-            if self.cassandra_version() < '4':
-                thrift = (ipformat % i, 9160)
-
-            storage_interface = ((ipformat % i), 7000)
-            if use_single_interface:
-                #Always leave 7000 and 7001 in case someone defaults to adding
-                #with those port numbers
-                storage_interface = (ipformat % 1, 7000 + 2 + (i * 2))
+            thrift, storage_interface, binary = self._node_interfaces(i, ipformat, use_single_interface)
 
             node = self.create_node(name='node%s' % i,
                                     auto_bootstrap=False,
@@ -379,6 +585,74 @@ class Cluster(object):
             self._update_config()
         return self
 
+    def _node_interfaces(self, i, ipformat, use_single_interface):
+        # (thrift, storage, binary) interfaces of the i-th node populated
+        binary = None
+        if self.cassandra_version() >= '1.2':
+            if use_single_interface:
+                #Always leave 9042 and 9043 clear, in case someone defaults to adding
+                # a node with those ports
+                binary = (ipformat % 1, 9042 + 2 + (i * 2))
+            else:
+                binary = (ipformat % i, 9042)
+        thrift = None
+        if self.cassandra_version() < '4':
+            thrift = (ipformat % i, 9160)
+
+        storage_interface = ((ipformat % i), 7000)
+        if use_single_interface:
+            #Always leave 7000 and 7001 in case someone defaults to adding
+            #with those port numbers
+            storage_interface = (ipformat % 1, 7000 + 2 + (i * 2))
+        return thrift, storage_interface, binary
+
+    def reassign_interfaces(self, ipprefix='127.0.0.', ipformat=None, use_single_interface=False):
+        """
+        Gives the nodes, in the order of their names, the interfaces populate()
+        would have given them with these arguments, keeping the seeds. Used on
+        clusters created from an image.
+        """
+        if self.cassandra_version() < '4' and use_single_interface:
+            raise common.ArgumentError('use_single_interface is not supported in versions < 4.0')
+        if not ipformat:
+            ipformat = ipprefix + "%d"
+
+        # seeds are loaded as addresses
+        seeds = []
+        for seed in self.seeds:
+            if not isinstance(seed, Node):
+                url = urlparse("http://" + seed)
+                matches = [node for node in self.nodes.values()
+                           if node.network_interfaces['storage'][0] == url.hostname and
+                           (url.port is None or str(node.network_interfaces['storage'][1]) == str(url.port))]
+                seed = matches[0] if matches else seed
+            seeds.append(seed)
+        self.seeds = seeds
+
+        nodes = sorted(self.nodes.values(), key=lambda node: (len(node.name), node.name))
+        for i, node in enumerate(nodes, 1):
+            thrift, storage_interface, binary = self._node_interfaces(i, ipformat, use_single_interface)
+            node.network_interfaces = {'thrift': common.normalize_interface(thrift),
+                                       'storage': common.normalize_interface(storage_interface),
+                                       'binary': common.normalize_interface(binary)}
+            node.ip_addr = (node.network_interfaces['thrift'] or node.network_interfaces['binary'])[0]
+
+        if any(node.data_center is not None for node in nodes):
+            self.__update_topology_files()
+        for node in nodes:
+            node._save()
+        self._update_config()
+        return self
+
+    def snapshot_image(self, name, force=False):
+        """
+        Captures the cluster, which must be stopped, as the image name from
+        which new clusters can be created (see ClusterFactory.create_from_image),
+        with the same addresses and ports. Returns (Image, dict of the number
+        of files hard linked, reflinked and copied).
+        """
+        return images.snapshot_image(self, name, force)
+
     def create_node(self, name, auto_bootstrap, thrift_interface, storage_interface, jmx_port, remote_debug_port, initial_token, save=True, binary_interface=None, byteman_port='0', environment_variables=None, derived_cassandra_version=None):
         return Node(name, self, auto_bootstrap, thrift_interface, storage_interface, jmx_port, remote_debug_port, initial_token, save, binary_interface, byteman_port, environment_variables, derived_cassandra_version=derived_cassandra_version)
 
@@ -464,6 +738,11 @@ class Cluster(object):
             self.remove_dir_with_retry(node.get_path())
         else:
             self.stop(gently=gently)
+            if self._log_bus is not None:
+                self._log_bus.stop()
+            if self._log_catalog is not None:
+                self._log_catalog.close()
+                self._log_catalog = None
             self.remove_dir_with_retry(self.get_path())
 
     # We can race w/shutdown on Windows and get Access is denied attempting to delete node logs.
@@ -532,7 +811,22 @@ class Cluster(object):
 
     def start(self, no_wait=False, verbose=False, wait_for_binary_proto=True,
               wait_other_notice=True, jvm_args=None, profile_options=None,
-              quiet_start=False, allow_root=False, jvm_version=None, **kwargs):
+              quiet_start=False, allow_root=False, jvm_version=None, max_concurrency=None,
+              seeds_first=False, **kwargs):
+        """
+        Start the nodes of the cluster that are not running. Nodes are launched
+        concurrently and their logs are watched together, so that starting the
+        cluster takes about as long as starting its slowest node. Options
+        beside the ones of Node.start() include:
+          - max_concurrency: start the nodes by waves of at most that many, each
+            wave being listening for clients before the next one is launched
+            (by default, all the nodes at once)
+          - seeds_first: start the seeds in the first waves, before the other
+            nodes
+        Raises NodeError as soon as a node being started dies, after printing
+        the output of the launchers of the nodes; returns None if a launcher
+        failed, as before the nodes were started in parallel.
+        """
         if jvm_args is None:
             jvm_args = []
 
@@ -545,45 +839,25 @@ class Cluster(object):
                     if itf is not None:
                         common.assert_socket_available(itf)
 
+        timeout = kwargs.get('timeout', DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS)
+        timeout = int(os.environ.get('CCM_CLUSTER_START_TIMEOUT_OVERRIDE', timeout))
+        to_start = [node for node in list(self.nodes.values()) if not node.is_running()]
         started = []
-        for node in list(self.nodes.values()):
-            if not node.is_running():
-                mark = 0
-                if os.path.exists(node.logfilename()):
-                    mark = node.mark_log()
-
-                # if the node is going to allocate_strategy_ tokens during start, then wait_for_binary_proto=True
-                node_wait_for_binary_proto = (self.can_generate_tokens() and self.use_vnodes and node.initial_token is None)
-                p = node.start(update_pid=False, jvm_args=jvm_args, jvm_version=jvm_version,
-                               profile_options=profile_options, verbose=verbose, quiet_start=quiet_start,
-                               allow_root=allow_root, wait_for_binary_proto=node_wait_for_binary_proto)
-
-                # Prior to JDK8, starting every node at once could lead to a
-                # nanotime collision where the RNG that generates a node's tokens
-                # gives identical tokens to several nodes. Thus, we stagger
-                # the node starts
-                if common.get_jdk_version() < '1.8':
-                    time.sleep(1)
-
-                started.append((node, p, mark))
-
-        if no_wait:
-            time.sleep(2)  # waiting 2 seconds to check for early errors and for the pid to be set
-        else:
-            for node, p, mark in started:
-                if not node._wait_for_running(p, timeout_s=7):
-                    raise NodeError("Node {} should be running before waiting for <started listening> log message, "
-                                    "but C* process is terminated.".format(node.name))
-            for node, p, mark in started:
+        outputs = _LauncherOutputs(verbose)
+        for wave in _start_waves(to_start, self.seeds if seeds_first else [], max_concurrency):
+            launched = self.__launch_nodes(wave, jvm_args=jvm_args, jvm_version=jvm_version,
+                                           profile_options=profile_options, verbose=verbose,
+                                           quiet_start=quiet_start, allow_root=allow_root)
+            started.extend(launched)
+            if not no_wait:
                 try:
-                    timeout=kwargs.get('timeout', DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS)
-                    timeout=int(os.environ.get('CCM_CLUSTER_START_TIMEOUT_OVERRIDE', timeout))
-                    start_message = "Listening for thrift clients..." if self.cassandra_version() < "2.2" else "Starting listening for CQL clients"
-                    node.watch_log_for(start_message, timeout=timeout, process=p, verbose=verbose, from_mark=mark,
-                                       error_on_pid_terminated=True)
+                    self.__wait_for_started(launched, timeout, outputs)
                 except RuntimeError:
                     return None
 
+        if no_wait:
+            time.sleep(2)  # waiting 2 seconds to check for early errors and for the pid to be set
+
         self.__update_pids(started)
 
         for node, p, _ in started:
@@ -592,26 +866,188 @@ class Cluster(object):
 
         if not no_wait:
             if wait_other_notice:
-                for (node, _, mark), (other_node, _, _) in itertools.permutations(started, 2):
-                    node.watch_log_for_alive(other_node, from_mark=mark)
+                watch_logs_for_alive([(node, [other for other, _, _ in started if other is not node], mark)
+                                      for node, _, mark in started])
 
             if wait_for_binary_proto:
-                for node, p, mark in started:
-                    node.wait_for_binary_interface(process=p, verbose=verbose, from_mark=mark)
+                self.__wait_for_binary_interfaces(started, outputs)
+
+        for node, _, _ in started:
+            node.save_startup_timeline()
 
         extension.post_cluster_start(self)
 
         return started
 
-    def stop(self, wait=True, signal_event=signal.SIGTERM, **kwargs):
+    def __launch_nodes(self, nodes, **start_options):
+        # returns the (node, launcher process, log mark) of each node
+        # if the node is going to allocate_strategy_ tokens during start, then wait_for_binary_proto=True;
+        # token allocation is not concurrent, so these nodes are started one after the other
+        allocating = [node for node in nodes
+                      if self.can_generate_tokens() and self.use_vnodes and node.initial_token is None]
+
+        def launch(node):
+            mark = 0
+            if os.path.exists(node.logfilename()):
+                mark = node.mark_log()
+            p = node.start(update_pid=False, wait_for_binary_proto=node in allocating, **start_options)
+            return node, p, mark
+
+        launched = [launch(node) for node in allocating]
+        others = [node for node in nodes if node not in allocating]
+        if common.get_jdk_version() < '1.8':
+            # Prior to JDK8, starting every node at once could lead to a
+            # nanotime collision where the RNG that generates a node's tokens
+            # gives identical tokens to several nodes. Thus, we stagger
+            # the node starts
+            for node in others:
+                launched.append(launch(node))
+                time.sleep(1)
+        else:
+            launched.extend(common.parallel_map(launch, others))
+        return launched
+
+    def __wait_for_started(self, started, timeout, outputs):
+        for node, p, mark in started:
+            if not node._wait_for_running(p, timeout_s=7):
+                outputs.print_exited(started)
+                raise NodeError("Node {} should be running before waiting for <started listening> log message, "
+                                "but C* process is terminated.".format(node.name), p)
+            node.start_timeline.record(PID_VISIBLE)
+        start_message = "Listening for thrift clients..." if self.cassandra_version() < "2.2" else "Starting listening for CQL clients"
+        _watch_started_logs_for(started, start_message, timeout, outputs)
+
+    def __wait_for_binary_interfaces(self, started, outputs, timeout=NODE_WAIT_TIMEOUT_IN_SECS):
+        # Node.wait_for_binary_interface() for all the nodes at once
+        if self.version() >= '1.2':
+            _watch_started_logs_for(started, "Starting listening for CQL clients", timeout, outputs)
+        ready = self.wait_for_native_transport([node for node, _, _ in started], timeout=timeout)
+        for node, _, _ in started:
+            if ready[node.name] is not None:
+                node.start_timeline.record(BINARY_READY, ready[node.name])
+            else:
+                binary_itf = node.network_interfaces['binary']
+                warnings.warn("Binary interface %s:%s is not listening after %s seconds, node may have failed to start."
+                              % (binary_itf[0], binary_itf[1], timeout))
+
+    def wait_for_native_transport(self, nodes=None, timeout=NODE_WAIT_TIMEOUT_IN_SECS):
+        """
+        Waits for the binary interfaces of nodes (by default, all the nodes of
+        the cluster) to answer native protocol requests, probing all of them
+        at once. Returns an OrderedDict of node name to the time (since the
+        epoch) the node was seen ready, or None if it was not within timeout
+        seconds.
+        """
+        if nodes is None:
+            nodes = list(self.nodes.values())
+        return cqlprobe.probe_native_transports(
+            OrderedDict((node.name, node.network_interfaces['binary']) for node in nodes), timeout=timeout,
+            tcp_only=[node.name for node in nodes if node._binary_interface_requires_tls()])
+
+    def stop(self, wait=True, signal_event=signal.SIGTERM, timeout=DEFAULT_CLUSTER_STOP_TIMEOUT_IN_SECS,
+             kill_on_timeout=False, **kwargs):
+        """
+        Stop all the nodes of the cluster: every node is signaled first, then
+        their exits are waited for together. Options beside the ones of
+        Node.stop() include:
+          - timeout: how long the nodes are given to stop, all together
+          - kill_on_timeout: SIGKILL the nodes still running after timeout
+            rather than raising NodeError
+        The time each node took to stop is recorded in self.last_stop (empty
+        if not waiting). Returns the nodes that were not running, whose stray
+        processes, if any, are killed.
+        """
         not_running = []
         extension.pre_cluster_stop(self)
+        start = time.time()
+        stopping = []
         for node in list(self.nodes.values()):
-            if not node.stop(wait=wait, signal_event=signal_event, **kwargs):
+            if node.stop(wait=False, signal_event=signal_event, kill_strays=False, **kwargs):
+                stopping.append(node)
+            else:
                 not_running.append(node)
+        self.kill_stray_processes(not_running)
+        # nothing is known of how the nodes stop without waiting for them
+        self.last_stop = _wait_for_stopped(stopping, start, timeout, kill_on_timeout) if wait else []
         extension.post_cluster_stop(self)
         return not_running
 
+    def rolling_restart(self, max_unavailable=1, per_dc=True, signal_event=signal.SIGTERM,
+                        stop_timeout=DEFAULT_CLUSTER_STOP_TIMEOUT_IN_SECS, timeout=DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS,
+                        kill_on_timeout=False, jvm_args=None, jvm_version=None, allow_root=False, **kwargs):
+        """
+        Restart the running nodes of the cluster by waves of at most
+        max_unavailable nodes, per data center if per_dc (so that each data
+        center keeps all but max_unavailable of its nodes up), in the order
+        of their names. The nodes of a wave are stopped together as by stop(),
+        then started together as by start(), and the next wave only begins
+        once they answer CQL requests and all the other running nodes have
+        seen them UP. Other options:
+          - signal_event, stop_timeout and kill_on_timeout: the signal, timeout
+            and kill_on_timeout of stop() for each wave
+          - timeout: how long the nodes of a wave are given to be back
+          - jvm_args, jvm_version, allow_root: passed to Node.start()
+          - any other keyword argument is passed to Node.stop() (e.g. gently)
+        The RestartWave of each wave is recorded in self.last_rolling_restart
+        and returned. Raises NodeError, without going on with the next waves,
+        as soon as a node fails to come back.
+        """
+        if jvm_args is None:
+            jvm_args = []
+        self.last_rolling_restart = []
+        running = [node for node in self.nodelist() if node.is_running()]
+        for wave in _restart_waves(running, max_unavailable, per_dc):
+            names = [node.name for node in wave]
+            wave_start = time.time()
+            for node in wave:
+                node.stop(wait=False, signal_event=signal_event, kill_strays=False, **kwargs)
+            _wait_for_stopped(wave, wave_start, stop_timeout, kill_on_timeout)
+            self.kill_stray_processes(wave)
+            stop_duration = time.time() - wave_start
+
+            # the other nodes are to see the ones of the wave coming back UP
+            peers = [(node, node.mark_log()) for node in self.nodelist() if node not in wave and node.is_running()]
+            launched = self.__launch_nodes(wave, jvm_args=jvm_args, jvm_version=jvm_version, profile_options=None,
+                                           verbose=False, quiet_start=False, allow_root=allow_root)
+            try:
+                self.__wait_for_started(launched, timeout, _LauncherOutputs())
+            except RuntimeError:
+                raise NodeError("Failed to launch {}, see the output above".format(", ".join(names)))
+            self.__update_pids(launched)
+            if self.version() >= '1.2':
+                ready = self.wait_for_native_transport(wave, timeout=timeout)
+                not_ready = [name for name in names if ready[name] is None]
+                if not_ready:
+                    raise NodeError("Node(s) {} not answering CQL requests {} seconds after restarting"
+                                    .format(", ".join(not_ready), timeout))
+                for node in wave:
+                    node.start_timeline.record(BINARY_READY, ready[node.name])
+            watch_logs_for_alive([(peer, wave, mark) for peer, mark in peers] +
+                                 [(node, [other for other in wave if other is not node], mark)
+                                  for node, _, mark in launched], timeout=timeout)
+            for node in wave:
+                node.save_startup_timeline()
+
+            end = time.time()
+            restart = RestartWave(names, stop_duration, end - wave_start - stop_duration, end - wave_start)
+            self.last_rolling_restart.append(restart)
+            common.info("Restarted {} in {:.1f}s (stop {:.1f}s, start {:.1f}s)"
+                        .format(", ".join(names), restart.duration, restart.stop_duration, restart.start_duration))
+        return self.last_rolling_restart
+
+    def kill_stray_processes(self, nodes=None, sig=signal.SIGKILL):
+        """
+        Sends sig to the Cassandra processes of nodes (by default, all the
+        nodes of the cluster) found on the host, e.g. processes of nodes that
+        are not running as far as ccm knows, with a single scan of the process
+        table. Returns the procwatch.CassandraProcesses signaled.
+        """
+        if common.is_win():
+            return []
+        if nodes is None:
+            nodes = list(self.nodes.values())
+        return procwatch.kill_processes([node.log_directory() for node in nodes], sig)
+
     def set_log_level(self, new_level, class_names=None):
         class_names = class_names or []
         known_level = ['TRACE', 'DEBUG', 'INFO', 'WARN', 'ERROR', 'OFF']
@@ -651,6 +1087,21 @@ class Cluster(object):
                 node.nodetool(nodetool_cmd)
         return self
 
+    # asyncio counterparts of start(), stop() and nodetool(), overlapping the
+    # work done for every node (python 3.5+, see ccmlib.aio)
+
+    def astart(self, **kwargs):
+        from ccmlib import aio
+        return aio.cluster_start(self, **kwargs)
+
+    def astop(self, **kwargs):
+        from ccmlib import aio
+        return aio.cluster_stop(self, **kwargs)
+
+    def anodetool(self, nodetool_cmd):
+        from ccmlib import aio
+        return aio.cluster_nodetool(self, nodetool_cmd)
+
     def allNativePortsMatch(self):
         current_port = None
         for node in self.nodes.values():
@@ -22,7 +22,7 @@ import os
 
 import yaml
 
-from ccmlib import common, extension, repository
+from ccmlib import common, extension, images, repository
 from ccmlib.node import Node
 
 from distutils.version import LooseVersion  #pylint: disable=import-error, no-name-in-module
@@ -77,3 +77,39 @@ class ClusterFactory():
             cluster.seeds.append(seed)
 
         return cluster
+
+    @staticmethod
+    def create_from_image(path, name, image, ipprefix=None, ipformat=None, use_single_interface=False):
+        """
+        Creates the cluster name from the image named image (see
+        Cluster.snapshot_image) and returns it, with its nodes as they were
+        in the image, stopped. The nodes keep the addresses and ports (storage,
+        binary, JMX, debug) of the image, so the cluster cannot run at the same
+        time as the cluster the image was taken of or another cluster created
+        from it. With ipprefix, ipformat or use_single_interface, the nodes
+        get the interfaces Cluster.populate() would give them; as the nodes
+        keep the addresses of their peers in their system keyspace
+        (system.peers), ArgumentError is raised if that changes the storage
+        interface of a node.
+        """
+        images.materialize_image(path, name, image)
+        try:
+            cluster = ClusterFactory.load(path, name)
+            for node in cluster.nodelist():
+                node.pid = None
+            if ipprefix or ipformat or use_single_interface:
+                storage = dict((node.name, node.network_interfaces['storage']) for node in cluster.nodelist())
+                cluster.reassign_interfaces(ipprefix or '127.0.0.', ipformat, use_single_interface)
+                moved = [node.name for node in cluster.nodelist()
+                         if tuple(node.network_interfaces['storage']) != tuple(storage[node.name])]
+                if moved:
+                    raise common.ArgumentError("The storage interfaces of {} would differ from the ones of image {}, "
+                                               "which its nodes keep in system.peers".format(", ".join(moved), image))
+            else:
+                for node in cluster.nodelist():
+                    node._save()
+                cluster._update_config()
+        except BaseException:
+            common.rmdirs(os.path.join(path, name))
+            raise
+        return cluster
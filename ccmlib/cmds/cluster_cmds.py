@@ -19,15 +19,20 @@
 from __future__ import absolute_import
 
 import os
+import re
 import signal
 import subprocess
 import sys
+import time
 
 from six import print_
 
-from ccmlib import common, extension, repository
+from ccmlib import common, extension, images, procwatch, repository
+from ccmlib.cluster import DEFAULT_CLUSTER_STOP_TIMEOUT_IN_SECS, DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS
 from ccmlib.cluster_factory import ClusterFactory
 from ccmlib.cmds.command import Cmd
+from ccmlib.logcatalog import format_record
+from ccmlib.logrecords import parse_time
 from ccmlib.common import ArgumentError, get_default_signals
 from ccmlib.node import NodeError
 
@@ -43,6 +48,9 @@ CLUSTER_CMDS = [
     "liveset",
     "start",
     "stop",
+    "rolling-restart",
+    "orphans",
+    "snapshot-image",
     "flush",
     "compact",
     "stress",
@@ -56,6 +64,7 @@ CLUSTER_CMDS = [
     "verify",
     "invalidatecache",
     "checklogerror",
+    "logquery",
     "showlastlog",
     "jconsole",
     "setworkload",
@@ -108,6 +117,7 @@ class ClusterCreateCmd(Cmd):
         (['--quiet'], {'action': "store_false", 'dest': "verbose", 'help': "Don't show percentage progress output when downloading DSE or C*", 'default': True}),
         (['-S', '--use-single-interface'], { 'action' : "store_true", 'dest' : "use_single_interface", 'default' : False,
                           "help" : "Use multiple ports on a single interface instead of an interface per instance'"}),
+        (['--from-image'], {'type': "string", 'dest': "image", 'help': "Create the cluster, populated and bootstrapped, from an image taken with snapshot-image. The cluster keeps the addresses and ports of the image, so it cannot run next to the cluster the image was taken of or another cluster created from it", 'default': None}),
     ]
     descr_text = "Create a new cluster"
     usage = "usage: ccm create [options] cluster_name"
@@ -119,6 +129,12 @@ class ClusterCreateCmd(Cmd):
             parser.print_help()
             parser.error("%s and %s may not be used together" % (parser.get_option('-i'), parser.get_option('-I')))
         self.nodes = parse_populate_count(options.nodes)
+        if options.image:
+            for option, name in [(options.nodes, '-n'), (options.version, '-v'), (options.partitioner, '-p'),
+                                 (options.vnodes, '--vnodes')]:
+                if option:
+                    parser.error("%s may not be used with --from-image" % name)
+            return
         if self.options.vnodes and self.nodes is None:
             print_("Can't set --vnodes if not populating cluster in this command.")
             parser.print_help()
@@ -139,6 +155,9 @@ class ClusterCreateCmd(Cmd):
                 """)
 
     def run(self):
+        if self.options.image:
+            self.run_from_image()
+            return
         try:
             cluster_class = extension.get_cluster_class(self.options.install_dir, self.options)
             cluster = cluster_class(self.path, self.name, install_dir=self.options.install_dir, version=self.options.version, verbose=self.options.verbose, options=self.options)
@@ -203,6 +222,64 @@ class ClusterCreateCmd(Cmd):
                 exit(1)
 
 
+    def run_from_image(self):
+        try:
+            cluster = ClusterFactory.create_from_image(self.path, self.name, self.options.image,
+                                                       ipprefix=self.options.ipprefix, ipformat=self.options.ipformat,
+                                                       use_single_interface=self.options.use_single_interface)
+        except (common.ArgumentError, OSError) as e:
+            print_('Cannot create cluster: %s' % str(e), file=sys.stderr)
+            exit(1)
+
+        if not self.options.no_switch:
+            common.switch_cluster(self.path, self.name)
+            print_('Current cluster is now: %s' % self.name)
+
+        if self.options.start_nodes:
+            if cluster.start(verbose=self.options.debug, wait_for_binary_proto=True, jvm_args=self.options.jvm_args,
+                             allow_root=self.options.allow_root) is None:
+                print_("Error starting nodes, see above for details", file=sys.stderr)
+
+
+class ClusterSnapshotimageCmd(Cmd):
+
+    options_list = [
+        (['-f', '--force'], {'action': "store_true", 'dest': "force", 'help': "Replace an existing image of that name", 'default': False}),
+        (['-l', '--list'], {'action': "store_true", 'dest': "list", 'help': "List the existing images", 'default': False}),
+    ]
+    descr_text = "Capture the current (stopped) cluster as an image to create clusters from"
+    usage = "usage: ccm snapshot-image [options] image_name"
+
+    def validate(self, parser, options, args):
+        Cmd.validate(self, parser, options, args, load_cluster=not options.list)
+        if options.list:
+            return
+        if len(args) == 0:
+            print_('Missing image name', file=sys.stderr)
+            parser.print_help()
+            exit(1)
+        if not re.match('^[a-zA-Z0-9_-]+$', args[0]):
+            print_('Image name should only contain word characters or hyphen', file=sys.stderr)
+            exit(1)
+        self.name = args[0]
+
+    def run(self):
+        if self.options.list:
+            for image in images.list_images(self.path):
+                print_("{} (cluster {}, Cassandra {}, {})".format(image.name, image.cluster, image.cassandra_version,
+                                                                  time.strftime('%Y-%m-%d %H:%M:%S',
+                                                                                time.localtime(image.created))))
+            return
+        try:
+            image, counts = self.cluster.snapshot_image(self.name, force=self.options.force)
+        except common.ArgumentError as e:
+            print_(str(e), file=sys.stderr)
+            exit(1)
+        print_("Image {} taken of cluster {} ({} files hard linked, {} reflinked, {} copied)"
+               .format(image.name, image.cluster, counts.get(images.HARDLINK, 0), counts.get(images.REFLINK, 0),
+                       counts.get(images.COPY, 0)))
+
+
 class ClusterAddCmd(Cmd):
 
     options_list = [
@@ -488,6 +565,8 @@ class ClusterStartCmd(Cmd):
         (['--quiet-windows'], {'action': "store_true", 'dest': "quiet_start", 'help': "Pass -q on Windows 2.2.4+ and 3.0+ startup. Ignored on linux.", 'default': False}),
         (['--root'], {'action': "store_true", 'dest': "allow_root", 'help': "Allow CCM to start cassandra as root", 'default': False}),
         (['--jvm-version'], {'type': "int", 'dest': "jvm_version", 'help': "Specify the JVM version to use (e.g. 8 for Java 8)", 'default': None}),
+        (['--max-concurrency'], {'type': "int", 'dest': "max_concurrency", 'help': "Start the nodes by waves of at most that many nodes", 'default': None}),
+        (['--seeds-first'], {'action': "store_true", 'dest': "seeds_first", 'help': "Start the seeds before the other nodes", 'default': False}),
     ]
     descr_text = "Start all the non started nodes of the current cluster"
     usage = "usage: ccm cluster start [options]"
@@ -520,7 +599,9 @@ class ClusterStartCmd(Cmd):
                                   profile_options=profile_options,
                                   quiet_start=self.options.quiet_start,
                                   allow_root=self.options.allow_root,
-                                  jvm_version=self.options.jvm_version) is None:
+                                  jvm_version=self.options.jvm_version,
+                                  max_concurrency=self.options.max_concurrency,
+                                  seeds_first=self.options.seeds_first) is None:
                 details = ""
                 if not self.options.verbose:
                     details = " (you can use --verbose for more information)"
@@ -542,6 +623,8 @@ class ClusterStopCmd(Cmd):
         (['-g', '--gently'], {'action': "store_const", 'dest': "signal_event", 'help': "Shut down gently (default)", 'const': signal.SIGTERM, 'default': signal.SIGTERM}),
         (['--hang-up'], {'action': "store_const", 'dest': "signal_event", 'help': "Shut down via hang up (kill -1)", 'const': get_default_signals()['1']}),
         (['--not-gently'], {'action': "store_const", 'dest': "signal_event", 'help': "Shut down immediately (kill -9)", 'const': get_default_signals()['9']}),
+        (['--timeout'], {'type': "int", 'dest': "timeout", 'help': "Seconds given to the nodes to stop (default: %d)" % DEFAULT_CLUSTER_STOP_TIMEOUT_IN_SECS, 'default': DEFAULT_CLUSTER_STOP_TIMEOUT_IN_SECS}),
+        (['--kill-on-timeout'], {'action': "store_true", 'dest': "kill_on_timeout", 'help': "Kill (kill -9) the nodes still running after the timeout", 'default': False}),
     ]
     descr_text = "Stop all the nodes of the cluster"
     usage = "usage: ccm cluster stop [options] name"
@@ -551,17 +634,72 @@ class ClusterStopCmd(Cmd):
 
     def run(self):
         try:
-            not_running = self.cluster.stop(wait=not self.options.no_wait, signal_event=self.options.signal_event)
+            not_running = self.cluster.stop(wait=not self.options.no_wait, signal_event=self.options.signal_event,
+                                            timeout=self.options.timeout, kill_on_timeout=self.options.kill_on_timeout)
             if self.options.verbose and len(not_running) > 0:
                 sys.stdout.write("The following nodes were not running: ")
                 for node in not_running:
                     sys.stdout.write(node.name + " ")
                 print_("")
+            if self.options.verbose and not self.options.no_wait:
+                for stop in self.cluster.last_stop:
+                    print_("{} stopped in {:.1f}s{}".format(stop.node, stop.duration, " (killed)" if stop.killed else ""))
         except NodeError as e:
             print_(str(e), file=sys.stderr)
             exit(1)
 
 
+class ClusterRollingrestartCmd(Cmd):
+
+    options_list = [
+        (['-m', '--max-unavailable'], {'type': "int", 'dest': "max_unavailable", 'help': "Number of nodes restarted at once (default: 1)", 'default': 1}),
+        (['--all-dcs'], {'action': "store_false", 'dest': "per_dc", 'help': "Apply --max-unavailable to the whole cluster rather than to each data center", 'default': True}),
+        (['--timeout'], {'type': "int", 'dest': "timeout", 'help': "Seconds given to the nodes of a wave to be back (default: %d)" % DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS, 'default': DEFAULT_CLUSTER_WAIT_TIMEOUT_IN_SECS}),
+        (['--kill-on-timeout'], {'action': "store_true", 'dest': "kill_on_timeout", 'help': "Kill (kill -9) the nodes of a wave still running after the stop timeout", 'default': False}),
+        (['--jvm_arg'], {'action': "append", 'dest': "jvm_args", 'help': "Specify a JVM argument", 'default': []}),
+        (['--root'], {'action': "store_true", 'dest': "allow_root", 'help': "Allow CCM to start cassandra as root", 'default': False}),
+    ]
+    descr_text = "Restart the running nodes of the cluster, a few at a time"
+    usage = "usage: ccm rolling-restart [options]"
+
+    def validate(self, parser, options, args):
+        Cmd.validate(self, parser, options, args, load_cluster=True)
+        if options.max_unavailable < 1:
+            parser.error("--max-unavailable must be at least 1")
+
+    def run(self):
+        try:
+            self.cluster.rolling_restart(max_unavailable=self.options.max_unavailable, per_dc=self.options.per_dc,
+                                         timeout=self.options.timeout, kill_on_timeout=self.options.kill_on_timeout,
+                                         jvm_args=self.options.jvm_args, allow_root=self.options.allow_root)
+        except NodeError as e:
+            print_(str(e), file=sys.stderr)
+            exit(1)
+        finally:
+            for wave in self.cluster.last_rolling_restart:
+                print_("{} restarted in {:.1f}s (stop {:.1f}s, start {:.1f}s)"
+                       .format(", ".join(wave.nodes), wave.duration, wave.stop_duration, wave.start_duration))
+
+
+class ClusterOrphansCmd(Cmd):
+
+    options_list = [
+        (['-k', '--kill'], {'action': "store_true", 'dest': "kill", 'help': "Kill (kill -9) the orphaned processes", 'default': False}),
+    ]
+    descr_text = "List the Cassandra processes of removed clusters or nodes that are still running"
+    usage = "usage: ccm orphans [options]"
+
+    def validate(self, parser, options, args):
+        Cmd.validate(self, parser, options, args)
+
+    def run(self):
+        orphans = procwatch.orphaned_processes(self.path)
+        for orphan in orphans:
+            print_("{} {}".format(orphan.pid, orphan.logdir))
+        if self.options.kill:
+            procwatch.kill_processes([orphan.logdir for orphan in orphans], get_default_signals()['9'], processes=orphans)
+
+
 class _ClusterNodetoolCmd(Cmd):
     usage = "This is a private class, how did you get here?"
     descr_text = "This is a private class, how did you get here?"
@@ -795,13 +933,20 @@ class ClusterInvalidatecacheCmd(Cmd):
 
 class ClusterChecklogerrorCmd(Cmd):
 
+    options_list = [
+        (['-s', '--summary'], {'action': "store_true", 'dest': "summary", 'default': False, 'help': "Group identical errors (same exception and top stack frames) and show their counts with one exemplar each"}),
+    ]
     descr_text = "Check for errors in log file of each node."
-    usage = "usage: ccm checklogerror"
+    usage = "usage: ccm checklogerror [options]"
 
     def validate(self, parser, options, args):
         Cmd.validate(self, parser, options, args, load_cluster=True)
 
     def run(self):
+        if self.options.summary:
+            for line in self.cluster.summarize_log_errors().format():
+                print_(line)
+            return
         for node in self.cluster.nodelist():
             errors = node.grep_log_for_errors()
             for mylist in errors:
@@ -809,6 +954,50 @@ class ClusterChecklogerrorCmd(Cmd):
                     print_(line)
 
 
+class ClusterLogqueryCmd(Cmd):
+
+    options_list = [
+        (['-l', '--level'], {'type': "string", 'dest': "level", 'default': None, 'help': "Comma separated list of levels (ERROR, WARN, ...) of the records to show"}),
+        (['-n', '--nodes'], {'type': "string", 'dest': "nodes", 'default': None, 'help': "Comma separated list of the nodes whose records to show"}),
+        (['-f', '--files'], {'type': "string", 'dest': "files", 'default': None, 'help': "Comma separated list of the log files (system.log, debug.log, gc.log) to search"}),
+        (['--logger'], {'type': "string", 'dest': "logger", 'default': None, 'help': "Only show records logged by this class (e.g. CompactionTask)"}),
+        (['--since'], {'type': "string", 'dest': "since", 'default': None, 'help': "Only show records logged at or after this time (YYYY-MM-DD HH:MM:SS, or seconds since the epoch)"}),
+        (['--until'], {'type': "string", 'dest': "until", 'default': None, 'help': "Only show records logged before this time (YYYY-MM-DD HH:MM:SS, or seconds since the epoch)"}),
+        (['--limit'], {'type': "int", 'dest': "limit", 'default': None, 'help': "Maximum number of records to show"}),
+        (['--no-ingest'], {'action': "store_true", 'dest': "no_ingest", 'default': False, 'help': "Do not load the records logged since the last query"}),
+    ]
+    descr_text = "Search the logs of all nodes through the log catalog of the cluster (a SQLite database loaded incrementally)"
+    usage = "usage: ccm logquery [options] [text]"
+
+    def validate(self, parser, options, args):
+        Cmd.validate(self, parser, options, args, load_cluster=True)
+        self.text = ' '.join(args) or None
+        try:
+            self.since = parse_time(options.since) if options.since else None
+            self.until = parse_time(options.until) if options.until else None
+        except ValueError as e:
+            print_(str(e), file=sys.stderr)
+            parser.print_help()
+            exit(1)
+
+    def _split(self, value):
+        return value.split(',') if value else None
+
+    def run(self):
+        records = self.cluster.query_logs(self.text,
+                                          ingest=not self.options.no_ingest,
+                                          level=self._split(self.options.level),
+                                          nodes=self._split(self.options.nodes),
+                                          files=self._split(self.options.files),
+                                          logger=self.options.logger,
+                                          since=self.since,
+                                          until=self.until,
+                                          limit=self.options.limit)
+        for record in records:
+            for line in format_record(record):
+                print_(line)
+
+
 class ClusterShowlastlogCmd(Cmd):
 
     descr_text = "Show the last.log for the most recent build through your $PAGER"
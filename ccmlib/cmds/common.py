@@ -2,7 +2,7 @@ from ccmlib.cmds import cluster_cmds, command, node_cmds
 
 
 def get_command(kind, cmd):
-    cmd_name = kind.lower().capitalize() + cmd.lower().capitalize() + "Cmd"
+    cmd_name = kind.lower().capitalize() + cmd.lower().replace('-', '').capitalize() + "Cmd"
     try:
         klass = (cluster_cmds if kind.lower() == 'cluster' else node_cmds).__dict__[cmd_name]
     except KeyError:
@@ -27,6 +27,8 @@ from six import print_
 
 from ccmlib import common
 from ccmlib.cmds.command import Cmd
+from ccmlib.gclog import format_gc_stats
+from ccmlib.logrecords import parse_time
 from ccmlib.node import NodeError
 
 NODE_CMDS = [
@@ -72,7 +74,8 @@ NODE_CMDS = [
     "resume",
     "jconsole",
     "versionfrombuild",
-    "byteman"
+    "byteman",
+    "gcstats"
 ]
 
 
@@ -829,3 +832,27 @@ class NodeBytemanCmd(Cmd):
 
     def run(self):
         self.node.byteman_submit(self.byteman_options)
+
+
+class NodeGcstatsCmd(Cmd):
+
+    options_list = [
+        (['--since'], {'type': "string", 'dest': "since", 'default': None, 'help': "Only count the pauses at or after this time (YYYY-MM-DD HH:MM:SS, or seconds since the epoch)"}),
+        (['--until'], {'type': "string", 'dest': "until", 'default': None, 'help': "Only count the pauses before this time (YYYY-MM-DD HH:MM:SS, or seconds since the epoch)"}),
+    ]
+    descr_text = "Show the GC pause statistics and allocation and promotion rates of a node, from its gc log"
+    usage = "usage: ccm node_name gcstats [options]"
+
+    def validate(self, parser, options, args):
+        Cmd.validate(self, parser, options, args, node_name=True, load_cluster=True)
+        try:
+            self.since = parse_time(options.since) if options.since else None
+            self.until = parse_time(options.until) if options.until else None
+        except ValueError as e:
+            print_(str(e), file=sys.stderr)
+            parser.print_help()
+            exit(1)
+
+    def run(self):
+        for line in format_gc_stats(self.node.gc_stats(since=self.since, until=self.until)):
+            print_(line)
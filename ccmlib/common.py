@@ -33,6 +33,7 @@ import socket
 import stat
 import subprocess
 import sys
+import threading
 import time
 import yaml
 from distutils.version import LooseVersion  #pylint: disable=import-error, no-name-in-module
@@ -1020,6 +1021,44 @@ def is_intlike(obj):
     return isinstance(obj, six.integer_types)
 
 
+def parallel_map(func, items, max_workers=None):
+    """
+    Calls func on each of items, from up to max_workers threads at a time (one
+    per item by default), and returns the list of the results in the order of
+    items. If some calls raise, the exception of the first of their items is
+    raised once all the calls are over.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers == 1:
+        return [func(item) for item in items]
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    remaining = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                i, item = next(remaining, (None, None))
+            if i is None:
+                return
+            try:
+                results[i] = func(item)
+            except BaseException:
+                errors[i] = sys.exc_info()
+
+    threads = [threading.Thread(target=work) for _ in range(min(max_workers or len(items), len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        if error is not None:
+            six.reraise(*error)
+    return results
+
+
 def wait_for_any_log(nodes, pattern, timeout, filename='system.log', marks=None):
     """
     Look for a pattern in the system.log of any in a given list
@@ -0,0 +1,190 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# compaction log analysis
+#
+# With the log_all compaction option (Cassandra 3.6+), nodes log one JSON
+# object per line to logs/compaction.log for each flush, compaction and
+# change in the number of pending compactions of a table. A CompactionLog
+# reads the file incrementally, so that it can be refreshed during a stress
+# run as well as read once afterwards, and keeps per-table totals.
+#
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from ccmlib.logindex import decode_line, iter_lines
+
+logger = logging.getLogger(__name__)
+
+Compaction = namedtuple('Compaction', ['keyspace', 'table', 'start', 'end', 'bytes_in', 'bytes_out', 'sstables_in',
+                                       'sstables_out'])
+Compaction.__doc__ = """
+A compaction of the log: start and end are in seconds since the epoch, sizes
+in bytes.
+"""
+
+CompactionStats = namedtuple('CompactionStats', ['compactions', 'bytes_in', 'bytes_out', 'duration', 'throughput_in',
+                                                 'throughput_out', 'bytes_flushed', 'write_amplification'])
+CompactionStats.__doc__ = """
+Totals of a table: duration is the time spent compacting (in seconds),
+throughputs are in bytes per second of compaction, and write_amplification
+is the ratio of the bytes written by flushes and compactions to the bytes
+flushed (None until something was flushed).
+"""
+
+
+def _seconds(millis):
+    # start and end are logged as strings
+    return int(millis) / 1000.0
+
+
+def _sstables_size(sstables):
+    return sum(entry.get('table', {}).get('size', 0) for entry in sstables or ())
+
+
+class _TableTotals(object):
+
+    def __init__(self):
+        self.compactions = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.duration = 0.0
+        self.bytes_flushed = 0
+        # latest pending count of each compaction strategy of the table
+        self.pending_by_strategy = {}
+        self.pending = []
+
+    def stats(self):
+        written = self.bytes_flushed + self.bytes_out
+        return CompactionStats(compactions=self.compactions,
+                               bytes_in=self.bytes_in,
+                               bytes_out=self.bytes_out,
+                               duration=self.duration,
+                               throughput_in=self.bytes_in / self.duration if self.duration > 0 else None,
+                               throughput_out=self.bytes_out / self.duration if self.duration > 0 else None,
+                               bytes_flushed=self.bytes_flushed,
+                               write_amplification=written / float(self.bytes_flushed) if self.bytes_flushed else None)
+
+
+class CompactionLog(object):
+    """
+    Incremental analysis of the compaction.log of a node. Call refresh() to
+    read what was appended since the previous call.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, file_id):
+        self._file_id = file_id
+        self._end = 0
+        self._tables = {}
+        self.compactions = []
+
+    def refresh(self):
+        """
+        Reads the events logged since the last call. Returns self.
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return self
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                file_id = (st.st_dev, st.st_ino)
+                if file_id != self._file_id or st.st_size < self._end:
+                    self._reset(file_id)
+                for offset, raw in iter_lines(f, self._end):
+                    if offset is None:
+                        # wait for the writer to finish the line
+                        break
+                    self._end = offset + len(raw)
+                    self.feed(decode_line(raw))
+            return self
+
+    def feed(self, line):
+        """
+        Accounts for a line of the compaction log.
+        """
+        try:
+            event = json.loads(line)
+        except ValueError:
+            logger.debug("Ignoring compaction log line {}".format(line.rstrip()))
+            return
+        kind = event.get('type')
+        if kind not in ('compaction', 'flush', 'pending'):
+            return
+        key = (event.get('keyspace'), event.get('table'))
+        with self._lock:
+            totals = self._tables.get(key)
+            if totals is None:
+                totals = self._tables[key] = _TableTotals()
+            if kind == 'flush':
+                totals.bytes_flushed += _sstables_size(event.get('tables'))
+            elif kind == 'pending':
+                totals.pending_by_strategy[event.get('strategyId')] = event.get('pending', 0)
+                totals.pending.append((_seconds(event['time']), sum(totals.pending_by_strategy.values())))
+            else:
+                compaction = Compaction(keyspace=key[0], table=key[1],
+                                        start=_seconds(event['start']), end=_seconds(event['end']),
+                                        bytes_in=_sstables_size(event.get('input')),
+                                        bytes_out=_sstables_size(event.get('output')),
+                                        sstables_in=len(event.get('input') or ()),
+                                        sstables_out=len(event.get('output') or ()))
+                self.compactions.append(compaction)
+                totals.compactions += 1
+                totals.bytes_in += compaction.bytes_in
+                totals.bytes_out += compaction.bytes_out
+                totals.duration += compaction.end - compaction.start
+
+    def tables(self):
+        """
+        Returns the (keyspace, table) pairs found in the log.
+        """
+        with self._lock:
+            return sorted(self._tables)
+
+    def table_stats(self, keyspace, table):
+        """
+        Returns the CompactionStats of a table, None if it is not in the log.
+        """
+        with self._lock:
+            totals = self._tables.get((keyspace, table))
+            return totals.stats() if totals is not None else None
+
+    def stats(self):
+        """
+        Returns a dict of the CompactionStats of every (keyspace, table).
+        """
+        with self._lock:
+            return dict((key, totals.stats()) for key, totals in self._tables.items())
+
+    def pending_compactions(self, keyspace, table):
+        """
+        Returns the curve of the pending compactions of a table, as a list of
+        (seconds since the epoch, pending compactions of all its strategies).
+        """
+        with self._lock:
+            totals = self._tables.get((keyspace, table))
+            return list(totals.pending) if totals is not None else []
@@ -0,0 +1,213 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# native transport readiness
+#
+# A node may accept connections on its binary interface before it serves
+# requests. It is ready once it answers an OPTIONS frame of the native
+# protocol with SUPPORTED (or with a protocol error, for servers that do not
+# speak the version of the frame). All the interfaces are probed together
+# from non-blocking sockets in a single select() loop, each retrying with a
+# delay that doubles after each failed attempt.
+#
+
+from __future__ import absolute_import
+
+import errno
+import select
+import socket
+import struct
+import time
+from collections import OrderedDict
+
+# native protocol v3, understood by Cassandra 2.1 and later
+_PROTOCOL_VERSION = 3
+_OPTIONS = 0x05
+_SUPPORTED = 0x06
+_ERROR = 0x00
+_PROTOCOL_ERROR = 0x000A
+OPTIONS_FRAME = struct.pack('>BBhBI', _PROTOCOL_VERSION, 0, 0, _OPTIONS, 0)
+
+# delays between two attempts on an interface
+INITIAL_RETRY_DELAY = 0.01
+MAX_RETRY_DELAY = 0.5
+# time given to a connected server to answer
+ATTEMPT_TIMEOUT = 2
+
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK))
+
+
+def parse_response(data):
+    """
+    Returns True if data, the start of the answer of a server to an OPTIONS
+    frame, tells that the server is ready, False if it tells otherwise, and
+    None if more bytes are needed to tell.
+    """
+    if not data:
+        return None
+    version = ord(data[0:1])
+    if not version & 0x80:
+        return False
+    # the headers of protocol v1 and v2 have a 1 byte stream id
+    header_size = 9 if version & 0x7f >= 3 else 8
+    if len(data) < header_size:
+        return None
+    opcode = ord(data[header_size - 5:header_size - 4])
+    if opcode == _SUPPORTED:
+        return True
+    if opcode != _ERROR:
+        return False
+    if len(data) < header_size + 4:
+        return None
+    return struct.unpack('>i', data[header_size:header_size + 4])[0] == _PROTOCOL_ERROR
+
+
+class _Probe(object):
+
+    def __init__(self, name, itf, tcp_only=False):
+        self.name = name
+        self.itf = itf
+        self.tcp_only = tcp_only
+        self.sock = None
+        self.connected = False
+        self.data = b''
+        self.delay = INITIAL_RETRY_DELAY
+        self.next_attempt = 0
+        self.attempt_deadline = None
+        self.ready_at = None
+
+    def connect(self, now):
+        self.attempt_deadline = now + ATTEMPT_TIMEOUT
+        self.connected = False
+        self.data = b''
+        try:
+            family, socktype, proto, _, sockaddr = socket.getaddrinfo(self.itf[0], self.itf[1], socket.AF_UNSPEC,
+                                                                      socket.SOCK_STREAM)[0]
+            self.sock = socket.socket(family, socktype, proto)
+            self.sock.setblocking(False)
+            err = self.sock.connect_ex(sockaddr)
+        except socket.error:
+            self.fail(now)
+            return
+        if err == 0:
+            self.on_writable(now)
+        elif err not in _IN_PROGRESS:
+            self.fail(now)
+
+    def on_writable(self, now):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err != 0:
+            self.fail(now)
+            return
+        if self.tcp_only:
+            self.succeed(now)
+            return
+        self.connected = True
+        try:
+            self.sock.sendall(OPTIONS_FRAME)
+        except socket.error:
+            self.fail(now)
+
+    def on_readable(self, now):
+        try:
+            chunk = self.sock.recv(64)
+        except socket.error as e:
+            if e.args[0] not in _IN_PROGRESS:
+                self.fail(now)
+            return
+        if not chunk:
+            # closed by the server
+            self.fail(now)
+            return
+        self.data += chunk
+        ready = parse_response(self.data)
+        if ready:
+            self.succeed(now)
+        elif ready is not None:
+            self.fail(now)
+
+    def succeed(self, now):
+        self.close()
+        self.ready_at = now
+
+    def fail(self, now):
+        self.close()
+        self.next_attempt = now + self.delay
+        self.delay = min(self.delay * 2, MAX_RETRY_DELAY)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def probe_native_transports(interfaces, timeout=60, tcp_only=()):
+    """
+    Probes the binary interfaces of several nodes at once until each of them
+    is ready or timeout seconds have passed.
+      - interfaces: a dict of name to (address, port)
+      - tcp_only: names of the interfaces that are only checked to accept
+        connections (e.g. the ones requiring TLS)
+    Returns an OrderedDict of name to the time (since the epoch) the
+    interface was seen ready, or None if it was not ready in time.
+    """
+    probes = [_Probe(name, itf, name in tcp_only) for name, itf in interfaces.items()]
+    deadline = time.time() + timeout
+    try:
+        while True:
+            now = time.time()
+            pending = [probe for probe in probes if probe.ready_at is None]
+            if not pending or now > deadline:
+                break
+            for probe in pending:
+                if probe.sock is None and now >= probe.next_attempt:
+                    probe.connect(now)
+                elif probe.sock is not None and now > probe.attempt_deadline:
+                    probe.fail(now)
+            waiting = [probe for probe in pending if probe.sock is not None]
+            wake_at = min([deadline] + [probe.attempt_deadline for probe in waiting] +
+                          [probe.next_attempt for probe in pending if probe.sock is None])
+            wait = max(0, wake_at - time.time())
+            if not waiting:
+                time.sleep(wait)
+                continue
+            readers = [probe.sock for probe in waiting if probe.connected]
+            writers = [probe.sock for probe in waiting if not probe.connected]
+            try:
+                readable, writable, _ = select.select(readers, writers, [], wait)
+            except (OSError, select.error) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            now = time.time()
+            for probe in waiting:
+                if probe.sock in writable:
+                    probe.on_writable(now)
+                elif probe.sock in readable:
+                    probe.on_readable(now)
+    finally:
+        for probe in probes:
+            probe.close()
+    return OrderedDict((probe.name, probe.ready_at) for probe in probes)
+
+
+def check_native_transport(itf, timeout=60, tcp_only=False):
+    """
+    Returns True once the binary interface itf answers native protocol
+    requests, or False if it does not within timeout seconds.
+    """
+    return probe_native_transports({itf: itf}, timeout, (itf,) if tcp_only else ())[itf] is not None
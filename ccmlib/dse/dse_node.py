@@ -38,6 +38,9 @@ class DseNode(Node):
     Provides interactions to a DSE node.
     """
 
+    # DSE nodes take longer to be seen UP by their peers
+    watch_log_for_alive_timeout = 720
+
     @staticmethod
     def get_version_from_build(install_dir=None, node_path=None, cassandra=False):
         if install_dir is None and node_path is not None:
@@ -139,15 +142,6 @@ class DseNode(Node):
             self._dse_config_options = common.merge_configuration(self._dse_config_options, values)
         self.import_dse_config_files()
 
-    def watch_log_for_alive(self, nodes, from_mark=None, timeout=720, filename='system.log'):
-        """
-        Watch the log of this node until it detects that the provided other
-        nodes are marked UP. This method works similarly to watch_log_for_death.
-
-        We want to provide a higher default timeout when this is called on DSE.
-        """
-        super(DseNode, self).watch_log_for_alive(nodes, from_mark=from_mark, timeout=timeout, filename=filename)
-
     def get_launch_bin(self):
         cdir = self.get_install_dir()
         launch_bin = common.join_bin(cdir, 'bin', 'dse')
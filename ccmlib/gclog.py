@@ -0,0 +1,329 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# gc log analysis
+#
+# Nodes log their garbage collections to logs/gc.log (-Xloggc on JDK 8,
+# -Xlog:gc on JDK 9+). GcLogParser turns the lines of either format into
+# GcEvents (one per stop-the-world pause) as they are fed, and gc_stats()
+# sums the events of a time window up into pause statistics and allocation
+# and promotion rates.
+#
+
+from __future__ import absolute_import
+
+import calendar
+import re
+import time
+from collections import namedtuple
+
+from ccmlib.logindex import decode_line, iter_lines
+
+GcEvent = namedtuple('GcEvent', ['timestamp', 'uptime', 'kind', 'pause', 'heap_before', 'heap_after', 'heap_capacity',
+                                 'young_before', 'young_after', 'old_before', 'old_after'])
+GcEvent.__doc__ = """
+A stop-the-world pause: timestamp is in seconds since the epoch and uptime in
+seconds since the JVM started (either may be None if the log does not have
+it), kind is e.g. 'Young', 'Mixed', 'Full' or 'Remark', pause is in seconds
+and the sizes, in bytes, are None when the log does not tell them.
+"""
+
+GcStats = namedtuple('GcStats', ['count', 'total', 'p50', 'p99', 'max', 'kinds', 'duration', 'allocated',
+                                 'promoted', 'allocation_rate', 'promotion_rate'])
+GcStats.__doc__ = """
+Statistics of the GC pauses of a window: count, total, p50, p99 and max are
+in seconds, kinds maps each kind of pause to its count, duration is the time
+between the first and the last pause, allocated and promoted are in bytes and
+rates in bytes per second (None if the log does not tell the sizes).
+"""
+
+_UNITS = {'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+_SIZE = r'(\d+(?:\.\d+)?)([BKMG])'
+_DATE = r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\.(\d{3})([+-]\d{4})'
+
+# JDK 8: 2023-03-01T10:00:00.123+0000: 12.345: [GC (Allocation Failure) ...
+_JDK8_START_RE = re.compile(r'^(?:' + _DATE + r': )?(?:(\d+\.\d+): )?\[(Full GC|GC)\b(.*)$')
+_JDK8_PAUSE_RE = re.compile(r', (\d+\.\d+) secs\]')
+_JDK8_TRANSITION_RE = re.compile(r'(?:\[(\w+(?: \w+)?): )?' + _SIZE + '->' + _SIZE + r'\(' + _SIZE + r'\)')
+_JDK8_G1_SIZES_RE = re.compile(r'Eden: ' + _SIZE + r'\(' + _SIZE + r'\)->' + _SIZE + r'\(' + _SIZE + r'\) '
+                               r'Survivors: ' + _SIZE + '->' + _SIZE + ' '
+                               r'Heap: ' + _SIZE + r'\(' + _SIZE + r'\)->' + _SIZE + r'\(' + _SIZE + r'\)')
+
+# JDK 9+: [2023-03-01T10:00:00.123+0000][12.345s][info][gc] GC(12) Pause Young (Normal) ... 24M->4M(256M) 12.345ms
+_UNIFIED_RE = re.compile(r'^((?:\[[^\]]*\])+)\s*(.*)$')
+_UNIFIED_DATE_RE = re.compile(r'^' + _DATE + '$')
+_UNIFIED_UPTIME_RE = re.compile(r'^(\d+(?:\.\d+)?)s$')
+_UNIFIED_PAUSE_RE = re.compile(r'^GC\((\d+)\) Pause (.*?)(?: ' + _SIZE + '->' + _SIZE + r'\(' + _SIZE + r'\))? '
+                               r'(\d+(?:\.\d+)?)ms$')
+_UNIFIED_GENERATION_RE = re.compile(r'^GC\((\d+)\) (\w+): ' + _SIZE + '->' + _SIZE + r'\(' + _SIZE + r'\)')
+_UNIFIED_REGIONS_RE = re.compile(r'^GC\((\d+)\) (Eden|Survivor|Old) regions: (\d+)->(\d+)')
+_REGION_SIZE_RE = re.compile(r'Heap [Rr]egion [Ss]ize: ' + _SIZE)
+
+_YOUNG_GENERATIONS = ('ParNew', 'DefNew', 'PSYoungGen')
+_OLD_GENERATIONS = ('CMS', 'Tenured', 'ParOldGen', 'PSOldGen')
+
+
+def _bytes(value, unit):
+    return int(float(value) * _UNITS[unit])
+
+
+def _parse_date(date, millis, zone):
+    # dates of gc logs carry their UTC offset
+    offset = (int(zone[1:3]) * 3600 + int(zone[3:5]) * 60) * (-1 if zone[0] == '-' else 1)
+    return calendar.timegm(time.strptime(date, '%Y-%m-%dT%H:%M:%S')) - offset + int(millis) / 1000.0
+
+
+def _jdk8_kind(collector, text):
+    if collector == 'Full GC':
+        return 'Full'
+    if '(mixed)' in text:
+        return 'Mixed'
+    if '(young)' in text or any('[{}'.format(name) in text for name in _YOUNG_GENERATIONS):
+        return 'Young'
+    for kind in ('Initial Mark', 'Remark', 'Cleanup'):
+        if kind.lower() in text.lower():
+            return kind
+    return 'Other'
+
+
+def _unified_kind(description):
+    kind = description.split(' (')[0]
+    if kind == 'Young' and '(Mixed)' in description:
+        return 'Mixed'
+    return kind
+
+
+class GcLogParser(object):
+    """
+    Parses JDK 8 (-Xloggc with -XX:+PrintGCDetails) and JDK 9+ (-Xlog:gc)
+    gc logs. Lines are fed one at a time and the pauses they complete are
+    returned as GcEvents, so that logs of any size can be read in a stream.
+    """
+
+    def __init__(self):
+        # JDK 8 events span several lines with some options
+        self._jdk8_lines = None
+        self._jdk8_start = None
+        # JDK 9+ details of the collections in progress, by GC id
+        self._details = {}
+        self._region_size = None
+
+    def feed(self, line):
+        """
+        Returns the list of the GcEvents that line completes.
+        """
+        line = line.rstrip('\r\n')
+        events = []
+        m = _JDK8_START_RE.match(line)
+        if m is not None:
+            events.extend(self.flush())
+            self._jdk8_start = m
+            self._jdk8_lines = [m.group(5) + m.group(6)]
+        elif self._jdk8_lines is not None:
+            # -XX:+PrintTenuringDistribution splits "[ParNew: sizes" in two
+            if not line.startswith(('Desired survivor size', '- age')):
+                self._jdk8_lines.append(line)
+        else:
+            m = _UNIFIED_RE.match(line)
+            if m is not None:
+                event = self._feed_unified(m.group(1)[1:-1].split(']['), m.group(2))
+                if event is not None:
+                    events.append(event)
+            return events
+        if '[Times:' in line:
+            events.extend(self.flush())
+        return events
+
+    def flush(self):
+        """
+        Returns the event of the JDK 8 lines fed so far, if complete. To call
+        at the end of the log.
+        """
+        if self._jdk8_lines is None:
+            return []
+        m, text = self._jdk8_start, ''.join(self._jdk8_lines).split('[Times:')[0]
+        self._jdk8_lines = self._jdk8_start = None
+        pauses = _JDK8_PAUSE_RE.findall(text)
+        if not pauses:
+            return []
+        timestamp = _parse_date(m.group(1), m.group(2), m.group(3)) if m.group(1) else None
+        uptime = float(m.group(4)) if m.group(4) else None
+        sizes = {}
+        g1 = _JDK8_G1_SIZES_RE.search(text)
+        if g1 is not None:
+            values = g1.groups()
+            eden_before, _, eden_after, _, survivors_before, survivors_after, heap_before, capacity, heap_after, _ = \
+                [_bytes(values[i], values[i + 1]) for i in range(0, len(values), 2)]
+            sizes = dict(heap_before=heap_before, heap_after=heap_after, heap_capacity=capacity,
+                         young_before=eden_before + survivors_before, young_after=eden_after + survivors_after)
+        else:
+            for name, before, before_unit, after, after_unit, capacity, capacity_unit in _JDK8_TRANSITION_RE.findall(text):
+                before, after = _bytes(before, before_unit), _bytes(after, after_unit)
+                if not name:
+                    if 'heap_before' not in sizes:
+                        sizes.update(heap_before=before, heap_after=after,
+                                     heap_capacity=_bytes(capacity, capacity_unit))
+                elif name in _YOUNG_GENERATIONS:
+                    sizes.update(young_before=before, young_after=after)
+                elif name in _OLD_GENERATIONS:
+                    sizes.update(old_before=before, old_after=after)
+        if 'old_before' not in sizes and 'young_before' in sizes and 'heap_before' in sizes:
+            sizes['old_before'] = sizes['heap_before'] - sizes['young_before']
+            sizes['old_after'] = sizes['heap_after'] - sizes['young_after']
+        return [self._event(timestamp, uptime, _jdk8_kind(m.group(5), text), float(pauses[-1]), sizes)]
+
+    def _feed_unified(self, decorations, message):
+        timestamp = uptime = None
+        for decoration in decorations:
+            date = _UNIFIED_DATE_RE.match(decoration)
+            if date is not None:
+                timestamp = _parse_date(*date.groups())
+                continue
+            seconds = _UNIFIED_UPTIME_RE.match(decoration)
+            if seconds is not None:
+                uptime = float(seconds.group(1))
+
+        region_size = _REGION_SIZE_RE.search(message)
+        if region_size is not None:
+            self._region_size = _bytes(*region_size.groups())
+            return None
+        m = _UNIFIED_GENERATION_RE.match(message)
+        if m is not None:
+            gc_id, name, before, before_unit, after, after_unit, _, _ = m.groups()
+            details = self._details.setdefault(gc_id, {})
+            if name in _YOUNG_GENERATIONS:
+                details.update(young_before=_bytes(before, before_unit), young_after=_bytes(after, after_unit))
+            elif name in _OLD_GENERATIONS:
+                details.update(old_before=_bytes(before, before_unit), old_after=_bytes(after, after_unit))
+            return None
+        m = _UNIFIED_REGIONS_RE.match(message)
+        if m is not None:
+            gc_id, space, before, after = m.groups()
+            if self._region_size is not None:
+                details = self._details.setdefault(gc_id, {})
+                key = 'old' if space == 'Old' else 'young'
+                details[key + '_before'] = details.get(key + '_before', 0) + int(before) * self._region_size
+                details[key + '_after'] = details.get(key + '_after', 0) + int(after) * self._region_size
+            return None
+        m = _UNIFIED_PAUSE_RE.match(message)
+        if m is None:
+            return None
+        gc_id, description = m.group(1), m.group(2)
+        sizes = self._details.pop(gc_id, {})
+        if m.group(3) is not None:
+            sizes.update(heap_before=_bytes(m.group(3), m.group(4)), heap_after=_bytes(m.group(5), m.group(6)),
+                         heap_capacity=_bytes(m.group(7), m.group(8)))
+        return self._event(timestamp, uptime, _unified_kind(description), float(m.group(9)) / 1000.0, sizes)
+
+    def _event(self, timestamp, uptime, kind, pause, sizes):
+        return GcEvent(timestamp=timestamp, uptime=uptime, kind=kind, pause=pause,
+                       heap_before=sizes.get('heap_before'), heap_after=sizes.get('heap_after'),
+                       heap_capacity=sizes.get('heap_capacity'),
+                       young_before=sizes.get('young_before'), young_after=sizes.get('young_after'),
+                       old_before=sizes.get('old_before'), old_after=sizes.get('old_after'))
+
+
+def iter_gc_events(path, start=0):
+    """
+    Yields the GcEvents of the gc log at path, from byte offset start.
+    """
+    parser = GcLogParser()
+    with open(path, 'rb') as f:
+        for offset, raw in iter_lines(f, start):
+            if offset is None:
+                # wait for the JVM to finish the line
+                break
+            for event in parser.feed(decode_line(raw)):
+                yield event
+    for event in parser.flush():
+        yield event
+
+
+def _percentile(values, percent):
+    # nearest rank on sorted values
+    index = max(0, int(-(-len(values) * percent // 100)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def _elapsed(first, last):
+    if first.uptime is not None and last.uptime is not None:
+        return last.uptime - first.uptime
+    if first.timestamp is not None and last.timestamp is not None:
+        return last.timestamp - first.timestamp
+    return 0.0
+
+
+def gc_stats(events, since=None, until=None):
+    """
+    Returns the GcStats of events (GcEvents in log order) that happened at
+    or after since and before until (seconds since the epoch), or None if
+    there are none.
+
+    The memory allocated between two pauses is the growth of the heap from
+    the end of one to the start of the next, and the memory promoted by a
+    young collection the growth of the old generation during it.
+    """
+    window = [e for e in events
+              if (since is None or (e.timestamp is not None and e.timestamp >= since))
+              and (until is None or (e.timestamp is not None and e.timestamp < until))]
+    if not window:
+        return None
+    pauses = sorted(e.pause for e in window)
+    kinds = {}
+    for e in window:
+        kinds[e.kind] = kinds.get(e.kind, 0) + 1
+
+    allocated = promoted = None
+    # pauses such as CMS initial marks do not log the heap
+    heap_after = None
+    for event in window:
+        if event.heap_before is not None:
+            if heap_after is not None:
+                allocated = (allocated or 0) + max(0, event.heap_before - heap_after)
+            heap_after = event.heap_after
+        if event.kind == 'Young' and event.old_before is not None:
+            promoted = (promoted or 0) + max(0, event.old_after - event.old_before)
+
+    duration = _elapsed(window[0], window[-1])
+    return GcStats(count=len(pauses),
+                   total=sum(pauses),
+                   p50=_percentile(pauses, 50),
+                   p99=_percentile(pauses, 99),
+                   max=pauses[-1],
+                   kinds=kinds,
+                   duration=duration,
+                   allocated=allocated,
+                   promoted=promoted,
+                   allocation_rate=allocated / duration if allocated is not None and duration > 0 else None,
+                   promotion_rate=promoted / duration if promoted is not None and duration > 0 else None)
+
+
+def format_gc_stats(stats):
+    """
+    Returns the lines describing a GcStats for a user.
+    """
+    if stats is None:
+        return ['No GC pause']
+    lines = ['GC pauses: {} in {:.1f}s ({})'.format(stats.count, stats.duration,
+                                                    ', '.join('{} {}'.format(count, kind) for kind, count in sorted(stats.kinds.items()))),
+             'Pause time: total {:.3f}s, p50 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms'.format(
+                 stats.total, stats.p50 * 1000, stats.p99 * 1000, stats.max * 1000)]
+    for name, rate in (('Allocation', stats.allocation_rate), ('Promotion', stats.promotion_rate)):
+        if rate is not None:
+            lines.append('{} rate: {:.2f} MB/s'.format(name, rate / _UNITS['M']))
+    return lines
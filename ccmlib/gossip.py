@@ -0,0 +1,168 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# gossip membership tracking
+#
+# A GossipStateTracker subscribes to the log bus of a cluster and records
+# each "is now UP/DOWN/dead" transition logged by its nodes, so that questions
+# like "has node1 seen node2 come UP since this mark?" are answered from memory
+# instead of by rescanning the logs.
+#
+
+from __future__ import absolute_import
+
+import re
+import threading
+import time
+
+from ccmlib.logbus import LogSubscriber
+
+UP = 'UP'
+DOWN = 'DOWN'
+
+# InetAddress(AndPort).toString() is "hostname/address" or "/address"
+_TRANSITION_RE = re.compile(r'(\S*)/(\S+?)\.? is now (UP|DOWN|dead)')
+
+
+def parse_transition(line):
+    """
+    Returns (peer address, UP or DOWN) if the log line reports a gossip
+    transition, None otherwise. "dead" is reported as DOWN.
+    """
+    m = _TRANSITION_RE.search(line)
+    if m is None:
+        return None
+    return m.group(2), UP if m.group(3) == UP else DOWN
+
+
+def _same_peer(logged, address):
+    # a peer named without its port (pre-4.0 style) matches any port
+    return logged == address or logged.startswith(address + ':')
+
+
+class PeerState(object):
+    """
+    What an observer node last logged about a peer: its current state, and
+    the log offset and time at which each state was last entered.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.offsets = {}
+        self.timestamps = {}
+
+    def record(self, state, offset):
+        self.state = state
+        self.offsets[state] = offset
+        self.timestamps[state] = time.time()
+
+    def reached_since(self, state, from_mark):
+        offset = self.offsets.get(state)
+        return offset is not None and offset >= (from_mark or 0)
+
+
+class GossipStateTracker(LogSubscriber):
+    """
+    Keeps, for every node of a cluster, the state in which it last saw each of
+    its peers, from the "is now UP/DOWN/dead" lines published on the log bus
+    of the cluster. Waiters block on a condition variable that is notified
+    every time a transition is read.
+
+    Use Cluster.gossip_tracker() rather than creating one directly.
+    """
+
+    def __init__(self, bus):
+        LogSubscriber.__init__(self, pattern=_TRANSITION_RE)
+        self.bus = bus
+        # observer node name -> peer address -> PeerState
+        self._views = {}
+        self._condition = threading.Condition()
+
+    def accept(self, event):
+        # cheap test first, as the expression is searched for in every line
+        if ' is now ' not in event.line:
+            return None
+        return LogSubscriber.accept(self, event)
+
+    def on_line(self, event, match):
+        state = UP if match.group(3) == UP else DOWN
+        with self._condition:
+            view = self._views.setdefault(event.node, {})
+            view.setdefault(match.group(2), PeerState()).record(state, event.offset)
+            self._condition.notify_all()
+
+    def on_reset(self, node):
+        # new or rotated log: marks now refer to the new file
+        with self._condition:
+            self._views.pop(node, None)
+
+    def _find(self, observer, address):
+        view = self._views.get(observer, {})
+        return [s for logged, s in view.items() if _same_peer(logged, address)]
+
+    def matrix(self):
+        """
+        Returns a snapshot of the membership view of every node, as a dict
+        mapping each observer node name to a dict mapping peer addresses to
+        (state, timestamp) where timestamp is the time at which the transition
+        to state was read.
+        """
+        with self._condition:
+            return dict((name, dict((address, (s.state, s.timestamps[s.state])) for address, s in view.items()))
+                        for name, view in self._views.items())
+
+    def peer_state(self, observer, peer):
+        """
+        Returns UP or DOWN as last logged by the observer node about the peer
+        node, or None if the observer never logged a transition for it.
+        """
+        address = peer.address_for_version(observer.get_cassandra_version())
+        with self._condition:
+            states = self._find(observer.name, address)
+            return states[0].state if states else None
+
+    def wait_for(self, expectations, state, timeout):
+        """
+        Waits until, for each (observer node, peer nodes, from_mark) of
+        expectations, the observer logged a transition of every peer to state
+        at or after from_mark. Returns the list of (observer, peers) still
+        missing when timeout seconds have passed, which is empty on success.
+        """
+        # resolve addresses before blocking, reading the version may hit the disk
+        wanted = [(observer, [(peer, peer.address_for_version(observer.get_cassandra_version())) for peer in peers], mark)
+                  for observer, peers, mark in expectations]
+        deadline = time.time() + timeout
+        while True:
+            if not self.bus.is_alive():
+                # stopped bus: read the logs from the waiting thread, outside
+                # of the condition as the bus calls on_line() with it held
+                self.bus.poll()
+            with self._condition:
+                missing = self._missing(wanted, state)
+                remaining = deadline - time.time()
+                if not missing or remaining <= 0:
+                    return missing
+                self._condition.wait(min(remaining, 1))
+
+    def _missing(self, wanted, state):
+        missing = []
+        for observer, peers, mark in wanted:
+            absent = [peer for peer, address in peers
+                      if not any(s.reached_since(state, mark) for s in self._find(observer.name, address))]
+            if absent:
+                missing.append((observer, absent))
+        return missing
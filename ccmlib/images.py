@@ -0,0 +1,297 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# cluster images
+#
+# An image is a copy of the directory of a stopped cluster (its cluster.conf
+# and node directories with their data, commit logs and configuration, but
+# not their logs) kept in the images directory of the ccm directory. New
+# clusters are materialized from it already populated and bootstrapped.
+#
+# The bulk of an sstable (its data, index, filter and compression info) is
+# never modified once written, so those components are hard linked. The
+# small ones that Cassandra or its tools may rewrite in place (TOC, digest,
+# statistics, summary) and all other files are reflinked (copy-on-write
+# clones) where the filesystem supports it, and copied otherwise, so that no
+# write in a cluster reaches the image or its other clusters. The absolute
+# paths of the source cluster found in the configuration are then rewritten
+# for the new cluster; the addresses and ports of the nodes are not, as their
+# system keyspace remembers the addresses of their peers (and, from 4.0,
+# their storage ports). A cluster created from an image thus cannot run next
+# to the cluster it was taken of, or to another cluster created from it.
+#
+
+from __future__ import absolute_import
+
+import errno
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from collections import Counter, namedtuple
+
+import yaml
+
+from ccmlib import common
+
+IMAGES_DIR = 'images'
+IMAGE_CONF = 'image.conf'
+
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+COPY = 'copy'
+
+# linux/fs.h
+_FICLONE = 0x40049409
+# errors telling that a filesystem (or a pair of them) cannot link
+_UNSUPPORTED = (errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOTTY, errno.EMLINK,
+                getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL))
+
+_DATA_DIR_RE = re.compile(r'^data\d+$')
+# components written once and never modified, by the big and the bti formats
+_IMMUTABLE_COMPONENT_SUFFIXES = ('-Data.db', '-Index.db', '-Filter.db', '-CompressionInfo.db', '-Partitions.db',
+                                 '-Rows.db')
+# files of the source cluster that are not part of an image
+_SKIPPED_FILES = ('cassandra.pid', 'dirty_pid.tmp', 'logs.db', 'logs.db-journal', 'logs.db-wal', 'logs.db-shm')
+
+Image = namedtuple('Image', ['name', 'path', 'cluster', 'cluster_path', 'cassandra_cluster_name',
+                             'cassandra_version', 'created'])
+Image.__doc__ = """
+An image of the ccm directory: cluster and cluster_path are the name and
+directory of the cluster it was taken of, and cassandra_cluster_name the
+cluster name its nodes have in their system keyspace.
+"""
+
+
+def images_path(path):
+    """
+    Returns the images directory of the ccm directory path.
+    """
+    return os.path.join(path, IMAGES_DIR)
+
+
+def load_image(path, name):
+    """
+    Returns the Image name of the ccm directory path.
+    """
+    image_path = os.path.join(images_path(path), name)
+    try:
+        with open(os.path.join(image_path, IMAGE_CONF)) as f:
+            data = yaml.safe_load(f)
+    except (IOError, OSError):
+        raise common.ArgumentError("No image named {} in {}".format(name, images_path(path)))
+    return Image(name=name, path=image_path, cluster=data['cluster'], cluster_path=data['cluster_path'],
+                 cassandra_cluster_name=data['cassandra_cluster_name'],
+                 cassandra_version=data['cassandra_version'], created=data['created'])
+
+
+def list_images(path):
+    """
+    Returns the Images of the ccm directory path, by name.
+    """
+    directory = images_path(path)
+    if not os.path.isdir(directory):
+        return []
+    return [load_image(path, name) for name in sorted(os.listdir(directory))
+            if os.path.exists(os.path.join(directory, name, IMAGE_CONF))]
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as s:
+        with open(dst, 'wb') as d:
+            try:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+                cloned = True
+            except (IOError, OSError) as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                cloned = False
+    if not cloned:
+        os.remove(dst)
+    return cloned
+
+
+class _Linker(object):
+    """
+    Links or copies the files of a tree, giving up on hard links or reflinks
+    for the rest of the tree once the filesystem refuses one.
+    """
+
+    def __init__(self):
+        self.hardlinks = hasattr(os, 'link')
+        self.reflinks = sys.platform.startswith('linux')
+        self.counts = Counter()
+
+    def link(self, src, dst, immutable):
+        if immutable and self.hardlinks:
+            try:
+                os.link(src, dst)
+                self.counts[HARDLINK] += 1
+                return
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                self.hardlinks = False
+        if self.reflinks:
+            if _reflink(src, dst):
+                shutil.copystat(src, dst)
+                self.counts[REFLINK] += 1
+                return
+            self.reflinks = False
+        shutil.copy2(src, dst)
+        self.counts[COPY] += 1
+
+
+def _is_immutable_component(relpath):
+    parts = relpath.split(os.sep)
+    # <node>/data<n>/<keyspace>/<table>/.../<component>
+    return len(parts) >= 5 and _DATA_DIR_RE.match(parts[1]) is not None \
+        and parts[-1].endswith(_IMMUTABLE_COMPONENT_SUFFIXES)
+
+
+def _copy_tree(src, dst, linker, skip=()):
+    # copies src to dst, less the logs of its nodes and the files of skip
+    for root, dirs, files in os.walk(src):
+        relroot = os.path.relpath(root, src)
+        top = relroot == os.curdir
+        target = dst if top else os.path.join(dst, relroot)
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        if not top and os.sep not in relroot and 'logs' in dirs:
+            # the logs of a node are left out, but not their directory
+            dirs.remove('logs')
+            os.makedirs(os.path.join(target, 'logs'))
+        for name in files:
+            if name in _SKIPPED_FILES or (top and name in skip):
+                continue
+            relpath = name if top else os.path.join(relroot, name)
+            linker.link(os.path.join(root, name), os.path.join(dst, relpath), _is_immutable_component(relpath))
+
+
+def _rewrite_paths(directory, old, new):
+    # replaces the old cluster directory by the new one in the configuration
+    old, new = (old.rstrip(os.sep) + os.sep).encode('utf-8'), (new.rstrip(os.sep) + os.sep).encode('utf-8')
+    candidates = [os.path.join(directory, 'cluster.conf'), os.path.join(directory, 'cassandra.in.sh')]
+    for node in os.listdir(directory):
+        node_dir = os.path.join(directory, node)
+        if not os.path.isdir(node_dir) or not os.path.exists(os.path.join(node_dir, 'node.conf')):
+            continue
+        candidates.append(os.path.join(node_dir, 'node.conf'))
+        for sub in ('conf', 'bin', os.path.join('resources', 'cassandra', 'conf')):
+            sub_dir = os.path.join(node_dir, sub)
+            if os.path.isdir(sub_dir):
+                candidates.extend(os.path.join(sub_dir, name) for name in os.listdir(sub_dir))
+    for filename in candidates:
+        if not os.path.isfile(filename):
+            continue
+        with open(filename, 'rb') as f:
+            content = f.read()
+        if old in content:
+            # never hard linked, so rewriting the file leaves the image alone
+            with open(filename, 'wb') as f:
+                f.write(content.replace(old, new))
+
+
+def _cassandra_cluster_name(cluster):
+    for node in cluster.nodelist():
+        try:
+            with open(node.get_conf_file()) as f:
+                return yaml.safe_load(f)['cluster_name']
+        except (IOError, OSError, KeyError, TypeError):
+            continue
+    return cluster._config_options.get('cluster_name', cluster.name)
+
+
+def snapshot_image(cluster, name, force=False):
+    """
+    Captures the stopped cluster as the image name of its ccm directory,
+    replacing an existing one if force. Returns (Image, dict of the number
+    of files hard linked, reflinked and copied).
+    """
+    running = [node.name for node in cluster.nodelist() if node.is_running()]
+    if running:
+        raise common.ArgumentError("Cannot take an image of cluster {} while {} {} running"
+                                   .format(cluster.name, ', '.join(running), 'is' if len(running) == 1 else 'are'))
+    path = os.path.dirname(cluster.get_path())
+    image_path = os.path.join(images_path(path), name)
+    if os.path.exists(image_path) and not force:
+        raise common.ArgumentError("Image {} already exists".format(name))
+
+    # built aside, so that an image is either complete or absent
+    building = os.path.join(images_path(path), '.{}.{}'.format(name, uuid.uuid4().hex))
+    os.makedirs(building)
+    try:
+        linker = _Linker()
+        _copy_tree(cluster.get_path(), building, linker)
+        for node in cluster.nodelist():
+            # the pid of a node is meaningless in another cluster
+            node_conf = os.path.join(building, node.name, 'node.conf')
+            with open(node_conf) as f:
+                data = yaml.safe_load(f)
+            data.pop('pid', None)
+            with open(node_conf, 'w') as f:
+                yaml.safe_dump(data, f)
+        with open(os.path.join(building, IMAGE_CONF), 'w') as f:
+            yaml.safe_dump({'cluster': cluster.name,
+                            'cluster_path': cluster.get_path(),
+                            'cassandra_cluster_name': _cassandra_cluster_name(cluster),
+                            'cassandra_version': str(cluster.cassandra_version()),
+                            'created': time.time()}, f)
+        if os.path.exists(image_path):
+            common.rmdirs(image_path)
+        os.rename(building, image_path)
+    except BaseException:
+        common.rmdirs(building)
+        raise
+    return load_image(path, name), dict(linker.counts)
+
+
+def materialize_image(path, name, image):
+    """
+    Creates the directory of the cluster name in the ccm directory path from
+    the image named image, with the paths of its configuration rewritten and
+    the cluster name of its nodes kept. Returns (Image, dict of the number
+    of files hard linked, reflinked and copied); the cluster is to be loaded
+    and saved by the caller.
+    """
+    image = load_image(path, image)
+    cluster_path = os.path.join(path, name)
+    if os.path.exists(cluster_path):
+        raise common.ArgumentError("Cluster {} already exists".format(name))
+    os.makedirs(cluster_path)
+    try:
+        linker = _Linker()
+        _copy_tree(image.path, cluster_path, linker, skip=(IMAGE_CONF,))
+        _rewrite_paths(cluster_path, image.cluster_path, cluster_path)
+
+        cluster_conf = os.path.join(cluster_path, 'cluster.conf')
+        with open(cluster_conf) as f:
+            data = yaml.safe_load(f)
+        data['name'] = name
+        # the system keyspace of the nodes remembers their cluster name
+        config_options = data.get('config_options') or {}
+        config_options.setdefault('cluster_name', image.cassandra_cluster_name)
+        data['config_options'] = config_options
+        with open(cluster_conf, 'w') as f:
+            yaml.safe_dump(data, f)
+    except BaseException:
+        common.rmdirs(cluster_path)
+        raise
+    return image, dict(linker.counts)
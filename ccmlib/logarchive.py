@@ -0,0 +1,303 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# log rotation
+#
+# Logback rolls system.log over into system.log.N.zip (or
+# system.log.DATE.N.zip) and starts a new file. Marks carry the identity of
+# the file they were taken on, so that a mark of a rolled over log is not
+# taken for an offset in the new one, and a RotatingLogReader follows a log
+# from one file to the next. Archives are read as streams, without extracting
+# them to disk.
+#
+
+from __future__ import absolute_import
+
+import gzip
+import os
+import re
+import time
+import zipfile
+from contextlib import contextmanager
+
+from ccmlib.logindex import decode_line
+
+# system.log.1, system.log.1.zip, system.log.2023-03-01.1.zip, system.log.1.gz
+_ARCHIVE_SUFFIX_RE = re.compile(r'^\.(?:\d{4}-\d{2}-\d{2}\.)?\d+(?:\.zip|\.gz)?$')
+
+_SKIP_CHUNK_SIZE = 64 * 1024
+
+# inodes of deleted logs get reused, so files are also told apart by their
+# first bytes, which hold the timestamp of their first line
+_HEAD_SIZE = 128
+
+
+class LogMark(int):
+    """
+    A mark as returned by Node.mark_log(): the offset in the log, which it
+    can be used as, along with the identity of the file it was taken on (see
+    file_id()) and the time it was taken at.
+    """
+
+    def __new__(cls, offset, file_id=None, time=None):
+        mark = int.__new__(cls, offset)
+        mark.file_id = file_id
+        mark.time = time
+        return mark
+
+    def __reduce__(self):
+        return LogMark, (int(self), self.file_id, self.time)
+
+
+def file_id(path):
+    """
+    Returns the identity of the file at path, (device, inode, first bytes),
+    or None if it does not exist.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _file_id(f)
+    except (IOError, OSError):
+        return None
+
+
+def _file_id(f):
+    st = os.fstat(f.fileno())
+    f.seek(0)
+    return st.st_dev, st.st_ino, f.read(_HEAD_SIZE)
+
+
+def _same_file(marked, current):
+    # the head of a file taken when it was shorter is a prefix of its head
+    return marked[:2] == current[:2] and current[2].startswith(marked[2])
+
+
+def mark_file(path, offset=None):
+    """
+    Returns a LogMark to offset (by default the end) of the file at path.
+    """
+    try:
+        with open(path, 'rb') as f:
+            identity = _file_id(f)
+            f.seek(0, os.SEEK_END)
+            return LogMark(f.tell() if offset is None else offset, identity, time.time())
+    except (IOError, OSError):
+        return LogMark(0, None, time.time())
+
+
+def was_rotated(path, mark):
+    """
+    Returns True if the log at path is not the file mark was taken on: the
+    log was rolled over, or truncated below the mark, since.
+    """
+    try:
+        with open(path, 'rb') as f:
+            identity = _file_id(f)
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+    except (IOError, OSError):
+        return bool(mark)
+    mark_id = getattr(mark, 'file_id', None)
+    if mark_id is not None and not _same_file(mark_id, identity):
+        return True
+    return size < (mark or 0)
+
+
+def current_offset(path, mark):
+    """
+    Returns the offset in the log at path that mark stands for: 0, the start
+    of the new file, if the log was rotated since the mark was taken.
+    """
+    if not mark or was_rotated(path, mark):
+        return 0
+    return int(mark)
+
+
+def rotated_archives(path):
+    """
+    Returns the paths of the rolled over archives of the log at path, oldest
+    first.
+    """
+    directory, name = os.path.split(path)
+    try:
+        entries = os.listdir(directory or '.')
+    except OSError:
+        return []
+    archives = [os.path.join(directory, entry) for entry in entries
+                if entry.startswith(name) and _ARCHIVE_SUFFIX_RE.match(entry[len(name):])]
+    return sorted(archives, key=lambda archive: (os.path.getmtime(archive), archive))
+
+
+@contextmanager
+def open_archive(archive):
+    """
+    Opens a log archive (a zip holding the log, a gzipped log or a plain
+    file) as a binary stream.
+    """
+    if archive.endswith('.zip'):
+        with zipfile.ZipFile(archive) as z:
+            with z.open(z.namelist()[0]) as f:
+                yield f
+    elif archive.endswith('.gz'):
+        with gzip.open(archive, 'rb') as f:
+            yield f
+    else:
+        with open(archive, 'rb') as f:
+            yield f
+
+
+def iter_archive_lines(archive, start=0):
+    """
+    Yields (offset, line) for the lines of the archived log starting at or
+    after byte offset start, decompressing it on the fly.
+    """
+    with open_archive(archive) as f:
+        offset = 0
+        while offset < start:
+            skipped = len(f.read(min(_SKIP_CHUNK_SIZE, start - offset)))
+            if not skipped:
+                return
+            offset += skipped
+        while True:
+            raw = f.readline()
+            if not raw:
+                return
+            yield offset, decode_line(raw)
+            offset += len(raw)
+
+
+def archives_since(path, mark=None):
+    """
+    Returns the list of (archive, start offset) holding the lines of the log
+    at path logged after mark (all of them if mark is None) that were rolled
+    over since. Archives are told apart by modification time: the oldest one
+    written after the mark was taken holds the file the mark points into.
+    """
+    archives = rotated_archives(path)
+    if mark is None:
+        return [(archive, 0) for archive in archives]
+    if not was_rotated(path, mark):
+        return []
+    since = getattr(mark, 'time', None)
+    if since is not None:
+        archives = [archive for archive in archives if os.path.getmtime(archive) >= since]
+    elif archives:
+        # without the time of the mark, only the last archive can be told
+        archives = archives[-1:]
+    return [(archive, int(mark) if i == 0 else 0) for i, archive in enumerate(archives)]
+
+
+def grep_archives(path, expr, from_mark=None):
+    """
+    Returns the list of (archive, offset, line, match) for the lines matching
+    expr in the archives of the log at path, oldest first, restricted to the
+    lines logged after from_mark if given (see archives_since()).
+    """
+    pattern = re.compile(expr)
+    result = []
+    for archive, start in archives_since(path, from_mark):
+        for offset, line in iter_archive_lines(archive, start):
+            m = pattern.search(line)
+            if m:
+                result.append((archive, offset, line, m))
+    return result
+
+
+class RotatingLogReader(object):
+    """
+    Reads the lines of a log from a mark, following the log when it is rolled
+    over (the inode of the path changes) or truncated: the rest of the old
+    file is read and reading goes on from the start of the new one.
+
+    If the log was already rotated when the reader is created, reading starts
+    at the beginning of the new file, after the lines of the archives written
+    since the mark when search_archives is True.
+    """
+
+    def __init__(self, path, from_mark=None, search_archives=False):
+        self.path = path
+        self.f = None
+        self.file_id = None
+        self.offset = current_offset(path, from_mark)
+        self.rotations = 0
+        self._backlog = None
+        if search_archives and was_rotated(path, from_mark):
+            self._backlog = self._archived_lines(archives_since(path, from_mark))
+
+    def _archived_lines(self, archives):
+        for archive, start in archives:
+            for _, line in iter_archive_lines(archive, start):
+                yield line
+
+    def readline(self):
+        """
+        Returns (offset, line) for the next complete line, offset being None
+        for lines read from archives, or None if there is none at this time.
+        """
+        if self._backlog is not None:
+            line = next(self._backlog, None)
+            if line is not None:
+                return None, line
+            self._backlog = None
+        while True:
+            if self.f is None and not self._open():
+                return None
+            raw = self.f.readline()
+            if raw.endswith(b'\n'):
+                offset = self.offset
+                self.offset += len(raw)
+                return offset, decode_line(raw)
+            if not self._rotated():
+                # wait for the writer to finish the line
+                self.f.seek(self.offset)
+                return None
+            self.f.close()
+            self.f = None
+            self.rotations += 1
+            offset = self.offset
+            self.offset = 0
+            if raw:
+                # the old file will not grow anymore
+                return offset, decode_line(raw)
+
+    def _open(self):
+        try:
+            self.f = open(self.path, 'rb')
+        except (IOError, OSError):
+            return False
+        st = os.fstat(self.f.fileno())
+        self.file_id = (st.st_dev, st.st_ino)
+        self.f.seek(self.offset)
+        return True
+
+    def _rotated(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return True
+        return (st.st_dev, st.st_ino) != self.file_id or st.st_size < self.offset
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        self.close()
@@ -0,0 +1,326 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# log event bus
+#
+# A LogBus tails the same log file (system.log by default) of every node of a
+# cluster in one background thread and publishes each complete line to the
+# subscribers whose node, level and pattern filters accept it. However many
+# subscribers there are, every byte of the logs is read once.
+#
+
+from __future__ import absolute_import
+
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+from six import string_types
+
+from ccmlib import common
+from ccmlib.logindex import decode_line, iter_lines
+from ccmlib.logtail import file_change_waiter
+
+logger = logging.getLogger(__name__)
+
+_LEVEL_RE = re.compile(r'(\W|^)(TRACE|DEBUG|INFO|WARN|ERROR)\W')
+
+
+def line_level(line):
+    """
+    Returns the logback level of a log line, or None for lines that do not
+    start a log event (e.g. stack trace lines).
+    """
+    m = _LEVEL_RE.search(line)
+    return m.group(2) if m else None
+
+
+class LogLine(object):
+    """
+    A line published on the bus: the name of the node it was logged by, its
+    byte offset in the log, the offset right after it, and its text
+    (including the line terminator).
+    """
+
+    __slots__ = ('node', 'offset', 'end', 'line', '_level')
+
+    def __init__(self, node, offset, end, line):
+        self.node = node
+        self.offset = offset
+        self.end = end
+        self.line = line
+        self._level = False
+
+    @property
+    def level(self):
+        if self._level is False:
+            self._level = line_level(self.line)
+        return self._level
+
+
+class LogSubscriber(object):
+    """
+    Base class of the bus subscribers. Lines are passed to on_line() if they
+    come from one of nodes (node names), have one of levels and match
+    pattern; None means no filtering. Callbacks run in the bus thread (or the
+    thread calling LogBus.poll()), one at a time and in log order, and should
+    return quickly as the other subscribers wait for them.
+    """
+
+    def __init__(self, pattern=None, levels=None, nodes=None):
+        self.pattern = re.compile(pattern) if isinstance(pattern, string_types) else pattern
+        self.levels = set(levels) if levels is not None else None
+        self.nodes = set(nodes) if nodes is not None else None
+
+    def accept(self, event):
+        """
+        Returns the match of pattern (True if there is no pattern) if event
+        passes the filters, None otherwise.
+        """
+        if self.nodes is not None and event.node not in self.nodes:
+            return None
+        if self.levels is not None and event.level not in self.levels:
+            return None
+        if self.pattern is None:
+            return True
+        return self.pattern.search(event.line)
+
+    def on_line(self, event, match):
+        pass
+
+    def on_caught_up(self):
+        """
+        Called after each pass of the bus over the logs, once every line
+        available at that time was published, and at least once per second.
+        """
+        pass
+
+    def on_reset(self, node):
+        """
+        Called when the log of node was replaced or truncated: offsets of the
+        lines published next start over from 0.
+        """
+        pass
+
+
+class _CallbackSubscriber(LogSubscriber):
+
+    def __init__(self, callback, pattern=None, levels=None, nodes=None):
+        LogSubscriber.__init__(self, pattern, levels, nodes)
+        self.callback = callback
+
+    def on_line(self, event, match):
+        self.callback(event, match)
+
+
+class _TailedLog(object):
+
+    def __init__(self, node, path):
+        self.node = node
+        self.path = path
+        self.offset = 0
+        self.file_id = None
+
+    def read(self, publish, reset):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            file_id = (st.st_dev, st.st_ino)
+            if file_id != self.file_id or st.st_size < self.offset:
+                if self.file_id is not None:
+                    reset(self.node)
+                self.file_id = file_id
+                self.offset = 0
+            for offset, raw in iter_lines(f, self.offset):
+                if offset is None:
+                    # wait for the writer to finish the line
+                    return
+                self.offset = offset + len(raw)
+                publish(LogLine(self.node, offset, self.offset, decode_line(raw)))
+
+    def replay(self, publish):
+        if self.offset == 0:
+            return
+        with open(self.path, 'rb') as f:
+            for offset, raw in iter_lines(f, 0, self.offset):
+                publish(LogLine(self.node, offset, offset + len(raw), decode_line(raw)))
+
+
+class LogBus(object):
+    """
+    Tails one log file of every node of a cluster (nodes added to the cluster
+    are picked up as they come) and publishes its lines to subscribers.
+
+    Use Cluster.log_bus() rather than creating one directly.
+    """
+
+    def __init__(self, cluster, filename='system.log'):
+        self.cluster = cluster
+        self.filename = filename
+        self._logs = {}
+        self._paths = []
+        self._subscribers = []
+        # (subscribers, handler, args) read from the logs but not delivered yet
+        self._queue = deque()
+        # _lock guards the reading of the logs and the list of subscribers,
+        # _delivery_lock the calls to subscribers, which are made without
+        # holding _lock so that a slow subscriber does not hold up readers
+        self._lock = threading.RLock()
+        self._delivery_lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback, pattern=None, levels=None, nodes=None, replay=False):
+        """
+        Calls callback(event, match) with the LogLine event of every line
+        passing the filters (see LogSubscriber) and the match of pattern.
+        If replay is True, the lines already read are published to the new
+        subscriber first. Returns the subscriber, to pass to unsubscribe().
+        """
+        return self.add_subscriber(_CallbackSubscriber(callback, pattern, levels, nodes), replay=replay)
+
+    def add_subscriber(self, subscriber, replay=False):
+        with self._lock:
+            if replay:
+                for log in list(self._logs.values()):
+                    try:
+                        log.replay(lambda event: self._queue.append(((subscriber,), self._deliver, (event,))))
+                    except (IOError, OSError) as e:
+                        logger.debug("Cannot replay {}: {}".format(log.path, e))
+                self._queue.append(((subscriber,), self._caught_up, ()))
+            self._subscribers.append(subscriber)
+        if replay:
+            self._drain()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name='log-bus-{}'.format(self.cluster.name))
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(5)
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self):
+        """
+        Reads and publishes, from the calling thread, everything appended to
+        the logs since the last pass. The bus thread does this continuously;
+        calling it is useful to be sure that the logs were read up to now.
+        """
+        with self._lock:
+            self._refresh_logs()
+            subscribers = tuple(self._subscribers)
+            publish = lambda event: self._queue.append((subscribers, self._deliver, (event,)))
+            reset = lambda node: self._queue.append((subscribers, self._reset, (node,)))
+            for log in list(self._logs.values()):
+                try:
+                    log.read(publish, reset)
+                except (IOError, OSError) as e:
+                    logger.debug("Cannot read {}: {}".format(log.path, e))
+            self._queue.append((subscribers, self._caught_up, ()))
+        self._drain()
+
+    def _refresh_logs(self):
+        # the nodes of the cluster may be added or removed by another thread
+        # meanwhile: copy them in one go rather than through nodelist()
+        nodes = sorted(list(self.cluster.nodes.items()))
+        for name, node in nodes:
+            path = os.path.join(node.log_directory(), self.filename)
+            log = self._logs.get(name)
+            if log is None or log.path != path:
+                self._logs[name] = _TailedLog(name, path)
+        for name in set(self._logs) - set(name for name, _ in nodes):
+            del self._logs[name]
+        self._paths = sorted(log.path for log in self._logs.values())
+
+    def _drain(self):
+        # delivers the queued events in order, whichever thread queued them
+        with self._delivery_lock:
+            while True:
+                try:
+                    subscribers, handler, args = self._queue.popleft()
+                except IndexError:
+                    return
+                for subscriber in subscribers:
+                    if subscriber in self._subscribers:
+                        handler(subscriber, *args)
+
+    def _deliver(self, subscriber, event):
+        match = subscriber.accept(event)
+        if match:
+            self._call(subscriber.on_line, event, match)
+
+    def _reset(self, subscriber, node):
+        self._call(subscriber.on_reset, node)
+
+    def _caught_up(self, subscriber):
+        self._call(subscriber.on_caught_up)
+
+    def _call(self, method, *args):
+        # a failing subscriber must not stop the others from being served
+        try:
+            method(*args)
+        except Exception:
+            logger.exception("Log bus subscriber {} failed".format(method))
+
+    def _run(self):
+        common.debug("Log bus for cluster {} starting.".format(self.cluster.name))
+        waiter = None
+        watched = None
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self.poll()
+                    if self._paths != watched:
+                        # nodes were added or removed
+                        if waiter is not None:
+                            waiter.close()
+                            waiter = None
+                        watched = self._paths
+                        waiter = file_change_waiter(watched)
+                except Exception:
+                    # the watchers depending on the bus would otherwise wait
+                    # for their timeout: log and try again on the next pass
+                    logger.exception("Log bus for cluster {} failed to read the logs".format(self.cluster.name))
+                    watched = None
+                if waiter is None:
+                    self._stop_event.wait(1)
+                else:
+                    waiter.wait(1)
+        finally:
+            if waiter is not None:
+                waiter.close()
+            common.debug("Log bus for cluster {} exiting.".format(self.cluster.name))
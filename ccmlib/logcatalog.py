@@ -0,0 +1,361 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# persistent log catalog
+#
+# A LogCatalog loads the log records of the nodes of a cluster (system.log,
+# debug.log and the gc log by default) into a SQLite database, indexed on
+# time, level and node, with a full-text index of the messages when SQLite
+# has FTS5. The offset read up to in each file is stored along with the
+# records, so that each ingestion only parses what was appended since the
+# previous one. The records of a log that was rolled over are kept: they are
+# moved to the file now holding them when it is catalogued too (the gc logs
+# are renamed, e.g. gc.log.0.current to gc.log.0), and to an archived name
+# (system.log.<date of its last record>) otherwise.
+#
+
+from __future__ import absolute_import
+
+import fnmatch
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from six import string_types
+
+from ccmlib.logindex import decode_line, iter_lines
+from ccmlib.logrecords import parse_header, parse_timestamp, to_timestamp
+
+# JDK 8 writes gc.log.N.current and renames it gc.log.N once full
+CATALOG_FILES = ('system.log', 'debug.log', 'gc.log', 'gc.log.[0-9]*')
+
+# records are inserted by batches of that many
+_BATCH_SIZE = 5000
+
+# gc logs have no logback header, every line is a record; JDK 9+ unified
+# logging decorates them with [date], older JVMs start them with date:
+_GC_DATE_RE = re.compile(r'^\[?(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\.(\d{3})')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    node TEXT NOT NULL,
+    file TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    last_record INTEGER,
+    PRIMARY KEY (node, file)
+);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    node TEXT NOT NULL,
+    file TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    ts REAL,
+    level TEXT,
+    thread TEXT,
+    logger TEXT,
+    line_number INTEGER,
+    message TEXT NOT NULL,
+    continuation TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_ts ON records (ts);
+CREATE INDEX IF NOT EXISTS records_level_ts ON records (level, ts);
+CREATE INDEX IF NOT EXISTS records_node_ts ON records (node, file, ts);
+"""
+
+_FTS_SCHEMA = ("CREATE VIRTUAL TABLE IF NOT EXISTS records_fts "
+               "USING fts5(message, continuation, content='records', content_rowid='id')")
+
+CatalogRecord = namedtuple('CatalogRecord', ['node', 'file', 'offset', 'timestamp', 'level', 'thread', 'logger',
+                                             'line_number', 'message', 'continuation'])
+CatalogRecord.__doc__ = """
+A record of the catalog: file is the name of the log it was read from, level,
+thread and logger are None for lines that are not logback events (gc logs).
+"""
+
+
+def format_record(record):
+    """
+    Returns the lines of a CatalogRecord as they would be printed for a user.
+    """
+    prefix = '{} {}'.format(record.node, record.file)
+    if record.level is None:
+        lines = ['{}: {}'.format(prefix, record.message)]
+    else:
+        date = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.timestamp))
+        lines = ['{}: {:<5} [{}] {},{:03d} {}:{} - {}'.format(prefix, record.level, record.thread, date,
+                                                              int(round(record.timestamp * 1000)) % 1000,
+                                                              record.logger, record.line_number, record.message)]
+    lines.extend(record.continuation)
+    return lines
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _expand(log_dir, filenames):
+    # the file names of log_dir matching filenames, names or glob patterns
+    expanded = []
+    for filename in filenames:
+        if any(c in filename for c in '*?['):
+            expanded.extend(sorted(name for name in os.listdir(log_dir) if fnmatch.fnmatch(name, filename))
+                            if os.path.isdir(log_dir) else [])
+        else:
+            expanded.append(filename)
+    return expanded
+
+
+def _gc_record(line):
+    m = _GC_DATE_RE.match(line)
+    timestamp = parse_timestamp(m.group(1), m.group(2)) if m else None
+    return [timestamp, None, None, None, None, line, '']
+
+
+class LogCatalog(object):
+    """
+    SQLite catalog of the log records of the nodes of a cluster, stored in
+    the database file path. Nothing is loaded until ingest() is called.
+
+    Use Cluster.log_catalog() rather than creating one directly.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            try:
+                self._db.execute(_FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                # sqlite built without FTS5, text searches fall back to LIKE
+                self.has_fts = False
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        self.close()
+
+    def ingest(self, nodes, filenames=CATALOG_FILES):
+        """
+        Loads the records appended to the given log files (names or glob
+        patterns) of nodes since the last ingestion. Logs that were replaced or
+        truncated since are loaded again from the start. Returns the number of
+        new records.
+        """
+        count = 0
+        with self._lock:
+            for node in nodes:
+                log_dir = node.log_directory()
+                for filename in _expand(log_dir, filenames):
+                    count += self.ingest_file(node.name, filename, os.path.join(log_dir, filename))
+        return count
+
+    def ingest_file(self, node, filename, path):
+        """
+        Loads the records of the log file path, stored as the file filename
+        of node. Returns the number of new records.
+        """
+        with self._lock:
+            try:
+                f = open(path, 'rb')
+            except (IOError, OSError):
+                return 0
+            with f, self._db:
+                return self._ingest(f, node, filename)
+
+    def _ingest(self, f, node, filename):
+        db = self._db
+        st = os.fstat(f.fileno())
+        row = db.execute('SELECT dev, ino, offset, last_record FROM files WHERE node = ? AND file = ?',
+                         (node, filename)).fetchone()
+        if row is not None and ((row[0], row[1]) != (st.st_dev, st.st_ino) or st.st_size < row[2]):
+            self._archive(node, filename, truncated=(row[0], row[1]) == (st.st_dev, st.st_ino))
+            row = None
+        if row is None:
+            row = self._adopt(node, filename, st)
+        if row is None:
+            offset, last_record = 0, None
+        else:
+            offset, last_record = row[2], row[3]
+        if st.st_size == offset:
+            return 0
+
+        gc_log = filename.startswith('gc.log')
+        next_id = (db.execute('SELECT max(id) FROM records').fetchone()[0] or 0) + 1
+        # records not inserted yet, as lists of column values
+        batch = []
+        # continuation lines of last_record, which is already in the database
+        orphans = []
+        count = 0
+        for line_offset, raw in iter_lines(f, offset):
+            if line_offset is None:
+                # wait for the writer to finish the line
+                break
+            offset = line_offset + len(raw)
+            line = decode_line(raw).rstrip('\n')
+            if gc_log:
+                values = _gc_record(line)
+            else:
+                header = parse_header(line)
+                if header is None:
+                    if batch:
+                        batch[-1][-1] += line + '\n'
+                    elif last_record is not None:
+                        orphans.append(line + '\n')
+                    else:
+                        # lines before the first record of a log are kept on their own
+                        batch.append([node, filename, line_offset, None, None, None, None, None, line, ''])
+                    continue
+                level, thread, timestamp, logger, line_number, message = header
+                values = [timestamp, level, thread, logger, line_number, message, '']
+            batch.append([node, filename, line_offset] + values)
+            if len(batch) > _BATCH_SIZE:
+                # the last record may still get continuation lines
+                next_id = self._insert(batch[:-1], next_id)
+                count += len(batch) - 1
+                batch = batch[-1:]
+        if orphans:
+            self._append_continuation(last_record, ''.join(orphans))
+        if batch:
+            next_id = self._insert(batch, next_id)
+            count += len(batch)
+            last_record = next_id - 1
+        db.execute('INSERT OR REPLACE INTO files (node, file, dev, ino, offset, last_record) VALUES (?, ?, ?, ?, ?, ?)',
+                   (node, filename, st.st_dev, st.st_ino, offset, last_record))
+        return count
+
+    def _insert(self, batch, next_id):
+        rows = [[next_id + i] + values for i, values in enumerate(batch)]
+        self._db.executemany('INSERT INTO records (id, node, file, offset, ts, level, thread, logger, line_number, '
+                             'message, continuation) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        if self.has_fts:
+            self._db.executemany('INSERT INTO records_fts (rowid, message, continuation) VALUES (?, ?, ?)',
+                                 [(row[0], row[-2], row[-1]) for row in rows])
+        return next_id + len(rows)
+
+    def _append_continuation(self, record, text):
+        db = self._db
+        message, continuation = db.execute('SELECT message, continuation FROM records WHERE id = ?', (record,)).fetchone()
+        if self.has_fts:
+            db.execute("INSERT INTO records_fts (records_fts, rowid, message, continuation) VALUES ('delete', ?, ?, ?)",
+                       (record, message, continuation))
+            db.execute('INSERT INTO records_fts (rowid, message, continuation) VALUES (?, ?, ?)',
+                       (record, message, continuation + text))
+        db.execute('UPDATE records SET continuation = ? WHERE id = ?', (continuation + text, record))
+
+    def _archive(self, node, filename, truncated):
+        # the log was rolled over (or truncated): its records are kept under
+        # an archived name, along with the state of the file if it still
+        # exists elsewhere, for _adopt()
+        db = self._db
+        last_ts = db.execute('SELECT max(ts) FROM records WHERE node = ? AND file = ?', (node, filename)).fetchone()[0]
+        archived = '{}.{}'.format(filename, time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime(last_ts or time.time())))
+        self._rename(node, filename, archived)
+        if truncated:
+            db.execute('DELETE FROM files WHERE node = ? AND file = ?', (node, filename))
+        else:
+            db.execute('UPDATE OR REPLACE files SET file = ? WHERE node = ? AND file = ?', (archived, node, filename))
+
+    def _adopt(self, node, filename, st):
+        # a log seen for the first time may be a catalogued one that was
+        # renamed: its records are moved to the new name and it is read on
+        # from where it was left
+        row = self._db.execute('SELECT file, dev, ino, offset, last_record FROM files '
+                               'WHERE node = ? AND dev = ? AND ino = ? AND file != ? AND offset <= ?',
+                               (node, st.st_dev, st.st_ino, filename, st.st_size)).fetchone()
+        if row is None:
+            return None
+        self._rename(node, row[0], filename)
+        self._db.execute('UPDATE files SET file = ? WHERE node = ? AND file = ?', (filename, node, row[0]))
+        return row[1:]
+
+    def _rename(self, node, old, new):
+        self._db.execute('UPDATE records SET file = ? WHERE node = ? AND file = ?', (new, node, old))
+
+    def query(self, text=None, level=None, nodes=None, files=None, thread=None, logger=None, since=None, until=None,
+              limit=None):
+        """
+        Returns the CatalogRecords matching all the given filters, ordered by
+        timestamp:
+          - text: words that the message or its continuation lines (e.g. a
+            stack trace) contain, as a phrase
+          - level: a level name or a list of them
+          - nodes, files: a node name or log file name, or a list of them; a
+            file name also selects its rotated files (system.log.<date>,
+            gc.log.0.current, ...)
+          - thread, logger: exact thread name or logger class name
+          - since, until: a datetime or seconds since the epoch; records logged
+            at or after since, and before until
+          - limit: maximum number of records returned
+        """
+        conditions = []
+        params = []
+        if text:
+            if self.has_fts:
+                conditions.append('id IN (SELECT rowid FROM records_fts WHERE records_fts MATCH ?)')
+                params.append('"{}"'.format(text.replace('"', '""')))
+            else:
+                pattern = '%{}%'.format(_escape_like(text))
+                conditions.append("(message LIKE ? ESCAPE '\\' OR continuation LIKE ? ESCAPE '\\')")
+                params.extend([pattern, pattern])
+        for column, value in (('level', level), ('node', nodes)):
+            if value is not None:
+                values = [value] if isinstance(value, string_types) else list(value)
+                conditions.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+                params.extend(values)
+        if files is not None:
+            files = [files] if isinstance(files, string_types) else list(files)
+            conditions.append('(file IN ({}) OR {})'.format(', '.join('?' * len(files)),
+                                                            ' OR '.join(["file LIKE ? ESCAPE '\\'"] * len(files))))
+            params.extend(files)
+            params.extend(_escape_like(name) + '.%' for name in files)
+        for column, value in (('thread', thread), ('logger', logger)):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                params.append(value)
+        if since is not None:
+            conditions.append('ts >= ?')
+            params.append(to_timestamp(since))
+        if until is not None:
+            conditions.append('ts < ?')
+            params.append(to_timestamp(until))
+
+        sql = ('SELECT node, file, offset, ts, level, thread, logger, line_number, message, continuation '
+               'FROM records')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ts, id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [CatalogRecord(*(row[:-1] + (row[-1].split('\n')[:-1],))) for row in rows]
@@ -0,0 +1,157 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# error deduplication
+#
+# A recurring exception logs the same stack trace over and over. Error blocks
+# (as found by Node.iter_log_errors()) are fingerprinted by their exception
+# type and top stack frames, or by their logging class and message with
+# numbers left out when there is no stack trace, and an ErrorSummary keeps a
+# count and one exemplar per fingerprint.
+#
+
+from __future__ import absolute_import
+
+import re
+from collections import OrderedDict
+
+from ccmlib.logrecords import parse_header
+
+# frames of the top exception making up a fingerprint
+FINGERPRINT_FRAMES = 5
+
+_EXCEPTION_RE = re.compile(r'^(?:Exception in thread "[^"]*" )?((?:[\w$]+\.)+[\w$]*(?:Exception|Error|Throwable))\b')
+_MESSAGE_EXCEPTION_RE = re.compile(r'\b((?:[a-z_][\w$]*\.)+[A-Z][\w$]*(?:Exception|Error))\b')
+_FRAME_RE = re.compile(r'^\s*at (?:[\w.$@]*/)*([\w$.<>]+)\(')
+# generated classes get numbered at run time
+_GENERATED_RE = re.compile(r'\$\$Lambda\$[\w/$]*|(?<=Accessor)\d+|\$\d+')
+_VARIABLE_RE = re.compile(r'[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|0x[0-9a-fA-F]+|\d+')
+
+
+def fingerprint(block):
+    """
+    Returns (fingerprint, exception type) for an error block, the list of
+    the lines of an error and of its stack trace. The exception type is None
+    if the block does not tell it.
+    """
+    exception = None
+    frames = []
+    for line in block[1:]:
+        if line.startswith('Caused by:'):
+            break
+        m = _FRAME_RE.match(_GENERATED_RE.sub('', line))
+        if m is not None:
+            if len(frames) < FINGERPRINT_FRAMES:
+                frames.append(m.group(1))
+            continue
+        m = _EXCEPTION_RE.match(line.strip())
+        if m is not None and exception is None:
+            exception = m.group(1)
+    header = parse_header(block[0])
+    if exception is None:
+        m = _MESSAGE_EXCEPTION_RE.search(header[5] if header is not None else block[0])
+        if m is not None:
+            exception = m.group(1)
+    if exception is not None:
+        return '|'.join([exception] + frames), exception
+    if header is not None:
+        return '{}: {}'.format(header[3], _VARIABLE_RE.sub('#', header[5])), None
+    return _VARIABLE_RE.sub('#', block[0]), None
+
+
+class ErrorGroup(object):
+    """
+    The errors sharing a fingerprint: count is their number, exemplar the
+    lines of the first one, and nodes maps the name of each node they were
+    logged by to [count, offset of the first one, offset of the last one].
+    """
+
+    def __init__(self, fingerprint, exception, exemplar):
+        self.fingerprint = fingerprint
+        self.exception = exception
+        self.exemplar = exemplar
+        self.count = 0
+        self.nodes = OrderedDict()
+
+    def add(self, node, start=None, count=1, last=None):
+        self.count += count
+        occurrences = self.nodes.get(node)
+        if occurrences is None:
+            self.nodes[node] = [count, start, start if last is None else last]
+        else:
+            occurrences[0] += count
+            occurrences[2] = start if last is None else last
+
+    def title(self):
+        return self.exception if self.exception is not None else self.exemplar[0]
+
+
+class ErrorSummary(object):
+    """
+    Error blocks grouped by fingerprint, for one node or a whole cluster.
+    """
+
+    def __init__(self):
+        self._groups = OrderedDict()
+
+    def add(self, node, block, start=None):
+        """
+        Accounts for the error block (list of lines) logged by node at byte
+        offset start. Returns its ErrorGroup.
+        """
+        key, exception = fingerprint(block)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = ErrorGroup(key, exception, block)
+        group.add(node, start)
+        return group
+
+    def update(self, other):
+        """
+        Merges the groups of another summary (e.g. of another node) in.
+        """
+        for key, theirs in other._groups.items():
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = ErrorGroup(key, theirs.exception, theirs.exemplar)
+            for node, (count, first, last) in theirs.nodes.items():
+                group.add(node, first, count, last)
+        return self
+
+    def groups(self):
+        """
+        Returns the ErrorGroups, most frequent first.
+        """
+        return sorted(self._groups.values(), key=lambda group: -group.count)
+
+    def count(self):
+        return sum(group.count for group in self._groups.values())
+
+    def __len__(self):
+        return len(self._groups)
+
+    def format(self):
+        """
+        Returns the lines describing the summary for a user: each group with
+        the nodes that logged it and its exemplar.
+        """
+        lines = []
+        for group in self.groups():
+            nodes = ', '.join('{} ({})'.format(node, occurrences[0]) for node, occurrences in group.nodes.items())
+            lines.append('{} x {} on {}'.format(group.count, group.title(), nodes))
+            lines.extend('    ' + line for line in group.exemplar)
+        return lines
@@ -0,0 +1,200 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# incremental log grepping
+#
+# A LogIndex remembers, for every regular expression it was asked about, the
+# byte offset of each matching line and how far the log file has been
+# scanned. Repeated greps of the same file then only read what was appended
+# since the previous call, plus the matching lines themselves: only their
+# offsets are kept, so that the index stays small on long running logs.
+#
+
+from __future__ import absolute_import
+
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+def decode_line(raw):
+    """
+    Decodes a raw log line read in binary mode the way a text mode read would
+    have returned it.
+    """
+    line = raw.decode('utf-8', 'replace')
+    if line.endswith('\r\n'):
+        line = line[:-2] + '\n'
+    return line
+
+
+def iter_lines(f, start, end=None):
+    """
+    Yields (offset, raw line) for the complete lines of the binary file f
+    starting at byte offset start, stopping before offset end if given.
+    A trailing line without a line terminator is yielded with offset None
+    so that callers can tell that the writer may not be done with it yet.
+    """
+    f.seek(start)
+    offset = start
+    while end is None or offset < end:
+        raw = f.readline()
+        if not raw:
+            return
+        if not raw.endswith(b'\n'):
+            yield None, raw
+            return
+        yield offset, raw
+        offset += len(raw)
+
+
+class _PatternIndex(object):
+
+    def __init__(self, pattern, start):
+        self.pattern = pattern
+        # the index covers the lines starting in [start, LogIndex._end)
+        self.start = start
+        self.offsets = array('q')
+
+    def add(self, offset, line):
+        if self.pattern.search(line):
+            self.offsets.append(offset)
+
+
+class LogIndex(object):
+    """
+    Incremental index of the lines of a log file matching regular expressions.
+
+    An offset passed to the query methods that falls inside a line (rather than
+    at a line boundary, as the marks returned by Node.mark_log() are) matches
+    the rest of that line, as grepping the file from that offset would.
+    """
+
+    # indexing every expression ever grepped for would make each refresh
+    # slower and slower, so the least recently used ones are forgotten
+    MAX_PATTERNS = 64
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._patterns = OrderedDict()
+        self._end = 0
+        self._file_id = None
+
+    def grep(self, expr, from_mark=None, to_mark=None):
+        """
+        Returns the list of (line, match) for the lines matching expr, as
+        Node.grep_log() does.
+        """
+        return [(line, m) for _, line, m in self.matches_between(expr, from_mark or 0, to_mark)]
+
+    def matches_between(self, expr, start=0, end=None):
+        """
+        Returns the list of (offset, line, match) for the lines matching expr
+        that start at or after byte offset start and before byte offset end
+        (or the end of the file if end is None). Only the parts of the file that
+        were never scanned for expr are read, and the matching lines.
+        """
+        pattern = re.compile(expr)
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                self._reset_if_replaced(f)
+                result = []
+                start = self._match_rest_of_line(f, pattern, start, end, result)
+                entry = self._get_entry(pattern)
+                if start < entry.start:
+                    self._index_backwards(entry, f, start)
+                partial = self._refresh(f)
+
+                lo = bisect_left(entry.offsets, start)
+                hi = len(entry.offsets) if end is None else bisect_left(entry.offsets, end)
+                for offset in entry.offsets[lo:hi]:
+                    f.seek(offset)
+                    self._append_match(result, pattern, offset, f.readline())
+
+                if partial is not None and partial[0] >= start and (end is None or partial[0] < end):
+                    self._append_match(result, pattern, *partial)
+                return result
+
+    def indexed_offset(self):
+        """
+        Returns the offset up to which the file has been indexed.
+        """
+        return self._end
+
+    @staticmethod
+    def _append_match(result, pattern, offset, raw):
+        line = decode_line(raw)
+        m = pattern.search(line)
+        if m:
+            result.append((offset, line, m))
+
+    def _match_rest_of_line(self, f, pattern, start, end, result):
+        # matches the end of the line start falls in, if it is not at a line
+        # boundary, and returns the offset of the next line
+        if start <= 0:
+            return 0
+        f.seek(start - 1)
+        if f.read(1) in (b'\n', b''):
+            return start
+        raw = f.readline()
+        if end is None or start < end:
+            self._append_match(result, pattern, start, raw)
+        return start + len(raw)
+
+    def _get_entry(self, pattern):
+        key = (pattern.pattern, pattern.flags)
+        entry = self._patterns.get(key)
+        if entry is None:
+            entry = _PatternIndex(pattern, self._end)
+            self._patterns[key] = entry
+            if len(self._patterns) > self.MAX_PATTERNS:
+                self._patterns.popitem(last=False)
+        else:
+            self._patterns.move_to_end(key)
+        return entry
+
+    def _index_backwards(self, entry, f, start):
+        before = _PatternIndex(entry.pattern, start)
+        for offset, raw in iter_lines(f, start, entry.start):
+            if offset is None:
+                break
+            before.add(offset, decode_line(raw))
+        entry.offsets = before.offsets + entry.offsets
+        entry.start = start
+
+    def _refresh(self, f):
+        entries = list(self._patterns.values())
+        for offset, raw in iter_lines(f, self._end):
+            if offset is None:
+                return self._end, raw
+            line = decode_line(raw)
+            for entry in entries:
+                entry.add(offset, line)
+            self._end = offset + len(raw)
+        return None
+
+    def _reset_if_replaced(self, f):
+        st = os.fstat(f.fileno())
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self._file_id or st.st_size < self._end:
+            self._patterns.clear()
+            self._end = 0
+            self._file_id = file_id
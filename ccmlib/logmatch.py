@@ -0,0 +1,158 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# matching of log lines against many regular expressions at once
+#
+# Most lines of a log match none of the expressions a watcher waits for, so
+# each expression is reduced to a literal substring that any line it matches
+# must contain. A single combined search for those literals rules out most
+# lines, and only the expressions whose literal is present are run.
+#
+
+from __future__ import absolute_import
+
+import re
+
+from six import string_types, unichr
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+
+def required_literal(pattern):
+    """
+    Returns the longest literal string that every match of the compiled
+    pattern contains, or None if no such string can be told (e.g. for case
+    insensitive patterns).
+    """
+    if not isinstance(pattern.pattern, string_types) or pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, TypeError, ValueError):
+        return None
+    runs = []
+    current = _collect_literals(parsed, runs, [])
+    runs.append(''.join(current))
+    longest = max(runs, key=len)
+    return longest or None
+
+
+def _collect_literals(parsed, runs, current):
+    # runs receives the literal strings that are certainly matched, current is
+    # the run being built; returns the run still open at the end of parsed
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(unichr(av))
+        elif op is sre_constants.AT:
+            # anchors are zero-width, the literals around them stay contiguous
+            continue
+        elif op is sre_constants.SUBPATTERN and _same_flags(av):
+            current = _collect_literals(av[-1], runs, current)
+        else:
+            runs.append(''.join(current))
+            current = []
+    return current
+
+
+def _same_flags(av):
+    # (group, add_flags, del_flags, pattern) since python 3.6, (group, pattern) before
+    return len(av) < 4 or (av[1] == 0 and av[2] == 0)
+
+
+class MultiPatternMatcher(object):
+    """
+    Matches lines against a list of regular expressions (strings or compiled
+    patterns) in one pass per line. Expressions are forgotten once they are
+    found, as watchers only look for the first match of each.
+    """
+
+    def __init__(self, exprs):
+        self.patterns = [e if hasattr(e, 'search') else re.compile(e) for e in exprs]
+        self._pending = {}
+        # expressions without a usable literal are run against every line
+        self._unfiltered = set()
+        self._by_literal = {}
+        self._literal_of = {}
+        for i, pattern in enumerate(self.patterns):
+            self._pending[i] = pattern
+            literal = required_literal(pattern)
+            if literal is None:
+                self._unfiltered.add(i)
+            else:
+                self._by_literal.setdefault(literal, set()).add(i)
+                self._literal_of[i] = literal
+        self._update_prefilter()
+
+    def _update_prefilter(self):
+        literals = sorted(self._by_literal, key=len, reverse=True)
+        self._prefilter = re.compile('|'.join(re.escape(l) for l in literals)) if literals else None
+        self._prefilter_size = len(literals)
+
+    def pending(self):
+        """
+        Returns the patterns that were not found yet, in their original order.
+        """
+        return [self._pending[i] for i in sorted(self._pending)]
+
+    def is_done(self):
+        return not self._pending
+
+    def match(self, line):
+        """
+        Returns the list of (pattern, match) for the pending patterns found in
+        line, in their original order, and marks them as found.
+        """
+        candidates = self._candidates(line)
+        if not candidates:
+            return []
+        found = []
+        for i in sorted(candidates):
+            pattern = self._pending[i]
+            m = pattern.search(line)
+            if m:
+                found.append((pattern, m))
+                self._forget(i)
+        # literals of found expressions left in the prefilter only cost a few
+        # substring tests, so it is rebuilt once half of them are gone
+        if found and len(self._by_literal) <= self._prefilter_size // 2:
+            self._update_prefilter()
+        return found
+
+    def _candidates(self, line):
+        candidates = set(self._unfiltered)
+        if self._prefilter is not None and self._prefilter.search(line):
+            # literals may overlap, so test each one rather than trusting
+            # the non-overlapping matches of the combined expression
+            for literal, indexes in self._by_literal.items():
+                if literal in line:
+                    candidates.update(indexes)
+        return candidates
+
+    def _forget(self, i):
+        del self._pending[i]
+        self._unfiltered.discard(i)
+        literal = self._literal_of.pop(i, None)
+        if literal is not None:
+            indexes = self._by_literal[literal]
+            indexes.discard(i)
+            if not indexes:
+                del self._by_literal[literal]
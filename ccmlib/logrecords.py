@@ -0,0 +1,360 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# structured log records
+#
+# Cassandra logs through logback with the pattern
+#   %-5level [%thread] %date{ISO8601} %F:%L - %msg%n
+# A LogRecordIndex parses a log file incrementally into records and keeps
+# their fields in arrays (one per field, strings interned), so that queries
+# on level, thread, logger or time only scan those arrays. Messages are read
+# back from the file, by offset, for the records a query returns.
+# seek_log_to() finds the first record logged after a given time by binary
+# search over the byte offsets of a file, and mark_at() in the rolled over
+# archives of a log too.
+#
+
+from __future__ import absolute_import
+
+import os
+import re
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+from six import string_types
+
+from ccmlib import logarchive
+from ccmlib.logindex import decode_line, iter_lines
+
+LEVELS = ('TRACE', 'DEBUG', 'INFO', 'WARN', 'ERROR')
+
+_HEADER_RE = re.compile(r'^(TRACE|DEBUG|INFO|WARN|ERROR)\s+\[(.*?)\]\s+'
+                        r'(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})[,.](\d{3})\s+'
+                        r'(\S+?)(?::(\d+))?\s+-\s?(.*)$')
+
+LogRecord = namedtuple('LogRecord', ['node', 'offset', 'timestamp', 'level', 'thread', 'logger', 'line_number',
+                                     'message', 'continuation'])
+LogRecord.__doc__ = """
+A log event: timestamp is in seconds since the epoch, logger is the name of
+the class that logged it (file name without extension) and continuation the
+list of the lines following the message (e.g. a stack trace).
+"""
+
+
+# consecutive log lines are mostly logged within the same second; the
+# (date, seconds) pair is swapped as a whole as several threads parse logs
+_last_date = (None, None)
+
+
+def parse_timestamp(date, millis='000'):
+    """
+    Returns the seconds since the epoch of a logback ISO8601 date (local time).
+    """
+    global _last_date
+    last_date, seconds = _last_date
+    if last_date != date:
+        seconds = time.mktime(time.strptime(date.replace('T', ' '), '%Y-%m-%d %H:%M:%S'))
+        _last_date = (date, seconds)
+    return seconds + int(millis) / 1000.0
+
+
+def to_timestamp(when):
+    """
+    Returns seconds since the epoch for a datetime or a number of seconds.
+    """
+    if isinstance(when, datetime):
+        return time.mktime(when.timetuple()) + when.microsecond / 1000000.0
+    return float(when)
+
+
+def parse_time(value):
+    """
+    Returns seconds since the epoch for a 'YYYY-MM-DD HH:MM:SS' date (local
+    time, as in the logs) or a number of seconds given as a string, e.g. on
+    the command line.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return parse_timestamp(value.replace('T', ' ').split(',')[0])
+
+
+def parse_header(line):
+    """
+    Returns (level, thread, timestamp, logger, line number, message) if line
+    starts a log event, None otherwise.
+    """
+    m = _HEADER_RE.match(line.rstrip('\r\n'))
+    if m is None:
+        return None
+    level, thread, date, millis, source, line_number, message = m.groups()
+    logger = source[:-len('.java')] if source.endswith('.java') else source
+    return level, thread, parse_timestamp(date, millis), logger, int(line_number or 0), message
+
+
+def _next_record(f, pos):
+    # (offset, timestamp) of the first record starting at or after pos
+    if pos > 0:
+        # skip the rest of the line pos is in, unless it starts a line
+        f.seek(pos - 1)
+        offset = pos - 1 + len(f.readline())
+    else:
+        f.seek(0)
+        offset = 0
+    while True:
+        raw = f.readline()
+        if not raw:
+            return None
+        header = parse_header(decode_line(raw))
+        if header is not None:
+            return offset, header[2]
+        offset += len(raw)
+
+
+def seek_log_to(f, when):
+    """
+    Seeks the binary log file f to the first record logged at or after when
+    (a datetime or seconds since the epoch) and returns its offset, or the
+    end of the file if there is none.
+
+    Records are assumed to be in timestamp order, which logback only
+    guarantees to the millisecond between threads: this binary searches the
+    file by byte offset, reading from each probe up to the next record, so
+    lines that do not start a record (stack traces) are stepped over.
+    """
+    when = to_timestamp(when)
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    # smallest position whose next record is at or after when
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        record = _next_record(f, mid)
+        if record is None or record[1] >= when:
+            hi = mid
+        else:
+            # probes up to that record all find it
+            lo = record[0] + 1
+    record = _next_record(f, lo)
+    offset = size if record is None else record[0]
+    f.seek(offset)
+    return offset
+
+
+def _archived_records(archive):
+    # (offset, timestamp) of the records of an archived log
+    for offset, line in logarchive.iter_archive_lines(archive):
+        header = parse_header(line)
+        if header is not None:
+            yield offset, header[2]
+
+
+def _mark_in_archives(path, when):
+    archives = logarchive.rotated_archives(path)
+    # the record is in the newest archive starting before when, or in the
+    # oldest one if they all start after it
+    start = 0
+    for i in range(len(archives) - 1, -1, -1):
+        first = next(_archived_records(archives[i]), None)
+        if first is not None and first[1] < when:
+            start = i
+            break
+    for archive in archives[start:]:
+        for offset, timestamp in _archived_records(archive):
+            if timestamp >= when:
+                # archives_since() picks the archives modified after the time
+                # of a mark of a rotated file
+                return logarchive.LogMark(offset, logarchive.file_id(archive), os.path.getmtime(archive))
+    return None
+
+
+def mark_at(path, when):
+    """
+    Returns a LogMark (see ccmlib.logarchive) to the first record of the log
+    at path logged at or after when (a datetime or seconds since the epoch),
+    or to its end if there is none. If when is older than the first record of
+    the file, the record is looked for in the archives the log was rolled
+    over into: the mark then points into an archive, which grepping or
+    reading the log with search_archives=True starts from.
+    """
+    when = to_timestamp(when)
+    first, offset = None, 0
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            record = _next_record(f, 0)
+            first = record[1] if record is not None else None
+            offset = seek_log_to(f, when)
+    if first is None or first >= when:
+        mark = _mark_in_archives(path, when)
+        if mark is not None:
+            return mark
+    return logarchive.mark_file(path, offset)
+
+
+class _Interned(object):
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def id(self, value):
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class LogRecordIndex(object):
+    """
+    Incremental, array-backed index of the log records of a file.
+    """
+
+    def __init__(self, path, node=None):
+        self.path = path
+        self.node = node
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, file_id):
+        self._file_id = file_id
+        self._end = 0
+        self.offsets = array('q')
+        self.ends = array('q')
+        self.timestamps = array('d')
+        self.levels = array('b')
+        self.threads = array('i')
+        self.loggers = array('i')
+        self.line_numbers = array('i')
+        self._threads = _Interned()
+        self._loggers = _Interned()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def refresh(self):
+        """
+        Parses the lines appended to the file since the last call.
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._reset(None)
+                return
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                file_id = (st.st_dev, st.st_ino)
+                if file_id != self._file_id or st.st_size < self._end:
+                    self._reset(file_id)
+                for offset, raw in iter_lines(f, self._end):
+                    if offset is None:
+                        # wait for the writer to finish the line
+                        break
+                    self._end = offset + len(raw)
+                    header = parse_header(decode_line(raw))
+                    if header is not None:
+                        level, thread, timestamp, logger, line_number, _ = header
+                        self.offsets.append(offset)
+                        self.ends.append(self._end)
+                        self.timestamps.append(timestamp)
+                        self.levels.append(LEVELS.index(level))
+                        self.threads.append(self._threads.id(thread))
+                        self.loggers.append(self._loggers.id(logger))
+                        self.line_numbers.append(line_number)
+                    elif len(self.ends) and self.ends[-1] == offset:
+                        # continuation of the previous record
+                        self.ends[-1] = self._end
+
+    def select(self, level=None, thread=None, logger=None, since=None, until=None, from_mark=None, to_mark=None):
+        """
+        Returns the positions in the index of the records matching all the
+        given filters:
+          - level: a level name or a list of them
+          - thread, logger: exact thread name or logger class name
+          - since, until: a datetime or seconds since the epoch; records logged
+            at or after since, and before until
+          - from_mark, to_mark: byte offsets in the file, as returned by
+            Node.mark_log()
+        """
+        with self._lock:
+            conditions = []
+            if level is not None:
+                codes = set(LEVELS.index(l) for l in ([level] if isinstance(level, string_types) else level))
+                conditions.append((self.levels, codes.__contains__))
+            if thread is not None:
+                thread_id = self._threads.ids.get(thread)
+                if thread_id is None:
+                    return []
+                conditions.append((self.threads, thread_id.__eq__))
+            if logger is not None:
+                logger_id = self._loggers.ids.get(logger)
+                if logger_id is None:
+                    return []
+                conditions.append((self.loggers, logger_id.__eq__))
+            if since is not None:
+                since = to_timestamp(since)
+                conditions.append((self.timestamps, since.__le__))
+            if until is not None:
+                until = to_timestamp(until)
+                conditions.append((self.timestamps, until.__gt__))
+            if from_mark is not None:
+                conditions.append((self.offsets, from_mark.__le__))
+            if to_mark is not None:
+                conditions.append((self.offsets, to_mark.__gt__))
+
+            positions = range(len(self.offsets))
+            for column, test in conditions:
+                positions = [i for i in positions if test(column[i])]
+            return list(positions)
+
+    def records(self, positions):
+        """
+        Returns the LogRecord of each of the given positions, reading their
+        message and continuation lines from the file.
+        """
+        with self._lock:
+            result = []
+            if not positions:
+                return result
+            with open(self.path, 'rb') as f:
+                for i in positions:
+                    f.seek(self.offsets[i])
+                    lines = decode_line(f.read(self.ends[i] - self.offsets[i])).split('\n')
+                    if lines and lines[-1] == '':
+                        lines.pop()
+                    header = parse_header(lines[0])
+                    result.append(LogRecord(node=self.node,
+                                            offset=self.offsets[i],
+                                            timestamp=self.timestamps[i],
+                                            level=LEVELS[self.levels[i]],
+                                            thread=self._threads.values[self.threads[i]],
+                                            logger=self._loggers.values[self.loggers[i]],
+                                            line_number=self.line_numbers[i],
+                                            message=header[5] if header is not None else lines[0],
+                                            continuation=[l.rstrip('\r') for l in lines[1:]]))
+            return result
+
+    def query(self, **filters):
+        """
+        Refreshes the index and returns the LogRecords matching filters (see
+        select()), in log order.
+        """
+        with self._lock:
+            self.refresh()
+            return self.records(self.select(**filters))
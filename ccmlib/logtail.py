@@ -0,0 +1,386 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# log tailing helpers
+#
+# Cassandra logs are followed by reading to EOF and then waiting for more data
+# to be appended. On Linux the wait is driven by inotify so that a watcher
+# wakes up as soon as the node writes a line; everywhere else (or when inotify
+# cannot be used) we fall back to sleeping for the whole wait interval.
+#
+
+from __future__ import absolute_import
+
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from collections import OrderedDict, deque
+
+from six import string_types
+
+from ccmlib.logarchive import RotatingLogReader, current_offset
+from ccmlib.logmatch import MultiPatternMatcher
+
+logger = logging.getLogger(__name__)
+
+# inotify is only used through ctypes, so that there is no extra dependency
+INOTIFY_IS_AVAILABLE = False
+_libc = None
+if sys.platform.startswith('linux') and not os.environ.get('CCM_DISABLE_INOTIFY'):
+    try:
+        import ctypes
+        import ctypes.util
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_init1.restype = ctypes.c_int
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_add_watch.restype = ctypes.c_int
+        INOTIFY_IS_AVAILABLE = True
+    except (ImportError, OSError, AttributeError):
+        _libc = None
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class PollingWaiter(object):
+    """
+    Waits for log files to change by sleeping for the whole interval.
+    """
+
+    def __init__(self, paths=None):
+        self.paths = list(paths or [])
+
+    def add(self, path):
+        self.paths.append(path)
+
+    def wait(self, timeout, wake_fds=()):
+        """
+        Sleeps for timeout seconds, or until one of wake_fds is readable.
+        Always returns False since nothing is actually watched.
+        """
+        if wake_fds and timeout > 0:
+            _select(list(wake_fds), timeout)
+        elif timeout > 0:
+            time.sleep(timeout)
+        return False
+
+    def fileno(self):
+        """
+        Returns a file descriptor that becomes readable when a watched file
+        changes, or None if changes cannot be waited for that way.
+        """
+        return None
+
+    def drain(self):
+        """
+        Consumes the pending change notifications without blocking and
+        returns True if one of the watched files changed.
+        """
+        return False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class InotifyWaiter(PollingWaiter):
+    """
+    Waits for log files to change using inotify.
+
+    The parent directory of each file is watched rather than the file itself,
+    so that the creation of a log file (or its replacement by a new one on
+    rotation) also wakes up the waiter.
+    """
+
+    def __init__(self, paths=None):
+        self._fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watched_names = {}
+        # directories that could not be watched (e.g. not created yet) are
+        # handled by sleeping, as PollingWaiter does
+        self._blind = False
+        PollingWaiter.__init__(self)
+        for path in paths or []:
+            self.add(path)
+
+    def add(self, path):
+        PollingWaiter.add(self, path)
+        directory, name = os.path.split(os.path.abspath(path))
+        wd = _libc.inotify_add_watch(self._fd, directory.encode(sys.getfilesystemencoding()), _WATCH_MASK)
+        if wd < 0:
+            logger.debug("Cannot watch {} with inotify (errno {}), falling back to polling".format(directory, ctypes.get_errno()))
+            self._blind = True
+            return
+        self._watched_names.setdefault(wd, set()).add(name.encode(sys.getfilesystemencoding()))
+
+    def wait(self, timeout, wake_fds=()):
+        """
+        Blocks until one of the watched files is written to, created or
+        replaced, one of wake_fds is readable, or until timeout seconds have
+        passed. Returns True if a change was seen.
+        """
+        if self._blind:
+            return PollingWaiter.wait(self, timeout, wake_fds)
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            readable = _select([self._fd] + list(wake_fds), remaining)
+            if any(fd != self._fd for fd in readable):
+                return False
+            if readable and self.drain():
+                return True
+
+    def fileno(self):
+        return None if self._blind else self._fd
+
+    def drain(self):
+        changed = False
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return changed
+                raise
+            if not buf:
+                return changed
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + name_len].rstrip(b'\0')
+                offset += name_len
+                if mask & _IN_Q_OVERFLOW or name in self._watched_names.get(wd, ()):
+                    changed = True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _select(fds, timeout):
+    # returns the readable fds
+    while True:
+        try:
+            return select.select(fds, [], [], timeout)[0]
+        except (OSError, select.error) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+
+def file_change_waiter(paths):
+    """
+    Returns a waiter for the given files: an InotifyWaiter when inotify can be
+    used, a PollingWaiter otherwise. Waiters are context managers.
+    """
+    if INOTIFY_IS_AVAILABLE:
+        try:
+            return InotifyWaiter(paths)
+        except OSError as e:
+            logger.debug("Cannot initialize inotify ({}), falling back to polling".format(e))
+    return PollingWaiter(paths)
+
+
+class LogCapture(object):
+    """
+    Bounded capture of the lines read while watching a log: the first
+    head_lines and the last tail_lines lines are kept, along with statistics
+    on everything that was read.
+    """
+
+    def __init__(self, head_lines=5, tail_lines=20):
+        self.head_lines = head_lines
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self.lines_read = 0
+        self.bytes_read = 0
+        self.match_time = 0.0
+
+    def add(self, line):
+        self.lines_read += 1
+        self.bytes_read += len(line.encode('utf-8'))
+        if len(self.head) < self.head_lines:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+
+    def skipped(self):
+        """
+        Returns the number of lines read that are in neither head nor tail.
+        """
+        return self.lines_read - len(self.head) - len(self.tail)
+
+    def stats(self):
+        return {'lines_read': self.lines_read,
+                'bytes_read': self.bytes_read,
+                'match_time': round(self.match_time, 6)}
+
+    def format(self):
+        text = ''.join(self.head)
+        if self.skipped():
+            text += "[... {} lines ...]\n".format(self.skipped())
+        return text + ''.join(self.tail)
+
+
+class LogExpectation(object):
+    """
+    A set of regular expressions that must all be found in a log file, in
+    lines starting at or after from_mark. The (line, match) pairs found are
+    accumulated in matchings.
+    """
+
+    def __init__(self, path, exprs, from_mark=None, name=None):
+        self.path = path
+        self.name = name if name is not None else path
+        self.from_mark = from_mark or 0
+        self._matcher = MultiPatternMatcher([exprs] if isinstance(exprs, string_types) else exprs)
+        self.matchings = []
+
+    @property
+    def pending(self):
+        return self._matcher.pending()
+
+    def is_met(self):
+        return self._matcher.is_done()
+
+    def feed(self, offset, line):
+        if offset < self.from_mark:
+            return
+        for _, m in self._matcher.match(line):
+            self.matchings.append((line, m))
+
+
+class _FollowedFile(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.reader = None
+        self.rotations = 0
+        self.expectations = []
+
+    def read(self):
+        if self.reader is None:
+            if not os.path.exists(self.path):
+                return
+            # marks of a log rolled over since stand for the start of the new file
+            for expectation in self.expectations:
+                expectation.from_mark = current_offset(self.path, expectation.from_mark)
+            self.reader = RotatingLogReader(self.path, min(e.from_mark for e in self.expectations))
+        while True:
+            next_line = self.reader.readline()
+            if self.reader.rotations != self.rotations:
+                # every line of the new file comes after the marks
+                self.rotations = self.reader.rotations
+                for expectation in self.expectations:
+                    expectation.from_mark = 0
+            if next_line is None:
+                return
+            offset, line = next_line
+            for expectation in self.expectations:
+                expectation.feed(offset, line)
+            if all(e.is_met() for e in self.expectations):
+                return
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+class MultiLogWatcher(object):
+    """
+    Follows several log files at once, in the calling thread, until a whole set
+    of expectations is met. Each file is opened once and read once however many
+    expectations refer to it, and a single waiter wakes the loop up whenever any
+    of the files is written to.
+
+    All expectations must be registered with expect() before calling wait().
+    """
+
+    def __init__(self):
+        self._files = OrderedDict()
+        self.expectations = []
+
+    def expect(self, path, exprs, from_mark=None, name=None):
+        """
+        Registers an expectation that all of exprs are found in the log file
+        at path after from_mark, and returns it.
+        """
+        expectation = LogExpectation(path, exprs, from_mark=from_mark, name=name)
+        followed = self._files.get(path)
+        if followed is None:
+            followed = self._files[path] = _FollowedFile(path)
+        followed.expectations.append(expectation)
+        self.expectations.append(expectation)
+        return expectation
+
+    def pending(self):
+        """
+        Returns the expectations that are not met yet.
+        """
+        return [e for e in self.expectations if not e.is_met()]
+
+    def wait(self, timeout, check=None, wake_fds=()):
+        """
+        Reads the followed files until every expectation is met (returns True)
+        or timeout seconds have passed (returns False). If given, check is
+        called at least once per second while waiting, and as soon as one of
+        wake_fds is readable, and may raise to abort the wait.
+        """
+        deadline = time.time() + timeout
+        try:
+            with file_change_waiter(list(self._files)) as waiter:
+                while True:
+                    for followed in self._files.values():
+                        followed.read()
+                    if not self.pending():
+                        return True
+                    if check is not None:
+                        check()
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    waiter.wait(min(1, remaining), wake_fds)
+        finally:
+            self.close()
+
+    def close(self):
+        for followed in self._files.values():
+            followed.close()
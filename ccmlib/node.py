@@ -18,12 +18,11 @@
 # ccm node
 from __future__ import absolute_import, with_statement
 
-import errno
 import glob
+import io
 import locale
 import logging
 import os
-import psutil
 import re
 import shlex
 import shutil
@@ -40,13 +39,17 @@ from distutils.version import LooseVersion  #pylint: disable=import-error, no-na
 import yaml
 from six import print_, string_types
 
-from ccmlib import common, extension
+from ccmlib import (appcds, common, compactionlog, cqlprobe, extension, gclog, gossip, logarchive, logerrors,
+                    logindex, logmatch, logrecords, logtail, procwatch)
 from ccmlib.repository import setup
+from ccmlib.timeline import BINARY_READY, PID_VISIBLE, SPAWNED, TIMELINE_FILE, StartupTimeline
 from six.moves import xrange
 
 logger = logging.getLogger(__name__)
 
 NODE_WAIT_TIMEOUT_IN_SECS = 90
+# cassandra should not take more than 2 minutes to shutdown
+NODE_STOP_TIMEOUT_IN_SECS = 127
 DEFAULT_UPDATE_PID_TIMEOUT_IN_SECS = int(os.environ.get('CCM_UPDATE_PID_DEFAULT_TIMEOUT', 30))
 
 class Status():
@@ -65,22 +68,24 @@ class NodeError(Exception):
 
 class TimeoutError(Exception):
 
-    def __init__(self, data):
+    def __init__(self, data, stats=None):
         Exception.__init__(self, str(data))
+        # diagnosis data (e.g. how much of the log was read), if any
+        self.stats = stats
 
     @staticmethod
-    def raise_if_passed(start, timeout, msg, node=None):
+    def raise_if_passed(start, timeout, msg, node=None, stats=None):
         if start + timeout < time.time():
-            raise TimeoutError.create(start, timeout, msg, node)
+            raise TimeoutError.create(start, timeout, msg, node, stats)
 
     @staticmethod
-    def create(start, timeout, msg, node=None):
+    def create(start, timeout, msg, node=None, stats=None):
         tstamp = time.strftime("%d %b %Y %H:%M:%S", time.gmtime())
         duration = round(time.time() - start, 2)
         node_s = " [{}]".format(node) if node else ""
         msg = "{tstamp}{nodes} after {d}/{t} seconds {msg}".format(
             tstamp=tstamp, nodes=node_s, msg=msg, d=duration, t=timeout)
-        return TimeoutError(msg)
+        return TimeoutError(msg, stats)
 
 
 class ToolError(Exception):
@@ -116,6 +121,12 @@ class Node(object):
     Provides interactions to a Cassandra node.
     """
 
+    # default timeout of watch_log_for_alive, also used when waiting for several nodes at once
+    watch_log_for_alive_timeout = 120
+    # number of leading and trailing log lines reported when watch_log_for times out
+    watch_log_for_head_lines = 5
+    watch_log_for_tail_lines = 20
+
 
     @staticmethod
     def get_version_from_build(install_dir=None, node_path=None, cassandra=False):
@@ -197,6 +208,8 @@ class Node(object):
         self.__original_java_home = None
         self.__original_path = None
         self.__conf_updated = False
+        # StartupTimeline of the last start
+        self.start_timeline = None
 
         if derived_cassandra_version:
             self._cassandra_version = derived_cassandra_version
@@ -283,6 +296,7 @@ class Node(object):
         if update_conf:
             self.__conf_updated = True
         env = common.make_cassandra_env(self.get_install_dir(), self.get_path(), update_conf)
+        appcds.share_classpath(env['CASSANDRA_INCLUDE'])
         env = common.update_java_version(jvm_version=None,
                                          install_dir=self.get_install_dir(),
                                          cassandra_version=self.get_cassandra_version(),
@@ -292,6 +306,17 @@ class Node(object):
             env[key] = value
         return env
 
+    def get_tool_env(self, tool):
+        """
+        Returns the environment of the JVM tool of the node named tool
+        (nodetool, sstable*): get_env() with the AppCDS options of that tool,
+        if enabled.
+        """
+        env = self.get_env()
+        if appcds.is_enabled():
+            appcds.add_options(appcds.tool_kind(tool), self.get_install_dir(), env)
+        return env
+
     def get_install_cassandra_root(self):
         return self.get_install_dir()
 
@@ -522,21 +547,106 @@ class Node(object):
             common.CASSANDRA_WIN_ENV if common.is_win() else common.CASSANDRA_ENV
         )
 
-    def grep_log(self, expr, filename='system.log', from_mark=None):
+    def grep_log(self, expr, filename='system.log', from_mark=None, to_mark=None, search_archives=False):
         """
         Returns a list of lines matching the regular expression in parameter
-        in the Cassandra log of this node
+        in the Cassandra log of this node, optionally restricted to the lines
+        between the from_mark and to_mark marks (as returned by mark_log()).
+
+        Matches are served from the log index of the file (see log_index()),
+        so grepping repeatedly for the same expression only reads the part of
+        the log written since the previous call.
+
+        If search_archives is True, the rolled over archives of the log
+        (system.log.N.zip) written after from_mark are searched as well, and
+        their matches come first.
         """
-        matchings = []
-        pattern = re.compile(expr)
-        with open(os.path.join(self.log_directory(), filename)) as f:
-            if from_mark:
-                f.seek(from_mark)
-            for line in f:
-                m = pattern.search(line)
-                if m:
-                    matchings.append((line, m))
-        return matchings
+        log_file = os.path.join(self.log_directory(), filename)
+        matches = []
+        if search_archives:
+            matches = [(line, m) for _, _, line, m in logarchive.grep_archives(log_file, expr, from_mark)]
+        if to_mark is not None and logarchive.was_rotated(log_file, to_mark):
+            # the whole current file was logged after to_mark
+            return matches
+        return matches + self.log_index(filename).grep(expr, from_mark=logarchive.current_offset(log_file, from_mark),
+                                                       to_mark=to_mark)
+
+    def log_index(self, filename='system.log'):
+        """
+        Returns the incremental index (a ccmlib.logindex.LogIndex) of the given
+        log file of this node.
+        """
+        log_file = os.path.join(self.log_directory(), filename)
+        indexes = getattr(self, '_log_indexes', None)
+        if indexes is None:
+            indexes = self._log_indexes = {}
+        if log_file not in indexes:
+            indexes[log_file] = logindex.LogIndex(log_file)
+        return indexes[log_file]
+
+    def log_records(self, filename='system.log', **filters):
+        """
+        Returns the records (ccmlib.logrecords.LogRecord) of the given log file
+        of this node matching filters, in log order. The file is parsed
+        incrementally into an in-memory index, so that filtering does not
+        rescan it. Filters, all optional, are:
+          - level: a level name ('WARN') or a list of them
+          - thread, logger: exact thread name or logging class ('CompactionTask')
+          - since, until: a datetime or seconds since the epoch
+          - from_mark, to_mark: marks as returned by mark_log()
+        """
+        log_file = os.path.join(self.log_directory(), filename)
+        indexes = getattr(self, '_log_record_indexes', None)
+        if indexes is None:
+            indexes = self._log_record_indexes = {}
+        if log_file not in indexes:
+            indexes[log_file] = logrecords.LogRecordIndex(log_file, node=self.name)
+        return indexes[log_file].query(**filters)
+
+    def _current_gclog(self):
+        # JDK 8 rotates gc.log.N.current, JDK 9+ writes to gc.log
+        log_dir = self.log_directory()
+        candidates = glob.glob(os.path.join(log_dir, 'gc.log.*.current')) + [os.path.join(log_dir, 'gc.log')]
+        existing = [path for path in candidates if os.path.exists(path)]
+        return max(existing, key=os.path.getmtime) if existing else self.gclogfilename()
+
+    def mark_gc_log(self):
+        """
+        Returns a mark to the end of the gc log of this node, to pass as the
+        since argument of gc_stats().
+        """
+        return logarchive.mark_file(self._current_gclog())
+
+    def gc_stats(self, since=None, until=None):
+        """
+        Returns the statistics (a ccmlib.gclog.GcStats) of the GC pauses in
+        the gc log of this node, JDK 8 or JDK 9+ format, or None if there are
+        none. since is either a mark returned by mark_gc_log() or, like until,
+        a datetime or seconds since the epoch.
+        """
+        path = self._current_gclog()
+        if not os.path.exists(path):
+            return None
+        start = 0
+        if isinstance(since, logarchive.LogMark):
+            start = logarchive.current_offset(path, since)
+            since = None
+        return gclog.gc_stats(gclog.iter_gc_events(path, start),
+                              since=logrecords.to_timestamp(since) if since is not None else None,
+                              until=logrecords.to_timestamp(until) if until is not None else None)
+
+    def compaction_log(self):
+        """
+        Returns the analysis (a ccmlib.compactionlog.CompactionLog) of the
+        compaction.log of this node, refreshed with the events logged since
+        the previous call: per-table compaction throughput, write
+        amplification and pending compactions over time. Tables only log their
+        compactions with the log_all compaction option.
+        """
+        log = getattr(self, '_compaction_log', None)
+        if log is None or log.path != self.compactionlogfilename():
+            log = self._compaction_log = compactionlog.CompactionLog(self.compactionlogfilename())
+        return log.refresh()
 
     def grep_log_for_errors(self, filename='system.log'):
         """
@@ -546,9 +656,33 @@ class Node(object):
         return self.grep_log_for_errors_from(seek_start=getattr(self, 'error_mark', 0))
 
     def grep_log_for_errors_from(self, filename='system.log', seek_start=0):
-        with open(os.path.join(self.log_directory(), filename)) as f:
-            f.seek(seek_start)
-            return _grep_log_for_errors(f.read())
+        return [block for block, _, _ in self.iter_log_errors(filename=filename, seek_start=seek_start)]
+
+    def iter_log_errors(self, filename='system.log', seek_start=0):
+        """
+        Generator of the errors with stack traces in the Cassandra log of this
+        node after the seek_start offset. Yields (error lines, start offset,
+        end offset) tuples while reading the log in fixed-size chunks, so that
+        memory use does not depend on the size of the log.
+        """
+        with open(os.path.join(self.log_directory(), filename), 'rb') as f:
+            for error in _iter_log_errors(f, seek_start):
+                yield error
+
+    def summarize_log_errors(self, filename='system.log', seek_start=None):
+        """
+        Returns the errors of the Cassandra log of this node after seek_start
+        (by default, the mark set by mark_log_for_errors()) grouped by
+        fingerprint: exception type and top stack frames. The result, a
+        ccmlib.logerrors.ErrorSummary, counts the errors of each group and
+        keeps the first one as an exemplar.
+        """
+        if seek_start is None:
+            seek_start = getattr(self, 'error_mark', 0)
+        summary = logerrors.ErrorSummary()
+        for block, start, _ in self.iter_log_errors(filename=filename, seek_start=seek_start):
+            summary.add(self.name, block, start)
+        return summary
 
     def mark_log_for_errors(self, filename='system.log'):
         """
@@ -562,13 +696,23 @@ class Node(object):
         Returns "a mark" to the current position of this node Cassandra log.
         This is for use with the from_mark parameter of watch_log_for_* methods,
         allowing to watch the log from the position when this method was called.
+
+        The mark remembers which file it was taken on, so that it still points
+        to the right place once the log is rolled over (see
+        ccmlib.logarchive.LogMark).
         """
-        log_file = os.path.join(self.log_directory(), filename)
-        if not os.path.exists(log_file):
-            return 0
-        with open(log_file) as f:
-            f.seek(0, os.SEEK_END)
-            return f.tell()
+        return logarchive.mark_file(os.path.join(self.log_directory(), filename))
+
+    def mark_log_at(self, when, filename='system.log'):
+        """
+        Returns a mark (see mark_log()) to the first record of this node log
+        logged at or after when (a datetime or seconds since the epoch), or to
+        its end if there is none. This allows to watch or grep the log from a
+        point in time even when no mark was taken then. If the log was rotated
+        since, the record is looked for in its archives, and the lines of the
+        archives are only read with search_archives=True (see grep_log()).
+        """
+        return logrecords.mark_at(os.path.join(self.log_directory(), filename), when)
 
     def print_process_output(self, name, proc, verbose=False):
         # If stderr_file exists on the process, we opted to
@@ -595,34 +739,38 @@ class Node(object):
         match object) is returned.
 
         Will raise NodeError if error_on_pit_terminated is True and C* pid is not running.
+
+        The log is followed when it is rolled over, and a from_mark taken on a
+        log rolled over since stands for the start of the new file.
         """
         start = time.time()
-        tofind = [exprs] if isinstance(exprs, string_types) else exprs
-        tofind = [re.compile(e) for e in tofind]
+        tofind = logmatch.MultiPatternMatcher([exprs] if isinstance(exprs, string_types) else exprs)
         matchings = []
-        reads = ""
-        if len(tofind) == 0:
+        capture = logtail.LogCapture(self.watch_log_for_head_lines, self.watch_log_for_tail_lines)
+        if tofind.is_done():
             return None
 
         log_file = os.path.join(self.log_directory(), filename)
         output_read = False
-        while not os.path.exists(log_file):
-            time.sleep(.5)
-            TimeoutError.raise_if_passed(start=start, timeout=timeout, node=self.name,
-                                         msg="Timed out waiting for {} to be created.".format(log_file))
-
-            if process and not output_read:
-                process.poll()
-                if process.returncode is not None:
-                    self.print_process_output(self.name, process, verbose)
-                    output_read = True
-                    if process.returncode != 0:
-                        raise RuntimeError()  # Shouldn't reuse RuntimeError but I'm lazy
+        if not os.path.exists(log_file):
+            with logtail.file_change_waiter([log_file]) as log_created:
+                while not os.path.exists(log_file):
+                    log_created.wait(.5)
+                    TimeoutError.raise_if_passed(start=start, timeout=timeout, node=self.name,
+                                                 msg="Timed out waiting for {} to be created.".format(log_file))
 
-        with open(log_file) as f:
-            if from_mark:
-                f.seek(from_mark)
+                    if process and not output_read:
+                        process.poll()
+                        if process.returncode is not None:
+                            self.print_process_output(self.name, process, verbose)
+                            output_read = True
+                            if process.returncode != 0:
+                                raise RuntimeError()  # Shouldn't reuse RuntimeError but I'm lazy
 
+        # when the process must stay alive, its exit also ends waits for the log
+        exit_watcher = self._exit_watcher() if error_on_pid_terminated else procwatch.ExitWatcher(None)
+        with logarchive.RotatingLogReader(log_file, from_mark) as reader, \
+                logtail.file_change_waiter([log_file]) as log_changed, exit_watcher:
             while True:
                 # First, if we have a process to check, then check it.
                 # Skip on Windows - stdout/stderr is cassandra.bat
@@ -635,28 +783,30 @@ class Node(object):
                             if process.returncode != 0:
                                 raise RuntimeError()  # Shouldn't reuse RuntimeError but I'm lazy
 
-                line = f.readline()
-                if line:
-                    reads = reads + line
-                    for e in tofind:
-                        m = e.search(line)
-                        if m:
-                            matchings.append((line, m))
-                            tofind.remove(e)
-                            if len(tofind) == 0:
-                                return matchings[0] if isinstance(exprs, string_types) else matchings
+                next_line = reader.readline()
+                if next_line is not None:
+                    _, line = next_line
+                    capture.add(line)
+                    match_start = time.time()
+                    for _, m in tofind.match(line):
+                        matchings.append((line, m))
+                    if tofind.is_done():
+                        return matchings[0] if isinstance(exprs, string_types) else matchings
+                    capture.match_time += time.time() - match_start
                 else:
-                    # wait for the situation to clarify, either stop or just a pause in log production
-                    time.sleep(1)
+                    # wait for the situation to clarify, either stop or just a pause in log production;
+                    # returns as soon as something is appended to the log when inotify is available
+                    log_changed.wait(1, wake_fds=procwatch.exit_fds([exit_watcher]))
 
                     if error_on_pid_terminated:
                         self.raise_node_error_if_cassandra_process_is_terminated()
 
-                    TimeoutError.raise_if_passed(start=start, timeout=timeout, node=self.name,
-                                                 msg="Missing: {exprs} not found in {f}:\n Head: {head}\n Tail: {tail}"
+                    TimeoutError.raise_if_passed(start=start, timeout=timeout, node=self.name, stats=capture.stats(),
+                                                 msg="Missing: {exprs} not found in {f} ({lines} lines, {bytes} bytes read):\n{reads}"
                                                  .format(
-                                                     exprs=[e.pattern for e in tofind], f=filename,
-                                                     head=reads[:50], tail="..."+reads[len(reads)-150:]))
+                                                     exprs=[e.pattern for e in tofind.pending()], f=filename,
+                                                     lines=capture.lines_read, bytes=capture.bytes_read,
+                                                     reads=capture.format()))
 
                     # Checking "process" is tricky, as it may be itself terminated e.g. after "verbose"
                     # or if there is some race condition between log checking and start process finish
@@ -670,7 +820,7 @@ class Node(object):
                             process.poll()
                             if process.returncode == 0:
                                 common.debug("{pid} or its child process terminated. watch_for_logs() for {l} will not continue.".format(
-                                    pid=process.pid, l=[e.pattern for e in tofind]))
+                                    pid=process.pid, l=[e.pattern for e in tofind.pending()]))
                                 return None
 
     def watch_log_for_no_errors(self, exprs, from_mark=None, timeout=600, process=None, verbose=False, filename='system.log'):
@@ -716,19 +866,23 @@ class Node(object):
         A mark as returned by mark_log() can be used as the from_mark
         parameter to start watching the log from a given position. Otherwise
         the log is watched from the beginning.
+        The cluster's gossip tracker answers at once if the transitions were
+        already logged.
         """
-        tofind = nodes if isinstance(nodes, list) else [nodes]
-        tofind = ["%s is now [dead|DOWN]" % node.address_for_version(self.get_cassandra_version()) for node in tofind]
-        self.watch_log_for(tofind, from_mark=from_mark, timeout=timeout, filename=filename)
+        watch_logs_for_death([(self, nodes, from_mark)], timeout=timeout, filename=filename)
 
-    def watch_log_for_alive(self, nodes, from_mark=None, timeout=120, filename='system.log'):
+    def watch_log_for_alive(self, nodes, from_mark=None, timeout=None, filename='system.log'):
         """
         Watch the log of this node until it detects that the provided other
         nodes are marked UP. This method works similarly to watch_log_for_death.
         """
-        tofind = nodes if isinstance(nodes, list) else [nodes]
-        tofind = ["%s.* is now UP" % node.address_for_version(self.get_cassandra_version()) for node in tofind]
-        self.watch_log_for(tofind, from_mark=from_mark, timeout=timeout, filename=filename)
+        watch_logs_for_alive([(self, nodes, from_mark)], timeout=timeout, filename=filename)
+
+    def _death_exprs(self, nodes):
+        return ["%s is now [dead|DOWN]" % node.address_for_version(self.get_cassandra_version()) for node in nodes]
+
+    def _alive_exprs(self, nodes):
+        return ["%s.* is now UP" % node.address_for_version(self.get_cassandra_version()) for node in nodes]
 
     def raise_node_error_if_cassandra_process_is_terminated(self):
         if not self._is_pid_running():
@@ -756,10 +910,18 @@ class Node(object):
             self.watch_log_for("Starting listening for CQL clients", **kwargs)
 
         binary_itf = self.network_interfaces['binary']
-        if not common.check_socket_listening(binary_itf, timeout=timeout):
+        if not cqlprobe.check_native_transport(binary_itf, timeout=timeout, tcp_only=self._binary_interface_requires_tls()):
             warnings.warn("Binary interface %s:%s is not listening after %s seconds, node may have failed to start."
                           % (binary_itf[0], binary_itf[1], timeout))
 
+    def _binary_interface_requires_tls(self):
+        # the native protocol cannot be spoken in clear to such interfaces,
+        # they are only checked to accept connections
+        options = common.merge_configuration(self.cluster._config_options, self.__config_options, delete_empty=False)
+        encryption = options.get('client_encryption_options') or {}
+        enabled, optional = (str(encryption.get(key, False)).lower() == 'true' for key in ('enabled', 'optional'))
+        return enabled and not optional
+
     def wait_for_thrift_interface(self, **kwargs):
         """
         Waits for the Thrift interface to be listening.
@@ -845,6 +1007,7 @@ class Node(object):
             marks = []
 
         self.mark = self.mark_log()
+        timeline = StartupTimeline(self.name, self.logfilename(), self.mark, self.get_cassandra_version())
 
         launch_bin = self.get_launch_bin()
 
@@ -914,6 +1077,7 @@ class Node(object):
         # (e.g. the host's JAVA_HOME points to Java 11, but the node's software is only for Java 8)
         for k in 'JAVA_HOME', 'PATH':
             self.__environment_variables[k] = env[k]
+        appcds.add_options(appcds.SERVER, self.get_install_dir(), env, 'JVM_EXTRA_OPTS')
 
         common.info("Starting {} with JAVA_HOME={} java_version={} cassandra_version={}, install_dir={}"
                     .format(self.name, env['JAVA_HOME'], common.get_jdk_version_int(env=env),
@@ -941,7 +1105,9 @@ class Node(object):
         else:
             process = subprocess.Popen(args, env=env, stdout=stdout_sink, stderr=stderr_sink)
 
+        timeline.record(SPAWNED)
         process.stderr_file = stderr_sink
+        process.timeline = self.start_timeline = timeline
 
         if verbose:
             common.debug("verbose mode: waiting for the start process out/err (and termination)")
@@ -960,50 +1126,52 @@ class Node(object):
             # at this moment we should have PID and it should be running...
             if not self._wait_for_running(process, timeout_s=7):
                 raise NodeError("Node {n} is not running".format(n=self.name), process)
+            timeline.record(PID_VISIBLE)
 
         # if requested wait for other nodes to observe this one (via gossip)
         if common.is_int_not_bool(wait_other_notice):
-            for node, mark in marks:
-                node.watch_log_for_alive(self, from_mark=mark, timeout=wait_other_notice)
+            watch_logs_for_alive([(node, self, mark) for node, mark in marks], timeout=wait_other_notice)
         elif wait_other_notice:
-            for node, mark in marks:
-                node.watch_log_for_alive(self, from_mark=mark)
+            watch_logs_for_alive([(node, self, mark) for node, mark in marks])
 
         # if requested wait for binary protocol to start
         if common.is_int_not_bool(wait_for_binary_proto):
             self.wait_for_binary_interface(from_mark=self.mark, timeout=wait_for_binary_proto)
+            timeline.record(BINARY_READY)
         elif wait_for_binary_proto:
             self.wait_for_binary_interface(from_mark=self.mark)
+            timeline.record(BINARY_READY)
 
+        self.save_startup_timeline()
         return process
 
+    def save_startup_timeline(self):
+        """
+        Completes the StartupTimeline of the last start of the node with the
+        milestones logged since (if any), writes it as JSON to
+        startup-timeline.json in the node directory and returns it.
+        """
+        timeline = self.start_timeline
+        if timeline is not None:
+            timeline.read_log().save(os.path.join(self.get_path(), TIMELINE_FILE))
+        return timeline
+
     def _wait_for_running(self, process, timeout_s):
         deadline = time.time() + timeout_s
+        pid_read = False
         while time.time() < deadline:
             if self.is_running():
                 return True
-            time.sleep(0.5)
+            if pid_read and not self._is_pid_running():
+                # the process wrote its pid and exited already; a pid known
+                # before reading the pid file may be the one of a previous run
+                return False
             self._update_pid(process)
+            pid_read = True
         return self.is_running()
 
-    def __unix_kill_process_matching(self, pattern, sig=signal.SIGTERM):
-        matcher = re.compile(pattern)
-        for proc in psutil.process_iter(['pid', 'cmdline']):
-            try:
-                pid = proc.info['pid']
-                cmdline = " ".join(proc.info['cmdline']) if proc.info['cmdline'] else ""
-                if matcher.search(cmdline):
-                    try:
-                        os.kill(int(pid), sig)
-                    except ProcessLookupError:
-                        logger.info("Process %d not found" % pid)
-                    except PermissionError:
-                        logger.info("Did not have permissions to kill %d" % pid)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-
     def __unix_kill(self, sig):
-        self.__unix_kill_process_matching(".*{}.*{}.*".format(self.__log_dir(), "org.apache.cassandra.service.CassandraDaemon"), sig)
+        procwatch.kill_processes([self.log_directory()], sig)
 
     def stop(self, wait=True, wait_other_notice=False, signal_event=signal.SIGTERM, **kwargs):
         """
@@ -1017,6 +1185,9 @@ class Node(object):
           - Optional:
              + gently: Let Cassandra clean up and shut down properly; unless
                        false perform a 'kill -9' which shuts down faster.
+             + kill_strays: unless false, kill the Cassandra processes of the
+                       node if it is not running (e.g. its pid was lost);
+                       Cluster.stop() does it for all nodes at once.
         """
         if self.is_running():
             if wait_other_notice:
@@ -1050,28 +1221,19 @@ class Node(object):
                 os.kill(self.pid, signal_event)
 
             if wait_other_notice:
-                for node, mark in marks:
-                    node.watch_log_for_death(self, from_mark=mark)
-            else:
-                time.sleep(.1)
-
-            still_running = self.is_running()
-            if still_running and wait:
-                wait_time_sec = 1
-                for i in xrange(0, 7):
-                    # we'll double the wait time each try and cassandra should
-                    # not take more than 1 minute to shutdown
-                    time.sleep(wait_time_sec)
-                    if not self.is_running():
-                        return True
-                    wait_time_sec = wait_time_sec * 2
-                raise NodeError("Problem stopping node %s" % self.name)
-            else:
-                return True
+                watch_logs_for_death([(node, self, mark) for node, mark in marks])
+
+            if wait and self.is_running():
+                # returns as soon as the process exits
+                with self._exit_watcher() as watcher:
+                    watcher.wait(NODE_STOP_TIMEOUT_IN_SECS)
+                if self.is_running():
+                    raise NodeError("Problem stopping node %s" % self.name)
+            return True
         else:
             # Make sure it is actually stopped even if the PID wasn't found for some reason
             # Always kill because it should already be stopped and we aren't waiting for it to stop
-            if not common.is_win():
+            if not common.is_win() and kwargs.get('kill_strays', True):
                 self.__unix_kill(signal.SIGKILL)
             return False
 
@@ -1091,7 +1253,7 @@ class Node(object):
                                   node=self.name)
 
     def nodetool_process(self, cmd):
-        env = self.get_env()
+        env = self.get_tool_env('nodetool')
         nodetool = self.get_tool('nodetool')
         args = [nodetool, '-h', 'localhost', '-p', str(self.jmx_port)]
         args += shlex.split(cmd)
@@ -1102,6 +1264,29 @@ class Node(object):
         p = self.nodetool_process(cmd)
         return handle_external_tool_process(p, ['nodetool', '-h', 'localhost', '-p', str(self.jmx_port)] + shlex.split(cmd))
 
+    # asyncio counterparts of the blocking methods above; each returns a
+    # coroutine taking the same arguments (python 3.5+, see ccmlib.aio)
+
+    def astart(self, **kwargs):
+        from ccmlib import aio
+        return aio.start(self, **kwargs)
+
+    def astop(self, **kwargs):
+        from ccmlib import aio
+        return aio.stop(self, **kwargs)
+
+    def awatch_log_for(self, exprs, **kwargs):
+        from ccmlib import aio
+        return aio.watch_log_for(self, exprs, **kwargs)
+
+    def await_binary_interface(self, **kwargs):
+        from ccmlib import aio
+        return aio.wait_for_binary_interface(self, **kwargs)
+
+    def anodetool(self, cmd):
+        from ccmlib import aio
+        return aio.nodetool(self, cmd)
+
     def dsetool(self, cmd):
         raise common.ArgumentError('Cassandra nodes do not support dsetool')
 
@@ -1122,7 +1307,7 @@ class Node(object):
 
     def bulkload_process(self, options):
         loader_bin = common.join_bin(self.get_path(), 'bin', 'sstableloader')
-        env = self.get_env()
+        env = self.get_tool_env('sstableloader')
         extension.append_to_client_env(self, env)
         # CASSANDRA-8358 switched from thrift to binary port
         host, port = self.network_interfaces['thrift'] if self.get_cassandra_version() < '2.2' else self.network_interfaces['binary']
@@ -1135,7 +1320,7 @@ class Node(object):
 
     def scrub_process(self, options):
         scrub_bin = self.get_tool('sstablescrub')
-        env = self.get_env()
+        env = self.get_tool_env('sstablescrub')
         return subprocess.Popen([scrub_bin] + options, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
 
     def scrub(self, options):
@@ -1144,7 +1329,7 @@ class Node(object):
 
     def verify_process(self, options):
         verify_bin = self.get_tool('sstableverify')
-        env = self.get_env()
+        env = self.get_tool_env('sstableverify')
         return subprocess.Popen([verify_bin] + options, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
 
     def verify(self, options):
@@ -1267,7 +1452,7 @@ class Node(object):
         if out_file is None:
             out_file = sys.stdout
         sstable2json = self._find_cmd('sstable2json')
-        env = self.get_env()
+        env = self.get_tool_env('sstable2json')
         sstablefiles = self.__gather_sstables(datafiles, keyspace, column_families)
         print_(sstablefiles)
         for sstablefile in sstablefiles:
@@ -1283,7 +1468,7 @@ class Node(object):
 
     def run_json2sstable(self, in_file, ks, cf, keyspace=None, datafiles=None, column_families=None, enumerate_keys=False):
         json2sstable = self._find_cmd('json2sstable')
-        env = self.get_env()
+        env = self.get_tool_env('json2sstable')
         sstablefiles = self.__gather_sstables(datafiles, keyspace, column_families)
 
         for sstablefile in sstablefiles:
@@ -1294,7 +1479,7 @@ class Node(object):
     def run_sstablesplit_process(self, datafiles=None, size=None, keyspace=None, column_families=None,
                                  no_snapshot=False, debug=False):
         sstablesplit = self._find_cmd('sstablesplit')
-        env = self.get_env()
+        env = self.get_tool_env('sstablesplit')
         sstablefiles = self.__gather_sstables(datafiles, keyspace, column_families)
 
         processes = []
@@ -1331,7 +1516,7 @@ class Node(object):
     def run_sstablemetadata_process(self, datafiles=None, keyspace=None, column_families=None):
         cdir = self.get_install_dir()
         sstablemetadata = common.join_bin(cdir, os.path.join('tools', 'bin'), 'sstablemetadata')
-        env = self.get_env()
+        env = self.get_tool_env('sstablemetadata')
         sstablefiles = self.__gather_sstables(datafiles=datafiles, keyspace=keyspace, columnfamilies=column_families)
 
         cmd = [sstablemetadata]
@@ -1346,7 +1531,7 @@ class Node(object):
     def run_sstabledump_process(self, datafiles=None, keyspace=None, column_families=None, keys=None, enumerate_keys=False, command=False):
         sstabledump = self._find_cmd('sstabledump')
 
-        env = self.get_env()
+        env = self.get_tool_env('sstabledump')
         sstablefiles = self.__gather_sstables(datafiles=datafiles, keyspace=keyspace, columnfamilies=column_families)
         processes = []
 
@@ -1384,7 +1569,7 @@ class Node(object):
     def run_sstableexpiredblockers_process(self, keyspace=None, column_family=None):
         cdir = self.get_install_dir()
         sstableexpiredblockers = common.join_bin(cdir, os.path.join('tools', 'bin'), 'sstableexpiredblockers')
-        env = self.get_env()
+        env = self.get_tool_env('sstableexpiredblockers')
         cmd = [sstableexpiredblockers, keyspace, column_family]
         return subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
 
@@ -1398,7 +1583,7 @@ class Node(object):
     def run_sstableupgrade_process(self, keyspace=None, column_family=None):
         cdir = self.get_install_dir()
         sstableupgrade = self.get_tool('sstableupgrade')
-        env = self.get_env()
+        env = self.get_tool_env('sstableupgrade')
         cmd = [sstableupgrade, keyspace, column_family]
         p = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
         return p
@@ -1417,7 +1602,7 @@ class Node(object):
     def run_sstablerepairedset_process(self, set_repaired=True, datafiles=None, keyspace=None, column_families=None):
         cdir = self.get_install_dir()
         sstablerepairedset = common.join_bin(cdir, os.path.join('tools', 'bin'), 'sstablerepairedset')
-        env = self.get_env()
+        env = self.get_tool_env('sstablerepairedset')
         sstablefiles = self.__gather_sstables(datafiles, keyspace, column_families)
         processes = []
 
@@ -1441,7 +1626,7 @@ class Node(object):
     def run_sstablelevelreset_process(self, keyspace, cf):
         cdir = self.get_install_dir()
         sstablelevelreset = common.join_bin(cdir, os.path.join('tools', 'bin'), 'sstablelevelreset')
-        env = self.get_env()
+        env = self.get_tool_env('sstablelevelreset')
 
         cmd = [sstablelevelreset, "--really-reset", keyspace, cf]
 
@@ -1454,7 +1639,7 @@ class Node(object):
     def run_sstableofflinerelevel_process(self, keyspace, cf, dry_run=False):
         cdir = self.get_install_dir()
         sstableofflinerelevel = common.join_bin(cdir, os.path.join('tools', 'bin'), 'sstableofflinerelevel')
-        env = self.get_env()
+        env = self.get_tool_env('sstableofflinerelevel')
 
         if dry_run:
             cmd = [sstableofflinerelevel, "--dry-run", keyspace, cf]
@@ -1470,7 +1655,7 @@ class Node(object):
     def run_sstableverify_process(self, keyspace, cf, options=None):
         cdir = self.get_install_dir()
         sstableverify = common.join_bin(cdir, 'bin', 'sstableverify')
-        env = self.get_env()
+        env = self.get_tool_env('sstableverify')
 
         cmd = [sstableverify, keyspace, cf]
         if options is not None:
@@ -2039,26 +2224,15 @@ class Node(object):
             return self._find_pid_on_unix()
 
     def _find_pid_on_unix(self):
-        try:
-            os.kill(self.pid, 0)
-            proc = psutil.Process(self.pid)
-            if proc.status() == psutil.STATUS_ZOMBIE:
-                time.sleep(2)
-                raise OSError(errno.ESRCH, "process was zombie, ignoring")
-        except OSError as err:
-            if err.errno == errno.ESRCH:
-                # not running
-                return False
-            elif err.errno == errno.EPERM:
-                # no permission to signal this process
-                return False
-            else:
-                # some other error
-                raise
-        except psutil.NoSuchProcess as err:
-            return False
-        else:
-            return True
+        # zombies count as terminated, without waiting for them to be reaped
+        return procwatch.is_alive(self.pid)
+
+    def _exit_watcher(self, process=None):
+        """
+        Returns a procwatch.ExitWatcher of the Cassandra process (that never
+        fires if its pid is not known).
+        """
+        return procwatch.ExitWatcher(self.pid, process, alive=lambda pid: self._is_pid_running())
 
     def __update_status(self):
         if self.pid is None:
@@ -2181,13 +2355,15 @@ class Node(object):
         pidfile = os.path.join(self.get_path(), 'cassandra.pid')
 
         start = time.time()
-        while not (os.path.isfile(pidfile) and os.stat(pidfile).st_size > 0):
-            if time.time() - start > DEFAULT_UPDATE_PID_TIMEOUT_IN_SECS:
-                common.error("Timed out waiting for pidfile to be filled (timeout is {}, current time is {}, file exists {})"
-                             .format(DEFAULT_UPDATE_PID_TIMEOUT_IN_SECS, datetime.now(), os.path.isfile(pidfile)))
-                break
-            else:
-                time.sleep(0.1)
+        with logtail.file_change_waiter([pidfile]) as pidfile_changed:
+            while not (os.path.isfile(pidfile) and os.stat(pidfile).st_size > 0):
+                if time.time() - start > DEFAULT_UPDATE_PID_TIMEOUT_IN_SECS:
+                    common.error("Timed out waiting for pidfile to be filled (timeout is {}, current time is {}, file exists {})"
+                                 .format(DEFAULT_UPDATE_PID_TIMEOUT_IN_SECS, datetime.now(), os.path.isfile(pidfile)))
+                    break
+                else:
+                    # returns as soon as the pid is written when inotify is available
+                    pidfile_changed.wait(0.1)
 
         try:
             with open(pidfile, 'rb') as f:
@@ -2317,7 +2493,7 @@ class Node(object):
         return [os.path.join(self.get_path(), 'data{0}'.format(x)) for x in xrange(0, self.cluster.data_dir_count)]
 
     def get_sstable_data_files_process(self, ks, table):
-        env = self.get_env()
+        env = self.get_tool_env('sstableutil')
         args = [self.get_tool('sstableutil'), '--type', 'final', ks, table]
 
         p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -2370,41 +2546,191 @@ def _get_load_from_info_output(info):
     return float(load_num) * load_mult
 
 
+# error blocks are read in fixed-size chunks; longer lines are truncated and
+# stack traces longer than this many lines are cut so that memory stays bounded
+_ERROR_SCAN_CHUNK_SIZE = 64 * 1024
+_ERROR_BLOCK_MAX_LINES = 1000
+
+_except_re = re.compile(r'[Ee]xception|AssertionError')
+_log_cat_re = re.compile(r'(\W|^)(INFO|DEBUG|WARN|ERROR)\W')
+
+
+def _log_line_category(line):
+    match = _log_cat_re.search(line)
+    return match.group(2) if match else None
+
+
+def _iter_bounded_lines(f, start=0):
+    """
+    Yields (offset, line) for the lines of the binary file f starting at byte
+    offset start, without their line terminator. Lines are read at most
+    _ERROR_SCAN_CHUNK_SIZE bytes at a time and only their first chunk is kept.
+    """
+    f.seek(start)
+    offset = start
+    while True:
+        raw = f.readline(_ERROR_SCAN_CHUNK_SIZE)
+        if not raw:
+            return
+        length = len(raw)
+        while not raw.endswith(b'\n'):
+            rest = f.readline(_ERROR_SCAN_CHUNK_SIZE)
+            if not rest:
+                break
+            length += len(rest)
+            if rest.endswith(b'\n'):
+                raw = raw + b'\n'
+        yield offset, logindex.decode_line(raw).rstrip('\r\n'), length
+        offset += length
+
+
+class _ErrorBlockAssembler(object):
+    """
+    Groups each ERROR line, or WARN line mentioning an exception, with the
+    unidentified lines following it (a stack trace most likely). Lines are
+    given one by one with their byte offset and length.
+    """
+
+    def __init__(self):
+        self.block = None
+
+    def add(self, offset, line, length):
+        """
+        Returns the (error lines, start offset, end offset) of the error block
+        this line closes, if any.
+        """
+        category = _log_line_category(line)
+        if self.block is not None and category is None:
+            # if a log line can't be identified, assume continuation of an ERROR/WARN exception
+            if len(self.block[0]) < _ERROR_BLOCK_MAX_LINES:
+                self.block[0].append(line)
+            self.block[2] = offset + length
+            return None
+        closed = self.flush()
+        if category == 'ERROR' or (category == 'WARN' and _except_re.search(line) is not None):
+            self.block = [[line], offset, offset + length]
+        return closed
+
+    def flush(self):
+        """
+        Returns the error block being built, if any, as complete.
+        """
+        closed, self.block = self.block, None
+        return tuple(closed) if closed is not None else None
+
+
+def _iter_log_errors(f, start=0):
+    """
+    Yields (error_block, start_offset, end_offset) for each ERROR line, or WARN
+    line mentioning an exception, found in the binary file f after byte offset
+    start. error_block is the list of the lines of the error and of the
+    unidentified lines following it (a stack trace most likely), and the
+    offsets delimit those lines in the file.
+    """
+    assembler = _ErrorBlockAssembler()
+    for offset, line, length in _iter_bounded_lines(f, start):
+        error = assembler.add(offset, line, length)
+        if error is not None:
+            yield error
+    error = assembler.flush()
+    if error is not None:
+        yield error
+
+
 def _grep_log_for_errors(log):
-    except_re = re.compile(r'[Ee]xception|AssertionError')
-    log_cat_re = re.compile(r'(\W|^)(INFO|DEBUG|WARN|ERROR)\W')
-
-    def log_line_category(line):
-        match = log_cat_re.search(line)
-        return match.group(2) if match else None
-
-    matches = []
-
-    loglines = log.splitlines()
-
-    for line_num, line in enumerate(loglines):
-        found_exception = False
-        line_category = log_line_category(line)
-        if line_category == 'ERROR':
-            matches.append([line])
-            found_exception = True
-
-        elif line_category == 'WARN':
-            match = except_re.search(line)
-            if match is not None:
-                matches.append([line])
-                found_exception = True
-
-        if found_exception:
-            for next_line_num in range(line_num + 1, len(loglines)):
-                next_line = loglines[next_line_num]
-                # if a log line can't be identified, assume continuation of an ERROR/WARN exception
-                if log_line_category(next_line) is None:
-                    matches[-1].append(next_line)
-                else:
-                    break
+    return [block for block, _, _ in _iter_log_errors(io.BytesIO(log.encode('utf-8')))]
 
-    return matches
+
+def watch_logs_for(expectations, timeout=600, filename='system.log', check=None, wake_fds=()):
+    """
+    Watch the logs of several nodes at once until each of them contains its
+    expected (regular) expressions, or timeouts (a TimeoutError listing what is
+    missing is then raised). All the logs are followed together in the calling
+    thread, so the whole set of expectations costs a single wait.
+      - expectations: a list of (node, exprs, from_mark) tuples, where from_mark is
+        a mark as returned by node.mark_log() or None to watch from the beginning
+      - check: if given, called at least once per second while waiting; it may
+        raise to abort the wait (e.g. when a node died)
+      - wake_fds: file descriptors (e.g. of procwatch.ExitWatchers) that call
+        check as soon as they are readable
+    On successful completion, returns the list of the (line matched, match object)
+    pairs found for each expectation, in the order of expectations.
+    """
+    start = time.time()
+    watcher = logtail.MultiLogWatcher()
+    found = [watcher.expect(os.path.join(node.log_directory(), filename), exprs, from_mark=mark, name=node.name)
+             for node, exprs, mark in expectations]
+    if not watcher.wait(timeout, check=check, wake_fds=wake_fds):
+        missing = ["{}: {}".format(e.name, [p.pattern for p in e.pending]) for e in watcher.pending()]
+        raise TimeoutError.create(start=start, timeout=timeout,
+                                  msg="Missing in {f}:\n {missing}".format(f=filename, missing="\n ".join(missing)))
+    return [e.matchings for e in found]
+
+
+def watch_logs_for_alive(expectations, timeout=None, filename='system.log'):
+    """
+    Multi-node counterpart of Node.watch_log_for_alive: waits, in a single pass,
+    until the log of each node shows that the corresponding other nodes are UP.
+      - expectations: a list of (node, other nodes, from_mark) tuples
+    Without an explicit timeout, the longest watch_log_for_alive_timeout of the
+    watching nodes is used.
+    """
+    expectations = _gossip_expectations(expectations)
+    if not expectations:
+        return
+    if timeout is None:
+        timeout = max(node.watch_log_for_alive_timeout for node, _, _ in expectations)
+    _watch_logs_for_gossip(expectations, gossip.UP, timeout, filename)
+
+
+def watch_logs_for_death(expectations, timeout=600, filename='system.log'):
+    """
+    Multi-node counterpart of Node.watch_log_for_death: waits, in a single pass,
+    until the log of each node shows that the corresponding other nodes are dead.
+      - expectations: a list of (node, other nodes, from_mark) tuples
+    """
+    expectations = _gossip_expectations(expectations)
+    if not expectations:
+        return
+    _watch_logs_for_gossip(expectations, gossip.DOWN, timeout, filename)
+
+
+def _gossip_expectations(expectations):
+    expectations = [(node, others if isinstance(others, list) else [others], mark) for node, others, mark in expectations]
+    return [(node, others, mark) for node, others, mark in expectations if others]
+
+
+def _gossip_tracker_for(expectations, filename):
+    # the tracker follows the system.log of the nodes of a single cluster
+    cluster = getattr(expectations[0][0], 'cluster', None)
+    if filename != 'system.log' or cluster is None or not hasattr(cluster, 'gossip_tracker'):
+        return None
+    for node, _, _ in expectations:
+        if getattr(node, 'cluster', None) is not cluster or cluster.nodes.get(node.name) is not node:
+            return None
+    return cluster.gossip_tracker()
+
+
+def _current_marks(expectations, filename):
+    # the tracker only knows offsets in the current files
+    return [(node, others, logarchive.current_offset(os.path.join(node.log_directory(), filename), mark))
+            for node, others, mark in expectations]
+
+
+def _watch_logs_for_gossip(expectations, state, timeout, filename):
+    tracker = _gossip_tracker_for(expectations, filename)
+    if tracker is None:
+        to_exprs = Node._alive_exprs if state == gossip.UP else Node._death_exprs
+        watch_logs_for([(node, to_exprs(node, others), mark) for node, others, mark in expectations],
+                       timeout=timeout, filename=filename)
+        return
+    start = time.time()
+    missing = tracker.wait_for(_current_marks(expectations, filename), state, timeout)
+    if missing:
+        missing = ["{}: {}".format(node.name, [other.name for other in others]) for node, others in missing]
+        raise TimeoutError.create(start=start, timeout=timeout,
+                                  msg="Nodes not seen {state} in {f}:\n {missing}".format(
+                                      state=state, f=filename, missing="\n ".join(missing)))
 
 
 def handle_external_tool_process(process, cmd_args):
@@ -0,0 +1,286 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# process exit detection
+#
+# On Linux 5.3+, a pidfd (pidfd_open(2)) of a process becomes readable when
+# the process exits, so waiting for a node to die is a select() that returns
+# as soon as it does, and pidfds can be waited for along with the inotify
+# descriptor of log watchers. Children of ours are reaped once they exited.
+# Elsewhere we fall back to polling for the process with a short interval.
+#
+# Cassandra processes are told apart by their -Dcassandra.logdir argument,
+# which is the logs directory of their node. The process table is scanned
+# once to find the processes of any number of nodes.
+#
+
+from __future__ import absolute_import
+
+import errno
+import logging
+import os
+import select
+import sys
+import time
+from collections import namedtuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# interval between two checks when processes cannot be waited for
+POLL_INTERVAL = 0.1
+
+CASSANDRA_MAIN_CLASS = 'org.apache.cassandra.service.CassandraDaemon'
+_LOGDIR_ARG = '-Dcassandra.logdir='
+
+CassandraProcess = namedtuple('CassandraProcess', ['pid', 'logdir'])
+CassandraProcess.__doc__ = """
+A Cassandra JVM of the host: logdir is the (normalized) value of its
+-Dcassandra.logdir argument, the logs directory of its node.
+"""
+
+_SYS_PIDFD_OPEN = 434
+
+PIDFD_IS_AVAILABLE = False
+_pidfd_open = None
+if sys.platform.startswith('linux') and not os.environ.get('CCM_DISABLE_PIDFD'):
+    if hasattr(os, 'pidfd_open'):
+        _pidfd_open = os.pidfd_open
+        PIDFD_IS_AVAILABLE = True
+    else:
+        # python < 3.9, the system call is the same on every architecture
+        try:
+            import ctypes
+            import ctypes.util
+            _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            _libc.syscall.restype = ctypes.c_long
+
+            def _pidfd_open(pid, flags=0):
+                fd = _libc.syscall(_SYS_PIDFD_OPEN, ctypes.c_int(pid), ctypes.c_uint(flags))
+                if fd < 0:
+                    err = ctypes.get_errno()
+                    raise OSError(err, os.strerror(err))
+                return fd
+            PIDFD_IS_AVAILABLE = True
+        except (ImportError, OSError, AttributeError):
+            _pidfd_open = None
+
+
+def is_alive(pid):
+    """
+    Returns True if the process pid exists and is not a zombie. Processes we
+    have no permission to signal are considered dead, as they cannot be one
+    of our nodes.
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        if err.errno in (errno.ESRCH, errno.EPERM):
+            return False
+        raise
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+class ExitWatcher(object):
+    """
+    Waits for the process pid to exit: on a pidfd when possible, by polling
+    alive(pid) (by default is_alive()) otherwise. If given, process is the
+    subprocess.Popen of pid, which is then reaped as soon as it exits. A
+    watcher of pid None never sees anything exit.
+
+    Watchers hold a file descriptor: close them, or use them as context
+    managers.
+    """
+
+    def __init__(self, pid, process=None, alive=is_alive):
+        self.pid = pid
+        self.process = process if process is not None and process.pid == pid else None
+        self._alive = alive
+        self._fd = None
+        if pid is not None and PIDFD_IS_AVAILABLE:
+            try:
+                self._fd = _pidfd_open(pid)
+            except OSError as e:
+                # ESRCH: already gone; ENOSYS: kernel older than 5.3
+                logger.debug("Cannot open a pidfd for {} ({}), falling back to polling".format(pid, e))
+
+    def fileno(self):
+        """
+        Returns a file descriptor that becomes readable when the process
+        exits, or None if its exit cannot be waited for that way.
+        """
+        return self._fd
+
+    def has_exited(self):
+        """
+        Returns True if the process exited, without blocking.
+        """
+        if self.pid is None:
+            return False
+        if self.process is not None:
+            return self.process.poll() is not None
+        if self._fd is not None:
+            return _readable([self._fd], 0) != []
+        return not self._alive(self.pid)
+
+    def wait(self, timeout):
+        """
+        Blocks until the process exits (returns True) or timeout seconds have
+        passed (returns False).
+        """
+        deadline = time.time() + timeout
+        while True:
+            if self.has_exited():
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            if self._fd is not None:
+                _readable([self._fd], remaining)
+            else:
+                time.sleep(min(POLL_INTERVAL, remaining))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _readable(fds, timeout):
+    if not fds:
+        time.sleep(timeout)
+        return []
+    while True:
+        try:
+            return select.select(fds, [], [], timeout)[0]
+        except (OSError, select.error) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+
+def exit_fds(watchers):
+    """
+    Returns the file descriptors of the ExitWatchers that have one, to be
+    waited for along with other descriptors.
+    """
+    return [watcher.fileno() for watcher in watchers if watcher.fileno() is not None]
+
+
+def wait_for_any_exit(watchers, timeout):
+    """
+    Blocks until one of the processes of watchers exits or timeout seconds
+    have passed. Returns the watchers of the processes that exited.
+    """
+    deadline = time.time() + timeout
+    while True:
+        exited = [watcher for watcher in watchers if watcher.has_exited()]
+        remaining = deadline - time.time()
+        if exited or remaining <= 0:
+            return exited
+        if len(exit_fds(watchers)) < len(watchers):
+            # some processes can only be polled
+            remaining = min(POLL_INTERVAL, remaining)
+        _readable(exit_fds(watchers), remaining)
+
+
+def wait_for_exit(pid, timeout, process=None, alive=is_alive):
+    """
+    Blocks until the process pid exits (returns True) or timeout seconds
+    have passed (returns False). See ExitWatcher for process and alive.
+    """
+    with ExitWatcher(pid, process, alive) as watcher:
+        return watcher.wait(timeout)
+
+
+def cassandra_processes():
+    """
+    Returns the CassandraProcess of each Cassandra JVM of the host, found in a
+    single pass over the process table.
+    """
+    found = []
+    for proc in psutil.process_iter(['pid', 'cmdline']):
+        try:
+            cmdline = proc.info['cmdline'] or ()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+        logdir = None
+        for arg in cmdline:
+            if arg.startswith(_LOGDIR_ARG):
+                logdir = arg[len(_LOGDIR_ARG):]
+        if logdir is not None and CASSANDRA_MAIN_CLASS in cmdline:
+            found.append(CassandraProcess(proc.info['pid'], os.path.normpath(logdir)))
+    return found
+
+
+def kill_processes(logdirs, sig, processes=None):
+    """
+    Sends sig to the Cassandra processes of the nodes whose logs directories
+    are logdirs. processes, the result of cassandra_processes(), is scanned
+    for if not given. Returns the CassandraProcesses signaled.
+    """
+    logdirs = set(os.path.normpath(logdir) for logdir in logdirs)
+    if processes is None:
+        processes = cassandra_processes() if logdirs else []
+    killed = []
+    for process in processes:
+        if process.logdir not in logdirs:
+            continue
+        try:
+            os.kill(process.pid, sig)
+            killed.append(process)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                logger.info("Process %d not found" % process.pid)
+            elif e.errno == errno.EPERM:
+                logger.info("Did not have permissions to kill %d" % process.pid)
+            else:
+                raise
+    return killed
+
+
+def orphaned_processes(path, processes=None):
+    """
+    Returns the CassandraProcesses of the nodes of clusters of the ccm
+    directory path (e.g. ~/.ccm) that no longer exist: the cluster was
+    removed, or the node was removed from its cluster. processes, the result
+    of cassandra_processes(), is scanned for if not given.
+    """
+    path = os.path.normpath(os.path.abspath(path))
+    orphans = []
+    for process in cassandra_processes() if processes is None else processes:
+        try:
+            parts = os.path.relpath(process.logdir, path).split(os.sep)
+        except ValueError:
+            # on another drive
+            continue
+        # path/<cluster>/<node>/logs
+        if len(parts) != 3 or parts[0] == os.pardir or parts[2] != 'logs':
+            continue
+        if not os.path.exists(os.path.join(path, parts[0], 'cluster.conf')) or \
+                not os.path.isdir(os.path.join(path, parts[0], parts[1])):
+            orphans.append(process)
+    return orphans
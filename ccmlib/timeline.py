@@ -0,0 +1,130 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# node startup timeline
+#
+# A StartupTimeline records when each phase of the start of a node was
+# reached, on the monotonic clock: what ccm observes itself (the launch, the
+# pid file, the binary interface answering) when it happens, and the
+# milestones of the startup sequence from the timestamps of their log lines.
+# Node.start() saves it as JSON in the node directory, so that the startup
+# times of Cassandra versions can be compared.
+#
+
+from __future__ import absolute_import
+
+import json
+import re
+import time
+from collections import OrderedDict
+
+from ccmlib.logarchive import RotatingLogReader
+from ccmlib.logrecords import parse_header
+
+TIMELINE_FILE = 'startup-timeline.json'
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# phases observed by ccm
+SPAWNED = 'spawned'
+PID_VISIBLE = 'pid_visible'
+FIRST_LOG_LINE = 'first_log_line'
+BINARY_READY = 'binary_ready'
+
+# phases found in the log, with the message of their first line
+LOG_MILESTONES = OrderedDict([
+    ('gossip_started', re.compile(r'Starting up server gossip')),
+    ('commitlog_replayed', re.compile(r'Log replay complete|No commitlog files found')),
+    ('joining_ring', re.compile(r'JOINING: ')),
+    ('normal', re.compile(r'state jump to NORMAL', re.IGNORECASE)),
+    ('cql_listening', re.compile(r'Starting listening for CQL clients')),
+])
+
+
+class StartupTimeline(object):
+    """
+    The phases of a start of node, reached as recorded by record() or found
+    in its log after from_mark by read_log(). phases maps the name of each
+    phase to its time.monotonic() timestamp.
+    """
+
+    def __init__(self, node, log_file, from_mark=None, cassandra_version=None):
+        self.node = node
+        self.log_file = log_file
+        self.from_mark = from_mark
+        self.cassandra_version = str(cassandra_version) if cassandra_version is not None else None
+        self.started_at = time.time()
+        # converts times since the epoch to monotonic ones
+        self._offset = _monotonic() - self.started_at
+        self.phases = OrderedDict()
+
+    def record(self, phase, when=None):
+        """
+        Records that phase was reached now, or at when (seconds since the
+        epoch), unless it already was.
+        """
+        if phase not in self.phases:
+            self.phases[phase] = _monotonic() if when is None else when + self._offset
+
+    def read_log(self):
+        """
+        Records the milestones found in the log since the start. Returns self.
+        """
+        pending = [name for name in LOG_MILESTONES if name not in self.phases]
+        if not pending and FIRST_LOG_LINE in self.phases:
+            return self
+        with RotatingLogReader(self.log_file, self.from_mark) as reader:
+            while pending or FIRST_LOG_LINE not in self.phases:
+                next_line = reader.readline()
+                if next_line is None:
+                    break
+                header = parse_header(next_line[1])
+                if header is None:
+                    continue
+                timestamp, message = header[2], header[5]
+                self.record(FIRST_LOG_LINE, timestamp)
+                for name in list(pending):
+                    if LOG_MILESTONES[name].search(message):
+                        self.record(name, timestamp)
+                        pending.remove(name)
+        return self
+
+    def elapsed(self, phase):
+        """
+        Returns the seconds from the launch of the node to phase, or None if
+        either was not reached.
+        """
+        if phase not in self.phases or SPAWNED not in self.phases:
+            return None
+        return self.phases[phase] - self.phases[SPAWNED]
+
+    def as_dict(self):
+        """
+        Returns the timeline as a dict ready to be dumped as JSON, its phases
+        in chronological order.
+        """
+        return OrderedDict([
+            ('node', self.node),
+            ('cassandra_version', self.cassandra_version),
+            ('started_at', self.started_at),
+            ('phases', [OrderedDict([('phase', phase), ('monotonic', when), ('elapsed', self.elapsed(phase))])
+                        for phase, when in sorted(self.phases.items(), key=lambda item: item[1])]),
+        ])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
@@ -0,0 +1,86 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import asyncio
+import os
+import tempfile
+import time
+
+from mock import patch
+
+from ccmlib.node import Node, TimeoutError, ToolError
+from . import ccmtest
+
+
+def _node(name, path):
+    node = Node.__new__(Node)
+    node.name = name
+    node.jmx_port = '7100'
+    node.get_path = lambda: path
+    return node
+
+
+class TestAsyncNode(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.nodes = []
+        for i in range(1, 4):
+            path = os.path.join(self.temp_dir.name, 'node{}'.format(i))
+            os.makedirs(os.path.join(path, 'logs'))
+            self.nodes.append(_node('node{}'.format(i), path))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def log(self, node, text):
+        with open(os.path.join(node.log_directory(), 'system.log'), 'a') as f:
+            f.write(text)
+
+    def test_watches_overlap_in_one_loop(self):
+        async def write_later():
+            await asyncio.sleep(0.2)
+            for node in self.nodes:
+                self.log(node, 'INFO Starting listening for CQL clients on /{}\n'.format(node.name))
+
+        async def watch_all():
+            results = await asyncio.gather(*([node.awatch_log_for('Starting listening for CQL clients on /(\\w+)', timeout=10)
+                                              for node in self.nodes] + [write_later()]))
+            return results[:-1]
+
+        start = time.time()
+        results = asyncio.run(watch_all())
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual([m.group(1) for _, m in results], ['node1', 'node2', 'node3'])
+
+    def test_watch_respects_mark_and_times_out(self):
+        node = self.nodes[0]
+        self.log(node, 'INFO old line\n')
+        with self.assertRaises(TimeoutError) as cm:
+            asyncio.run(node.awatch_log_for('old line', from_mark=node.mark_log(), timeout=1))
+        self.assertEqual(cm.exception.stats['lines_read'], 0)
+
+    def test_nodetool(self):
+        node = self.nodes[0]
+        with patch.object(Node, 'get_tool', return_value='echo'), patch.object(Node, 'get_env', return_value=dict(os.environ)):
+            out, err, rc = asyncio.run(node.anodetool('status'))
+        self.assertEqual(out, '-h localhost -p 7100 status\n')
+        self.assertEqual(rc, 0)
+
+        with patch.object(Node, 'get_tool', return_value='false'), patch.object(Node, 'get_env', return_value=dict(os.environ)):
+            with self.assertRaises(ToolError):
+                asyncio.run(node.anodetool('status'))
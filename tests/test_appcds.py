@@ -0,0 +1,107 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+
+from mock import patch
+
+from ccmlib import appcds
+from . import ccmtest
+
+
+class TestAppCDS(ccmtest.Tester):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.install_dir = os.path.join(self.dir, 'cassandra')
+        os.makedirs(os.path.join(self.install_dir, 'lib'))
+        self._touch(os.path.join(self.install_dir, 'lib', 'guava.jar'))
+        self.java_home = os.path.join(self.dir, 'jdk')
+        self.env = {'JAVA_HOME': self.java_home}
+        appcds._jdk_versions[self.java_home] = 17
+        self.environ = patch.dict(os.environ, {appcds.APPCDS_ENV: '1',
+                                               'CCM_CONFIG_DIR': os.path.join(self.dir, 'ccm')})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        appcds._jdk_versions.pop(self.java_home, None)
+        shutil.rmtree(self.dir)
+
+    def _touch(self, path, data=b''):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _options(self, kind=appcds.tool_kind('nodetool')):
+        return appcds.jvm_options(kind, self.install_dir, self.env)
+
+    def test_disabled(self):
+        with patch.dict(os.environ, {appcds.APPCDS_ENV: ''}):
+            self.assertEqual([], self._options())
+        appcds._jdk_versions[self.java_home] = 11
+        self.assertEqual([], self._options())
+
+    def test_dump_then_share(self):
+        option, = self._options()
+        self.assertTrue(option.startswith('-XX:ArchiveClassesAtExit='))
+        dump = option.split('=', 1)[1]
+        # the other JVMs wait for the dump
+        self.assertEqual([], self._options())
+        # the server and each tool have an archive of their own
+        self.assertTrue(self._options(appcds.SERVER)[0].startswith('-XX:ArchiveClassesAtExit='))
+        self.assertTrue(self._options(appcds.tool_kind('sstabledump'))[0].startswith('-XX:ArchiveClassesAtExit='))
+
+        self._touch(dump, struct.pack('<I', 0xf00baba8) + b'\0' * 16)
+        option, = self._options()
+        archive = option.split('=', 1)[1]
+        self.assertEqual('-XX:SharedArchiveFile=', option[:len('-XX:SharedArchiveFile=')])
+        self.assertEqual('tool-nodetool.jsa', os.path.basename(archive))
+        self.assertTrue(appcds.is_complete(archive))
+        self.assertFalse(os.path.exists(dump))
+        self.assertEqual([option], self._options())
+
+    def test_stale_dump(self):
+        dump = self._options()[0].split('=', 1)[1]
+        old = time.time() - appcds.DUMP_TIMEOUT - 1
+        os.utime(dump, (old, old))
+        option, = self._options()
+        self.assertTrue(option.startswith('-XX:ArchiveClassesAtExit='))
+        self.assertFalse(os.path.exists(dump))
+
+    def test_rebuild_changes_archive(self):
+        before = appcds.archive_dir(self.install_dir, self.java_home, 17)
+        self._touch(os.path.join(self.install_dir, 'lib', 'netty.jar'))
+        self.assertNotEqual(before, appcds.archive_dir(self.install_dir, self.java_home, 17))
+        self.assertNotEqual(before, appcds.archive_dir(self.install_dir, self.java_home, 21))
+
+    def test_add_options(self):
+        env = appcds.add_options(appcds.SERVER, self.install_dir, dict(self.env, JVM_EXTRA_OPTS='-Dfoo=bar'),
+                                 'JVM_EXTRA_OPTS')
+        self.assertTrue(env['JVM_EXTRA_OPTS'].startswith('-Dfoo=bar -XX:ArchiveClassesAtExit='))
+
+    def test_share_classpath(self):
+        include = os.path.join(self.dir, 'cassandra.in.sh')
+        with open(include, 'w') as f:
+            f.write('CASSANDRA_CONF=/node/conf\nCLASSPATH="$CASSANDRA_CONF:/lib/a.jar:/lib/b.jar"\n')
+        appcds.share_classpath(include)
+        out = subprocess.check_output(['sh', '-c', '. {}; echo "$CLASSPATH"'.format(include)])
+        self.assertEqual('/lib/a.jar:/lib/b.jar:/node/conf', out.decode().strip())
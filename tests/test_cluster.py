@@ -0,0 +1,150 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import signal
+import time
+from collections import namedtuple
+
+from ccmlib.cluster import (_LauncherOutputs, _check_started_nodes_running, _restart_waves, _start_waves,
+                            _wait_for_stopped)
+from ccmlib.common import ArgumentError
+from ccmlib.node import NodeError
+from . import ccmtest
+
+
+class FakeExitWatcher(object):
+
+    def __init__(self, node):
+        self.node = node
+
+    def fileno(self):
+        return None
+
+    def has_exited(self):
+        return not self.node.is_running()
+
+    def close(self):
+        pass
+
+
+class FakeNode(object):
+
+    def __init__(self, name, running=True, stops_at=None):
+        self.name = name
+        self.running = running
+        self.stops_at = stops_at
+        self.signals = []
+        self.printed = []
+
+    def _is_pid_running(self):
+        return self.running
+
+    def _exit_watcher(self):
+        return FakeExitWatcher(self)
+
+    def print_process_output(self, name, proc, verbose=False):
+        self.printed.append((name, proc.returncode, verbose))
+
+    def is_running(self):
+        return self.stops_at is None or time.time() < self.stops_at
+
+    def stop(self, wait=True, signal_event=signal.SIGTERM):
+        self.signals.append(signal_event)
+        if signal_event == signal.SIGKILL:
+            self.stops_at = time.time()
+        return True
+
+
+class FakeProcess(object):
+
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+DcNode = namedtuple('DcNode', ['name', 'data_center'])
+
+
+class TestClusterStart(ccmtest.Tester):
+
+    def test_start_waves(self):
+        nodes = ['node{}'.format(i) for i in range(1, 6)]
+        self.assertEqual(_start_waves(nodes, []), [nodes])
+        self.assertEqual(_start_waves(nodes, [], 2), [nodes[0:2], nodes[2:4], nodes[4:]])
+        self.assertEqual(_start_waves(nodes, ['node2', 'node4'], 2),
+                         [['node2', 'node4'], ['node1', 'node3'], ['node5']])
+        self.assertEqual(_start_waves(nodes, ['node2', 'node4']), [['node2', 'node4'], ['node1', 'node3', 'node5']])
+        self.assertEqual(_start_waves([], ['node1']), [])
+
+    def test_fails_on_dead_node(self):
+        started = [(FakeNode('node1'), None, 0), (FakeNode('node2', running=False), None, 0)]
+        with self.assertRaisesRegex(NodeError, 'node2'):
+            _check_started_nodes_running(started, _LauncherOutputs())
+        _check_started_nodes_running(started[:1], _LauncherOutputs())
+
+    def test_prints_launcher_output(self):
+        node1, node2, node3 = FakeNode('node1'), FakeNode('node2'), FakeNode('node3')
+        launcher = FakeProcess()
+        started = [(node1, launcher, 0), (node2, FakeProcess(0), 0), (node3, FakeProcess(1), 0)]
+        outputs = _LauncherOutputs(verbose=True)
+        # a failed launcher makes the start fail as Node.watch_log_for does
+        self.assertRaises(RuntimeError, _check_started_nodes_running, started, outputs)
+        _check_started_nodes_running(started, outputs)
+        launcher.returncode = 0
+        _check_started_nodes_running(started, outputs)
+        # the output of each launcher is printed once, when it exits
+        self.assertEqual([node1.printed, node2.printed, node3.printed],
+                         [[('node1', 0, True)], [('node2', 0, True)], [('node3', 1, True)]])
+
+
+class TestClusterStop(ccmtest.Tester):
+
+    def test_waits_for_all_nodes_together(self):
+        start = time.time()
+        nodes = [FakeNode('node1', stops_at=start + 0.3), FakeNode('node2', stops_at=start + 0.2),
+                 FakeNode('node3', stops_at=start)]
+        stops = _wait_for_stopped(nodes, start, 5, False)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([stop.node for stop in stops], ['node3', 'node2', 'node1'])
+        self.assertGreaterEqual(stops[-1].duration, 0.3)
+        self.assertFalse(any(stop.killed for stop in stops))
+
+    def test_timeout(self):
+        start = time.time()
+        nodes = [FakeNode('node1', stops_at=start), FakeNode('node2', stops_at=start + 60)]
+        with self.assertRaisesRegex(NodeError, 'node2'):
+            _wait_for_stopped(nodes, start, 0.2, False)
+
+        stops = _wait_for_stopped(nodes, start, 0.2, True)
+        self.assertEqual([(stop.node, stop.killed) for stop in stops], [('node1', False), ('node2', True)])
+        self.assertEqual(nodes[1].signals, [signal.SIGKILL])
+
+
+class TestRollingRestart(ccmtest.Tester):
+
+    def test_restart_waves(self):
+        nodes = [DcNode('node{}'.format(i), 'dc1' if i <= 3 else 'dc2') for i in range(1, 6)]
+        names = lambda waves: [[node.name for node in wave] for wave in waves]
+        self.assertEqual(names(_restart_waves(nodes)), [['node1', 'node4'], ['node2', 'node5'], ['node3']])
+        self.assertEqual(names(_restart_waves(nodes, 2)), [['node1', 'node2', 'node4', 'node5'], ['node3']])
+        self.assertEqual(names(_restart_waves(nodes, 2, per_dc=False)),
+                         [['node1', 'node2'], ['node3', 'node4'], ['node5']])
+        self.assertEqual(names(_restart_waves(nodes, 1, per_dc=False)), [[node.name] for node in nodes])
+        self.assertEqual(_restart_waves([], 1), [])
+        self.assertRaises(ArgumentError, _restart_waves, nodes, 0)
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 
+import time
 import unittest
 from mock import patch
 
@@ -113,5 +114,27 @@ class TestCommon(ccmtest.Tester):
         self.assertEqual(common._get_jdk_version(v1000), "10.0")
         self.assertEqual(common._get_jdk_version(v1001), "10.0")
 
+    def test_parallel_map(self):
+        running = []
+        peak = []
+
+        def square(x):
+            running.append(x)
+            peak.append(len(running))
+            time.sleep(0.05)
+            running.remove(x)
+            return x * x
+
+        self.assertEqual(common.parallel_map(square, range(6), max_workers=2), [0, 1, 4, 9, 16, 25])
+        self.assertEqual(max(peak), 2)
+
+        def fail_on_odd(x):
+            if x % 2:
+                raise ValueError(x)
+            return x
+
+        with self.assertRaisesRegex(ValueError, '1'):
+            common.parallel_map(fail_on_odd, range(4))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import tempfile
+
+from ccmlib.compactionlog import CompactionLog
+from . import ccmtest
+
+
+def _sstable(size):
+    return {'strategyId': '0', 'table': {'generation': 1, 'version': 'mc', 'size': size, 'details': {'level': 0}}}
+
+
+def _event(**fields):
+    event = {'keyspace': 'ks', 'table': 't', 'time': 1677664800000}
+    event.update(fields)
+    return json.dumps(event) + '\n'
+
+
+class TestCompactionLog(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'compaction.log')
+        self.log = CompactionLog(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, text):
+        with open(self.path, 'a') as f:
+            f.write(text)
+
+    def test_table_stats(self):
+        self.write(_event(type='enable', strategies={}) +
+                   _event(type='flush', tables=[_sstable(100)]) +
+                   _event(type='flush', tables=[_sstable(100)]) +
+                   _event(type='compaction', start='1677664800000', end='1677664802000',
+                          input=[_sstable(100), _sstable(100)], output=[_sstable(150)]) +
+                   _event(type='compaction', table='other', start='1677664800000', end='1677664801000',
+                          input=[_sstable(10)], output=[_sstable(10)]))
+        stats = self.log.refresh().table_stats('ks', 't')
+        self.assertEqual((stats.compactions, stats.bytes_in, stats.bytes_out, stats.duration), (1, 200, 150, 2.0))
+        self.assertEqual((stats.throughput_in, stats.throughput_out), (100.0, 75.0))
+        self.assertEqual(stats.write_amplification, 1.75)
+        self.assertIsNone(self.log.stats()[('ks', 'other')].write_amplification)
+        self.assertEqual(self.log.tables(), [('ks', 'other'), ('ks', 't')])
+        self.assertEqual(self.log.compactions[0].sstables_in, 2)
+
+    def test_pending_curve_is_read_incrementally(self):
+        self.write(_event(type='pending', strategyId='0', pending=3, time=1677664800000) +
+                   _event(type='pending', strategyId='1', pending=2, time=1677664801000))
+        self.assertEqual(self.log.refresh().pending_compactions('ks', 't'), [(1677664800.0, 3), (1677664801.0, 5)])
+        self.write(_event(type='pending', strategyId='0', pending=0, time=1677664802000) + '{"type": "pend')
+        self.assertEqual(self.log.refresh().pending_compactions('ks', 't')[-1], (1677664802.0, 2))
+        self.assertIsNone(self.log.table_stats('ks', 'missing'))
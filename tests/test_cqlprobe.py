@@ -0,0 +1,108 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import asyncio
+import socket
+import struct
+import threading
+import time
+
+from ccmlib import aio, cqlprobe
+from . import ccmtest
+
+SUPPORTED = struct.pack('>BBhBI', 0x83, 0, 0, 0x06, 2) + b'\x00\x00'
+PROTOCOL_ERROR = struct.pack('>BBbBI', 0x82, 0, 0, 0x00, 6) + struct.pack('>iH', 0x000A, 0)
+OVERLOADED = struct.pack('>BBhBI', 0x83, 0, 0, 0x00, 6) + struct.pack('>iH', 0x1001, 0)
+
+
+class FakeServer(object):
+    """
+    Accepts connections on a loopback port, and answers OPTIONS frames with
+    SUPPORTED once ready_after seconds have passed (closing the connections
+    before).
+    """
+
+    def __init__(self, ready_after=0):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.itf = self.sock.getsockname()
+        self.ready_at = time.time() + ready_after
+        self.connections = 0
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except (OSError, socket.error):
+                return
+            self.connections += 1
+            with conn:
+                if time.time() >= self.ready_at and len(conn.recv(9)) == 9:
+                    conn.sendall(SUPPORTED)
+
+    def close(self):
+        self.sock.close()
+
+
+class TestCqlProbe(ccmtest.Tester):
+
+    def test_parse_response(self):
+        self.assertTrue(cqlprobe.parse_response(SUPPORTED))
+        self.assertIsNone(cqlprobe.parse_response(SUPPORTED[:5]))
+        self.assertTrue(cqlprobe.parse_response(PROTOCOL_ERROR))
+        self.assertIsNone(cqlprobe.parse_response(PROTOCOL_ERROR[:9]))
+        self.assertFalse(cqlprobe.parse_response(OVERLOADED))
+        self.assertFalse(cqlprobe.parse_response(b'\x15\x03\x01\x00\x02'))
+
+    def test_probes_all_interfaces_together(self):
+        servers = [FakeServer(), FakeServer(0.5)]
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        unused = closed.getsockname()
+        closed.close()
+        try:
+            start = time.time()
+            ready = cqlprobe.probe_native_transports({'node1': servers[0].itf, 'node2': servers[1].itf,
+                                                      'node3': unused}, timeout=2)
+            self.assertEqual(list(ready), ['node1', 'node2', 'node3'])
+            self.assertLess(ready['node1'], start + 0.5)
+            self.assertGreaterEqual(ready['node2'], servers[1].ready_at)
+            self.assertIsNone(ready['node3'])
+            # retries back off
+            self.assertLess(servers[1].connections, 15)
+        finally:
+            for server in servers:
+                server.close()
+
+    def test_tcp_only(self):
+        server = FakeServer(60)
+        try:
+            self.assertFalse(cqlprobe.check_native_transport(server.itf, timeout=0.3))
+            self.assertTrue(cqlprobe.check_native_transport(server.itf, timeout=0.3, tcp_only=True))
+        finally:
+            server.close()
+
+    def test_async_probe(self):
+        server = FakeServer(0.3)
+        try:
+            self.assertTrue(asyncio.run(aio.check_native_transport(server.itf, timeout=5)))
+        finally:
+            server.close()
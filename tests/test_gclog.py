@@ -0,0 +1,102 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+
+from ccmlib.gclog import GcLogParser, gc_stats, iter_gc_events
+from . import ccmtest
+
+JDK8_LOG = (
+    "2023-03-01T10:00:00.000+0000: 10.000: [GC (Allocation Failure) 2023-03-01T10:00:00.000+0000: 10.000: [ParNew\n"
+    "Desired survivor size 10747904 bytes, new threshold 1 (max 1)\n"
+    "- age   1:    1234 bytes,    1234 total\n"
+    ": 163840K->20480K(184320K), 0.0200000 secs] 163840K->30720K(1034240K), 0.0210000 secs] [Times: user=0.05 sys=0.01, real=0.02 secs] \n"
+    "2023-03-01T10:00:01.000+0000: 11.000: Total time for which application threads were stopped: 0.0215 seconds\n"
+    "2023-03-01T10:00:02.000+0000: 12.000: [GC (Allocation Failure) 2023-03-01T10:00:02.000+0000: 12.000: [ParNew: 184320K->20480K(184320K), 0.0400000 secs] 194560K->51200K(1034240K), 0.0410000 secs] [Times: user=0.05 sys=0.01, real=0.04 secs] \n"
+    "2023-03-01T10:00:03.000+0000: 13.000: [GC (CMS Initial Mark) [1 CMS-initial-mark: 30720K(849920K)] 60000K(1034240K), 0.0010000 secs] [Times: user=0.00 sys=0.00, real=0.00 secs] \n"
+    "2023-03-01T10:00:03.100+0000: 13.100: [CMS-concurrent-mark-start]\n"
+    "2023-03-01T10:00:04.000+0000: 14.000: [Full GC (System.gc()) 2023-03-01T10:00:04.000+0000: 14.000: [CMS: 30720K->10240K(849920K), 0.2000000 secs] 61440K->10240K(1034240K), [Metaspace: 30000K->30000K(1077248K)], 0.2010000 secs] [Times: user=0.20 sys=0.00, real=0.20 secs] \n")
+
+UNIFIED_LOG = (
+    "[2023-03-01T10:00:00.000+0000][0.005s][info][gc,heap] Heap region size: 1M\n"
+    "[2023-03-01T10:00:01.000+0000][1.000s][info][gc,start    ] GC(0) Pause Young (Normal) (G1 Evacuation Pause)\n"
+    "[2023-03-01T10:00:01.000+0000][1.000s][info][gc,heap     ] GC(0) Eden regions: 24->0(21)\n"
+    "[2023-03-01T10:00:01.000+0000][1.000s][info][gc,heap     ] GC(0) Survivor regions: 0->3(3)\n"
+    "[2023-03-01T10:00:01.000+0000][1.000s][info][gc,heap     ] GC(0) Old regions: 2->4\n"
+    "[2023-03-01T10:00:01.012+0000][1.012s][info][gc          ] GC(0) Pause Young (Normal) (G1 Evacuation Pause) 26M->7M(256M) 12.000ms\n"
+    "[2023-03-01T10:00:03.000+0000][3.000s][info][gc          ] GC(1) Pause Young (Mixed) (G1 Evacuation Pause) 40M->9M(256M) 5.000ms\n"
+    "[2023-03-01T10:00:04.000+0000][4.000s][info][gc          ] GC(2) Pause Remark 27M->27M(256M) 1.000ms\n")
+
+MB = 1024 * 1024
+
+
+def _parse(text):
+    parser = GcLogParser()
+    events = []
+    for line in text.splitlines(True):
+        events.extend(parser.feed(line))
+    return events + parser.flush()
+
+
+class TestGcLog(ccmtest.Tester):
+
+    def test_parses_jdk8_log(self):
+        events = _parse(JDK8_LOG)
+        self.assertEqual([(e.kind, e.pause) for e in events],
+                         [('Young', 0.021), ('Young', 0.041), ('Initial Mark', 0.001), ('Full', 0.201)])
+        young = events[0]
+        self.assertEqual(young.timestamp, 1677664800.0)
+        self.assertEqual(young.uptime, 10.0)
+        self.assertEqual((young.young_before, young.young_after), (160 * MB, 20 * MB))
+        self.assertEqual((young.heap_before, young.heap_after), (160 * MB, 30 * MB))
+        self.assertEqual((young.old_before, young.old_after), (0, 10 * MB))
+        self.assertEqual((events[3].old_before, events[3].heap_before), (30 * MB, 60 * MB))
+
+    def test_parses_unified_log(self):
+        events = _parse(UNIFIED_LOG)
+        self.assertEqual([(e.kind, e.pause) for e in events], [('Young', 0.012), ('Mixed', 0.005), ('Remark', 0.001)])
+        self.assertEqual((events[0].young_before, events[0].young_after), (24 * MB, 3 * MB))
+        self.assertEqual((events[0].old_before, events[0].old_after), (2 * MB, 4 * MB))
+        self.assertEqual((events[1].heap_before, events[1].heap_after, events[1].heap_capacity), (40 * MB, 9 * MB, 256 * MB))
+
+    def test_stats(self):
+        stats = gc_stats(_parse(JDK8_LOG))
+        self.assertEqual(stats.count, 4)
+        self.assertAlmostEqual(stats.total, 0.264)
+        self.assertEqual((stats.p50, stats.p99, stats.max), (0.021, 0.201, 0.201))
+        self.assertEqual(stats.kinds, {'Young': 2, 'Initial Mark': 1, 'Full': 1})
+        self.assertEqual(stats.duration, 4.0)
+        # 30M -> 190M, then 50M -> 60M
+        self.assertEqual(stats.allocated, 170 * MB)
+        self.assertEqual(stats.allocation_rate, 170 * MB / 4.0)
+        # the old generation grew by 10M, then 20M
+        self.assertEqual(stats.promoted, 30 * MB)
+
+        stats = gc_stats(_parse(JDK8_LOG), since=1677664801.0, until=1677664804.0)
+        self.assertEqual(stats.kinds, {'Young': 1, 'Initial Mark': 1})
+        self.assertIsNone(gc_stats(_parse(JDK8_LOG), since=1677664900.0))
+
+    def test_reads_file_from_offset(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'gc.log')
+            with open(path, 'w') as f:
+                f.write(UNIFIED_LOG[:UNIFIED_LOG.index('[2023-03-01T10:00:03')])
+                mark = f.tell()
+                f.write(UNIFIED_LOG[mark:])
+            self.assertEqual(len(list(iter_gc_events(path))), 3)
+            self.assertEqual([e.kind for e in iter_gc_events(path, mark)], ['Mixed', 'Remark'])
@@ -0,0 +1,126 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import threading
+import time
+
+from ccmlib import gossip
+from ccmlib.gossip import GossipStateTracker
+from ccmlib.logbus import LogBus
+from . import ccmtest
+
+
+class _FakeNode(object):
+
+    def __init__(self, name, address, log_dir):
+        self.name = name
+        self._address = address
+        self._log_dir = log_dir
+
+    def log_directory(self):
+        return self._log_dir
+
+    def get_cassandra_version(self):
+        return '4.0'
+
+    def address_for_version(self, version):
+        return '{}:7000'.format(self._address)
+
+
+class _FakeCluster(object):
+
+    def __init__(self, nodes):
+        self.name = 'test'
+        self.nodes = dict((node.name, node) for node in nodes)
+
+    def nodelist(self):
+        return [self.nodes[name] for name in sorted(self.nodes)]
+
+
+class TestParseTransition(ccmtest.Tester):
+
+    def test_parses_transitions(self):
+        self.assertEqual(gossip.parse_transition("INFO  [GossipStage:1] 2023-01-01 00:00:00,000 Gossiper.java:1 - InetAddress /127.0.0.2:7000 is now UP"),
+                         ('127.0.0.2:7000', gossip.UP))
+        self.assertEqual(gossip.parse_transition("INFO  InetAddress localhost/127.0.0.2 is now dead."),
+                         ('127.0.0.2', gossip.DOWN))
+        self.assertEqual(gossip.parse_transition("INFO  InetAddress /127.0.0.3 is now DOWN"),
+                         ('127.0.0.3', gossip.DOWN))
+        self.assertIsNone(gossip.parse_transition("INFO  Node /127.0.0.3 is now part of the cluster"))
+
+
+class TestGossipStateTracker(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        nodes = []
+        for i in range(1, 4):
+            log_dir = os.path.join(self.temp_dir.name, 'node{}'.format(i), 'logs')
+            os.makedirs(log_dir)
+            nodes.append(_FakeNode('node{}'.format(i), '127.0.0.{}'.format(i), log_dir))
+        self.node1, self.node2, self.node3 = nodes
+        self.bus = LogBus(_FakeCluster(nodes))
+        self.tracker = GossipStateTracker(self.bus)
+
+    def tearDown(self):
+        self.bus.stop()
+        self.temp_dir.cleanup()
+
+    def start(self):
+        self.bus.start()
+        self.bus.poll()
+        self.bus.add_subscriber(self.tracker, replay=True)
+
+    def log(self, node, text):
+        with open(os.path.join(node.log_directory(), 'system.log'), 'a') as f:
+            f.write(text)
+            return f.tell()
+
+    def test_answers_from_past_transitions(self):
+        self.log(self.node1, "INFO InetAddress /127.0.0.2:7000 is now UP\nINFO InetAddress /127.0.0.3:7000 is now UP\n")
+        self.start()
+        self.assertEqual(self.tracker.wait_for([(self.node1, [self.node2, self.node3], None)], gossip.UP, 0), [])
+        self.assertEqual(self.tracker.peer_state(self.node1, self.node2), gossip.UP)
+        self.assertIsNone(self.tracker.peer_state(self.node2, self.node1))
+        self.assertEqual(self.tracker.matrix()['node1']['127.0.0.3:7000'][0], gossip.UP)
+
+    def test_respects_marks(self):
+        mark = self.log(self.node1, "INFO InetAddress /127.0.0.2:7000 is now UP\n")
+        self.start()
+        missing = self.tracker.wait_for([(self.node1, [self.node2], mark)], gossip.UP, 0.2)
+        self.assertEqual(missing, [(self.node1, [self.node2])])
+
+    def test_wakes_up_on_new_transitions(self):
+        self.log(self.node2, "INFO InetAddress /127.0.0.1:7000 is now UP\n")
+        self.start()
+        mark = self.log(self.node2, "")
+
+        def kill():
+            time.sleep(0.2)
+            self.log(self.node2, "INFO InetAddress /127.0.0.1:7000 is now DOWN\n")
+        writer = threading.Thread(target=kill)
+        writer.start()
+        self.assertEqual(self.tracker.wait_for([(self.node2, [self.node1], mark)], gossip.DOWN, 10), [])
+        writer.join()
+        self.assertEqual(self.tracker.peer_state(self.node2, self.node1), gossip.DOWN)
+
+    def test_waits_without_bus_thread(self):
+        self.log(self.node3, "INFO InetAddress /127.0.0.1:7000 is now UP\n")
+        self.bus.add_subscriber(self.tracker)
+        self.assertEqual(self.tracker.wait_for([(self.node3, [self.node1], None)], gossip.UP, 5), [])
@@ -0,0 +1,160 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+
+import yaml
+
+from ccmlib import images
+from ccmlib.common import ArgumentError
+from . import ccmtest
+
+SSTABLE = os.path.join('data0', 'system', 'local-7ad54392bcdd35a684174e047860b377', 'nb-1-big-Data.db')
+TOC = os.path.join('data0', 'system', 'local-7ad54392bcdd35a684174e047860b377', 'nb-1-big-TOC.txt')
+
+
+class FakeNode(object):
+
+    def __init__(self, cluster, name, running=False):
+        self.cluster = cluster
+        self.name = name
+        self.running = running
+
+    def is_running(self):
+        return self.running
+
+    def get_conf_file(self):
+        return os.path.join(self.cluster.get_path(), self.name, 'conf', 'cassandra.yaml')
+
+
+class FakeCluster(object):
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+        self._config_options = {}
+        self.nodes = [FakeNode(self, 'node1'), FakeNode(self, 'node2')]
+
+    def get_path(self):
+        return os.path.join(self.path, self.name)
+
+    def nodelist(self):
+        return self.nodes
+
+    def cassandra_version(self):
+        return '4.1.3'
+
+
+class TestImages(ccmtest.Tester):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cluster = FakeCluster(self.path, 'source')
+        cluster_path = self.cluster.get_path()
+        self._write(os.path.join(cluster_path, 'cluster.conf'),
+                    yaml.safe_dump({'name': 'source', 'nodes': ['node1', 'node2'],
+                                    'config_options': {'client_encryption_options': {
+                                        'keystore': os.path.join(cluster_path, 'keystore.jks')}}}))
+        self._write(os.path.join(cluster_path, 'logs.db'), 'index')
+        for node in self.cluster.nodes:
+            node_path = os.path.join(cluster_path, node.name)
+            self._write(os.path.join(node_path, 'node.conf'), yaml.safe_dump({'name': node.name, 'pid': 1234}))
+            self._write(node.get_conf_file(), yaml.safe_dump({
+                'cluster_name': 'source',
+                'commitlog_directory': os.path.join(node_path, 'commitlogs')}))
+            self._write(os.path.join(node_path, SSTABLE), 'sstable')
+            self._write(os.path.join(node_path, TOC), 'Data.db')
+            self._write(os.path.join(node_path, 'commitlogs', 'CommitLog-7-1.log'), 'mutations')
+            self._write(os.path.join(node_path, 'logs', 'system.log'), 'INFO')
+            self._write(os.path.join(node_path, 'cassandra.pid'), '1234')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, path, content):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _read_yaml(self, path):
+        with open(path) as f:
+            return yaml.safe_load(f)
+
+    def test_is_immutable_component(self):
+        self.assertTrue(images._is_immutable_component(os.path.join('node1', SSTABLE)))
+        table = os.path.join('node1', 'data0', 'system', 'local-7ad5')
+        self.assertTrue(images._is_immutable_component(os.path.join(table, 'nb-1-big-Index.db')))
+        # rewritten in place by upgrades, index summary redistribution or tools
+        for component in ('nb-1-big-TOC.txt', 'nb-1-big-Digest.crc32', 'nb-1-big-Statistics.db',
+                          'nb-1-big-Summary.db'):
+            self.assertFalse(images._is_immutable_component(os.path.join(table, component)))
+        self.assertFalse(images._is_immutable_component(os.path.join(table, 'nb_txn_compaction_1.log')))
+        self.assertFalse(images._is_immutable_component(os.path.join('node1', 'conf', 'cassandra.yaml')))
+        self.assertFalse(images._is_immutable_component(os.path.join('node1', 'commitlogs', 'CommitLog-7-1.log')))
+
+    def test_refuses_running_cluster(self):
+        self.cluster.nodes[1].running = True
+        self.assertRaises(ArgumentError, images.snapshot_image, self.cluster, 'golden')
+        self.assertEqual([], images.list_images(self.path))
+
+    def test_snapshot_image(self):
+        image, counts = images.snapshot_image(self.cluster, 'golden')
+        self.assertEqual(('golden', 'source', 'source', '4.1.3'),
+                         (image.name, image.cluster, image.cassandra_cluster_name, image.cassandra_version))
+        self.assertEqual(['golden'], [i.name for i in images.list_images(self.path)])
+        self.assertEqual(2, counts.get(images.HARDLINK))
+        self.assertEqual(len(os.listdir(images.images_path(self.path))), 1)
+
+        node_path = os.path.join(image.path, 'node1')
+        self.assertEqual(os.stat(os.path.join(self.cluster.get_path(), 'node1', SSTABLE)).st_ino,
+                         os.stat(os.path.join(node_path, SSTABLE)).st_ino)
+        self.assertNotEqual(os.stat(os.path.join(self.cluster.get_path(), 'node1', TOC)).st_ino,
+                            os.stat(os.path.join(node_path, TOC)).st_ino)
+        self.assertEqual([], os.listdir(os.path.join(node_path, 'logs')))
+        self.assertFalse(os.path.exists(os.path.join(node_path, 'cassandra.pid')))
+        self.assertFalse(os.path.exists(os.path.join(image.path, 'logs.db')))
+        self.assertNotIn('pid', self._read_yaml(os.path.join(node_path, 'node.conf')))
+
+        self.assertRaises(ArgumentError, images.snapshot_image, self.cluster, 'golden')
+        images.snapshot_image(self.cluster, 'golden', force=True)
+
+    def test_materialize_image(self):
+        images.snapshot_image(self.cluster, 'golden')
+        image, counts = images.materialize_image(self.path, 'copy', 'golden')
+        self.assertEqual(2, counts.get(images.HARDLINK))
+        cluster_path = os.path.join(self.path, 'copy')
+
+        cluster_conf = self._read_yaml(os.path.join(cluster_path, 'cluster.conf'))
+        self.assertEqual('copy', cluster_conf['name'])
+        self.assertEqual('source', cluster_conf['config_options']['cluster_name'])
+        self.assertEqual(os.path.join(cluster_path, 'keystore.jks'),
+                         cluster_conf['config_options']['client_encryption_options']['keystore'])
+        conf = self._read_yaml(os.path.join(cluster_path, 'node2', 'conf', 'cassandra.yaml'))
+        self.assertEqual(os.path.join(cluster_path, 'node2', 'commitlogs'), conf['commitlog_directory'])
+        self.assertFalse(os.path.exists(os.path.join(cluster_path, images.IMAGE_CONF)))
+        self.assertTrue(os.path.isdir(os.path.join(cluster_path, 'node2', 'logs')))
+
+        # the image is left untouched
+        conf = self._read_yaml(os.path.join(image.path, 'node2', 'conf', 'cassandra.yaml'))
+        self.assertEqual(os.path.join(self.cluster.get_path(), 'node2', 'commitlogs'), conf['commitlog_directory'])
+
+        self.assertRaises(ArgumentError, images.materialize_image, self.path, 'copy', 'golden')
+        self.assertRaises(ArgumentError, images.materialize_image, self.path, 'other', 'missing')
+        self.assertFalse(os.path.exists(os.path.join(self.path, 'other')))
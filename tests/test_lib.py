@@ -23,7 +23,7 @@ from pathlib import Path
 
 import pytest
 import requests
-from six import StringIO
+from six import BytesIO, StringIO
 
 import ccmlib
 from ccmlib.cluster import Cluster
@@ -518,6 +518,27 @@ class TestErrorLogGrepping(ccmtest.Tester):
         err = '\n'.join([line1, line2, line3, line4])
         self.assertGreppedLog(err, [[line1], [line2], [line4]])
 
+    def test_streaming_reports_offsets(self):
+        log = (b'INFO: starting\n'
+               b'ERROR: You have made a terrible mistake\n'
+               b'  And here are more details on what you did\n'
+               b'INFO: Node joined ring\n')
+        errors = list(ccmlib.node._iter_log_errors(BytesIO(log)))
+        start = len(b'INFO: starting\n')
+        end = log.index(b'INFO: Node')
+        self.assertEqual(errors, [(['ERROR: You have made a terrible mistake',
+                                    '  And here are more details on what you did'], start, end)])
+        self.assertEqual(list(ccmlib.node._iter_log_errors(BytesIO(log), start=end)), [])
+
+    def test_streaming_bounds_long_lines_and_traces(self):
+        long_line = b'ERROR: ' + b'x' * (3 * ccmlib.node._ERROR_SCAN_CHUNK_SIZE) + b'\n'
+        trace = b'\tat Foo.bar(Foo.java:1)\n' * (ccmlib.node._ERROR_BLOCK_MAX_LINES + 10)
+        log = long_line + trace + b'INFO: done\n'
+        [(block, start, end)] = list(ccmlib.node._iter_log_errors(BytesIO(log)))
+        self.assertEqual(len(block[0]), ccmlib.node._ERROR_SCAN_CHUNK_SIZE)
+        self.assertEqual(len(block), ccmlib.node._ERROR_BLOCK_MAX_LINES)
+        self.assertEqual((start, end), (0, len(long_line) + len(trace)))
+
 
 class TestCCMCLI(ccmtest.Tester):
     def test_help_message_with_paramiko(self):
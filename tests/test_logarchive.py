@@ -0,0 +1,112 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import pickle
+import tempfile
+import zipfile
+
+from ccmlib import logarchive
+from ccmlib.logarchive import LogMark, RotatingLogReader
+from ccmlib.logtail import MultiLogWatcher
+from . import ccmtest
+
+
+class TestLogArchive(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.temp_dir.name, 'system.log')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def log(self, text):
+        with open(self.log_file, 'a') as f:
+            f.write(text)
+
+    def rotate(self, index):
+        # what logback does: the log is moved into a zip and a new one started
+        archive = '{}.{}.zip'.format(self.log_file, index)
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(self.log_file, 'system.log.{}'.format(index))
+        os.remove(self.log_file)
+        self.log('')
+        return archive
+
+    def read_all(self, reader):
+        lines = []
+        while True:
+            next_line = reader.readline()
+            if next_line is None:
+                return lines
+            lines.append(next_line)
+
+    def test_marks(self):
+        self.log("first\n")
+        mark = logarchive.mark_file(self.log_file)
+        self.assertEqual(mark, 6)
+        self.assertEqual(pickle.loads(pickle.dumps(mark)).file_id, mark.file_id)
+        self.assertEqual(logarchive.current_offset(self.log_file, mark), 6)
+        self.rotate(1)
+        self.log("second\n")
+        self.assertTrue(logarchive.was_rotated(self.log_file, mark))
+        self.assertEqual(logarchive.current_offset(self.log_file, mark), 0)
+        # a plain offset beyond the end of the log is taken as a rotation too
+        self.assertEqual(logarchive.current_offset(self.log_file, 100), 0)
+
+    def test_reader_follows_rotation(self):
+        self.log("one\ntwo\n")
+        with RotatingLogReader(self.log_file, from_mark=4) as reader:
+            self.assertEqual(self.read_all(reader), [(4, 'two\n')])
+            self.log("three\nfour")
+            self.assertEqual(self.read_all(reader), [(8, 'three\n')])
+            self.rotate(1)
+            self.log("five\n")
+            self.assertEqual(self.read_all(reader), [(14, 'four'), (0, 'five\n')])
+            self.assertEqual(reader.rotations, 1)
+
+    def test_reader_searches_archives_after_mark(self):
+        self.log("old\n")
+        self.rotate(1)
+        self.log("one\n")
+        mark = logarchive.mark_file(self.log_file)
+        self.log("two\n")
+        self.rotate(2)
+        self.log("three\n")
+        with RotatingLogReader(self.log_file, from_mark=mark, search_archives=True) as reader:
+            self.assertEqual(self.read_all(reader), [(None, 'two\n'), (0, 'three\n')])
+
+    def test_grep_archives(self):
+        self.log("error one\n")
+        self.rotate(1)
+        self.log("error two\nfine\n")
+        self.assertEqual(logarchive.rotated_archives(self.log_file), [self.log_file + '.1.zip'])
+        matches = logarchive.grep_archives(self.log_file, 'error')
+        self.assertEqual([(os.path.basename(a), o, l) for a, o, l, _ in matches], [('system.log.1.zip', 0, 'error one\n')])
+
+    def test_watcher_follows_rotation(self):
+        self.log("nothing\n")
+        mark = logarchive.mark_file(self.log_file)
+        watcher = MultiLogWatcher()
+        watcher.expect(self.log_file, ['started'], from_mark=mark)
+        self.assertFalse(watcher.wait(0))
+        self.rotate(1)
+        self.log("started\n")
+        watcher = MultiLogWatcher()
+        watcher.expect(self.log_file, ['started'], from_mark=mark)
+        self.assertTrue(watcher.wait(1))
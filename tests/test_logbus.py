@@ -0,0 +1,170 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import threading
+import time
+
+from mock import patch
+
+from ccmlib import logbus
+from ccmlib.cluster import _LogErrorWatcher
+from ccmlib.logerrors import ErrorSummary
+from ccmlib.logbus import LogBus
+from . import ccmtest
+
+
+class _FakeNode(object):
+
+    def __init__(self, name, log_dir):
+        self.name = name
+        self._log_dir = log_dir
+
+    def log_directory(self):
+        return self._log_dir
+
+
+class _FakeCluster(object):
+
+    def __init__(self, nodes):
+        self.name = 'test'
+        self.nodes = dict((node.name, node) for node in nodes)
+
+    def nodelist(self):
+        return [self.nodes[name] for name in sorted(self.nodes)]
+
+
+class TestLogBus(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        nodes = []
+        for i in range(1, 3):
+            log_dir = os.path.join(self.temp_dir.name, 'node{}'.format(i), 'logs')
+            os.makedirs(log_dir)
+            nodes.append(_FakeNode('node{}'.format(i), log_dir))
+        self.node1, self.node2 = nodes
+        self.bus = LogBus(_FakeCluster(nodes))
+
+    def tearDown(self):
+        self.bus.stop()
+        self.temp_dir.cleanup()
+
+    def log(self, node, text):
+        with open(os.path.join(node.log_directory(), 'system.log'), 'a') as f:
+            f.write(text)
+
+    def test_filters(self):
+        by_level, by_pattern, by_node = [], [], []
+        self.bus.subscribe(lambda e, m: by_level.append(e.line), levels=['WARN', 'ERROR'])
+        self.bus.subscribe(lambda e, m: by_pattern.append(m.group(1)), pattern=r'Compacted (\d+)')
+        self.bus.subscribe(lambda e, m: by_node.append(e.offset), nodes=['node2'])
+        self.log(self.node1, 'INFO  Compacted 3 sstables\nWARN  slow query\n\tat Foo.bar\n')
+        self.log(self.node2, 'ERROR boom\n')
+        self.bus.poll()
+        self.assertEqual(by_level, ['WARN  slow query\n', 'ERROR boom\n'])
+        self.assertEqual(by_pattern, ['3'])
+        self.assertEqual(by_node, [0])
+
+    def test_each_line_is_read_once(self):
+        self.log(self.node1, 'INFO one\nINFO two\n')
+        seen = [[] for _ in range(10)]
+        for lines in seen:
+            self.bus.subscribe(lambda e, m, lines=lines: lines.append(e.line))
+        with patch.object(logbus, 'iter_lines', wraps=logbus.iter_lines) as iter_lines:
+            self.bus.poll()
+            self.bus.poll()
+        self.assertEqual(seen, [['INFO one\n', 'INFO two\n']] * 10)
+        # one read per log file and per pass, whatever the number of subscribers
+        self.assertEqual(iter_lines.call_count, 2)
+
+    def test_replay_for_late_subscribers(self):
+        self.log(self.node1, 'INFO one\n')
+        early, late = [], []
+        self.bus.subscribe(lambda e, m: early.append(e.line))
+        self.bus.poll()
+        self.bus.subscribe(lambda e, m: late.append(e.line), replay=True)
+        self.log(self.node1, 'INFO two\n')
+        self.bus.poll()
+        self.assertEqual(early, late)
+
+    def test_reset_on_truncation(self):
+        resets = []
+        subscriber = self.bus.subscribe(lambda e, m: None)
+        subscriber.on_reset = resets.append
+        self.log(self.node1, 'INFO a long line that will go away\n')
+        self.bus.poll()
+        with open(os.path.join(self.node1.log_directory(), 'system.log'), 'w') as f:
+            f.write('INFO new\n')
+        self.bus.poll()
+        self.assertEqual(resets, ['node1'])
+
+    def test_error_watcher(self):
+        reports = []
+        self.log(self.node1, 'ERROR old error\nINFO fine\n')
+        self.bus.start()
+        watcher = self.bus.add_subscriber(_LogErrorWatcher(self.bus, reports.append, 0), replay=True)
+        self.log(self.node2, 'ERROR new error\n\tat Foo.bar\n')
+        watcher.join()
+        self.assertFalse(watcher.is_alive())
+        errors = {}
+        for report in reports:
+            for node, blocks in report.items():
+                errors.setdefault(node, []).extend(blocks)
+        self.assertEqual(errors, {'node1': [['ERROR old error']], 'node2': [['ERROR new error', '\tat Foo.bar']]})
+
+    def test_summarizing_error_watcher(self):
+        reports = []
+        error = 'ERROR [main] 2023-03-01 10:00:00,000 Foo.java:1 - failed\njava.lang.RuntimeException: boom {}\n\tat Foo.bar(Foo.java:1)\n'
+        self.log(self.node1, error.format(1) + error.format(2))
+        self.log(self.node2, error.format(3))
+        watcher = self.bus.add_subscriber(_LogErrorWatcher(self.bus, reports.append, 0, summarize=True), replay=True)
+        watcher.join()
+        summary = ErrorSummary()
+        for report in reports:
+            summary.update(report)
+        [group] = summary.groups()
+        self.assertEqual(group.count, 3)
+        self.assertEqual(dict((node, occurrences[0]) for node, occurrences in group.nodes.items()), {'node1': 2, 'node2': 1})
+
+    def test_survives_failing_pass(self):
+        lines = []
+        self.bus.subscribe(lambda e, m: lines.append(e.line))
+        with patch.object(logbus.LogBus, '_refresh_logs', side_effect=RuntimeError('dictionary changed size')):
+            self.bus.start()
+            time.sleep(0.2)
+        self.assertTrue(self.bus.is_alive())
+        self.log(self.node1, 'INFO after\n')
+        deadline = time.time() + 5
+        while not lines and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(lines, ['INFO after\n'])
+
+    def test_callbacks_run_without_the_bus_lock(self):
+        subscribed = []
+
+        def on_line(event, match):
+            # another thread can use the bus while a subscriber is busy
+            thread = threading.Thread(target=lambda: subscribed.append(self.bus.subscribe(lambda e, m: None)))
+            thread.start()
+            thread.join(5)
+
+        self.bus.subscribe(on_line)
+        self.log(self.node1, 'INFO one\n')
+        self.bus.poll()
+        self.assertEqual(len(subscribed), 1)
@@ -0,0 +1,133 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+
+from ccmlib.logcatalog import LogCatalog, format_record
+from ccmlib.logrecords import parse_timestamp
+from . import ccmtest
+
+LOG = ("INFO  [main] 2023-03-01 10:00:00,100 CassandraDaemon.java:600 - Startup complete\n"
+       "ERROR [CompactionExecutor:1] 2023-03-01 10:00:02,300 CassandraDaemon.java:244 - Exception in thread\n"
+       "java.lang.RuntimeException: boom\n")
+
+
+class _FakeNode(object):
+
+    def __init__(self, name, log_dir):
+        self.name = name
+        self._log_dir = log_dir
+
+    def log_directory(self):
+        return self._log_dir
+
+
+class TestLogCatalog(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.nodes = []
+        for i in range(1, 3):
+            log_dir = os.path.join(self.temp_dir.name, 'node{}'.format(i), 'logs')
+            os.makedirs(log_dir)
+            self.nodes.append(_FakeNode('node{}'.format(i), log_dir))
+        self.catalog = LogCatalog(os.path.join(self.temp_dir.name, 'logs.db'))
+
+    def tearDown(self):
+        self.catalog.close()
+        self.temp_dir.cleanup()
+
+    def log(self, node, text, filename='system.log'):
+        with open(os.path.join(node.log_directory(), filename), 'a') as f:
+            f.write(text)
+
+    def test_queries_across_nodes(self):
+        self.log(self.nodes[0], LOG)
+        self.log(self.nodes[1], "WARN  [main] 2023-03-01 10:00:01,000 StorageService.java:10 - Slow start\n")
+        self.log(self.nodes[1], "[2023-03-01T10:00:01.500+0000][info][gc] GC(0) Pause Young 10M->5M 3.000ms\n", 'gc.log')
+        self.assertEqual(self.catalog.ingest(self.nodes), 4)
+
+        records = self.catalog.query()
+        self.assertEqual([(r.node, r.file, r.level) for r in records],
+                         [('node1', 'system.log', 'INFO'), ('node2', 'system.log', 'WARN'),
+                          ('node2', 'gc.log', None), ('node1', 'system.log', 'ERROR')])
+        self.assertEqual([r.node for r in self.catalog.query(level=['WARN', 'ERROR'])], ['node2', 'node1'])
+        self.assertEqual([r.message for r in self.catalog.query(nodes='node1', logger='CassandraDaemon')],
+                         ['Startup complete', 'Exception in thread'])
+        self.assertEqual(len(self.catalog.query(since=parse_timestamp('2023-03-01 10:00:01'),
+                                                until=parse_timestamp('2023-03-01 10:00:02'))), 2)
+        self.assertEqual(len(self.catalog.query(limit=1)), 1)
+        self.assertEqual(format_record(records[3]),
+                         ['node1 system.log: ERROR [CompactionExecutor:1] 2023-03-01 10:00:02,300 CassandraDaemon:244 - Exception in thread',
+                          'java.lang.RuntimeException: boom'])
+
+    def test_searches_messages_and_stack_traces(self):
+        self.log(self.nodes[0], LOG)
+        self.catalog.ingest(self.nodes)
+        [record] = self.catalog.query('RuntimeException: boom')
+        self.assertEqual(record.message, 'Exception in thread')
+        self.assertEqual(record.continuation, ['java.lang.RuntimeException: boom'])
+        self.assertEqual(self.catalog.query('Pause Young'), [])
+
+    def test_ingests_incrementally(self):
+        self.log(self.nodes[0], LOG)
+        self.assertEqual(self.catalog.ingest(self.nodes), 2)
+        self.assertEqual(self.catalog.ingest(self.nodes), 0)
+        # the stack trace goes on in the next ingestion
+        self.log(self.nodes[0], "\tat org.apache.cassandra.db.Foo.bar(Foo.java:1)\n"
+                                "INFO  [main] 2023-03-01 10:00:05,000 Gossiper.java:1 - Node is now part")
+        self.assertEqual(self.catalog.ingest(self.nodes), 0)
+        [record] = self.catalog.query('Foo.bar')
+        self.assertEqual(record.continuation, ['java.lang.RuntimeException: boom',
+                                               '\tat org.apache.cassandra.db.Foo.bar(Foo.java:1)'])
+        self.log(self.nodes[0], " of the ring\n")
+        self.assertEqual(self.catalog.ingest(self.nodes), 1)
+        self.assertEqual(self.catalog.query('now part')[0].message, 'Node is now part of the ring')
+
+    def test_reloads_replaced_logs(self):
+        self.log(self.nodes[0], LOG)
+        self.catalog.ingest(self.nodes)
+        os.remove(os.path.join(self.nodes[0].log_directory(), 'system.log'))
+        self.log(self.nodes[0], "INFO  [main] 2023-03-02 10:00:00,000 CassandraDaemon.java:600 - Restarted\n")
+        self.assertEqual(self.catalog.ingest(self.nodes), 1)
+        # the records of the rolled over log are kept under an archived name
+        archived = 'system.log.2023-03-01_10-00-02'
+        self.assertEqual([(r.file, r.message) for r in self.catalog.query()],
+                         [(archived, 'Startup complete'), (archived, 'Exception in thread'),
+                          ('system.log', 'Restarted')])
+        self.assertEqual([r.file for r in self.catalog.query('boom', files='system.log')], [archived])
+
+    def test_follows_renamed_gc_logs(self):
+        node = self.nodes[0]
+        gc_line = "2023-03-01T10:00:0{}.000+0000: [GC pause (G1 Evacuation Pause) (young) 10M->5M, 0.003 secs]\n"
+        self.log(node, gc_line.format(1), 'gc.log.0.current')
+        self.assertEqual(self.catalog.ingest([node]), 1)
+        # the JVM renames the full log and goes on with the next one
+        self.log(node, gc_line.format(2), 'gc.log.0.current')
+        os.rename(os.path.join(node.log_directory(), 'gc.log.0.current'), os.path.join(node.log_directory(), 'gc.log.0'))
+        self.log(node, gc_line.format(3), 'gc.log.1.current')
+        self.assertEqual(self.catalog.ingest([node]), 2)
+        self.assertEqual([r.file for r in self.catalog.query(files='gc.log')], ['gc.log.0', 'gc.log.0', 'gc.log.1.current'])
+
+    def test_reopens_existing_catalog(self):
+        self.log(self.nodes[0], LOG)
+        self.catalog.ingest(self.nodes)
+        self.catalog.close()
+        self.catalog = LogCatalog(os.path.join(self.temp_dir.name, 'logs.db'))
+        self.assertEqual(self.catalog.ingest(self.nodes), 0)
+        self.assertEqual(len(self.catalog.query(level='ERROR')), 1)
@@ -0,0 +1,62 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from ccmlib.logerrors import ErrorSummary, fingerprint
+from . import ccmtest
+
+
+def _error(thread, message, line=244, lambda_id='0x0000000840123456'):
+    return ['ERROR [{}] 2023-03-01 10:00:02,300 CassandraDaemon.java:{} - Exception in thread {}'.format(thread, line, thread),
+            'java.lang.RuntimeException: {}'.format(message),
+            '\tat org.apache.cassandra.db.Foo.bar(Foo.java:{})'.format(line),
+            '\tat org.apache.cassandra.db.Foo$$Lambda$123/{}.run(Unknown Source)'.format(lambda_id),
+            '\tat java.base/java.lang.Thread.run(Thread.java:829)',
+            'Caused by: java.io.IOException: disk',
+            '\tat org.apache.cassandra.io.Bar.baz(Bar.java:1)']
+
+
+class TestLogErrors(ccmtest.Tester):
+
+    def test_fingerprint_ignores_variable_parts(self):
+        key, exception = fingerprint(_error('CompactionExecutor:1', 'boom 1'))
+        self.assertEqual(exception, 'java.lang.RuntimeException')
+        self.assertEqual(key, 'java.lang.RuntimeException|org.apache.cassandra.db.Foo.bar|'
+                              'org.apache.cassandra.db.Foo.run|java.lang.Thread.run')
+        self.assertEqual(fingerprint(_error('CompactionExecutor:7', 'boom 2', line=250, lambda_id='0x1'))[0], key)
+
+    def test_fingerprint_without_stack_trace(self):
+        first = ['ERROR [main] 2023-03-01 10:00:02,300 StorageService.java:10 - Lost 3 of 12 hints for /127.0.0.2']
+        second = ['ERROR [main] 2023-03-01 10:00:05,100 StorageService.java:10 - Lost 5 of 12 hints for /127.0.0.3']
+        self.assertEqual(fingerprint(first), fingerprint(second))
+        self.assertEqual(fingerprint(first), ('StorageService: Lost # of # hints for /#.#.#.#', None))
+        self.assertEqual(fingerprint(['WARN  [main] 2023-03-01 10:00:02,300 Foo.java:1 - got java.io.IOException: x'])[1],
+                         'java.io.IOException')
+
+    def test_summary(self):
+        node1, node2 = ErrorSummary(), ErrorSummary()
+        node1.add('node1', _error('a', 'x'), 100)
+        node1.add('node1', ['ERROR [main] 2023-03-01 10:00:02,300 Foo.java:1 - other'], 200)
+        node1.add('node1', _error('b', 'y'), 300)
+        node2.add('node2', _error('c', 'z'), 50)
+        cluster = ErrorSummary().update(node1).update(node2)
+        self.assertEqual((len(cluster), cluster.count()), (2, 4))
+        top = cluster.groups()[0]
+        self.assertEqual(top.count, 3)
+        self.assertEqual(top.nodes, {'node1': [2, 100, 300], 'node2': [1, 50, 50]})
+        self.assertEqual(top.exemplar, _error('a', 'x'))
+        lines = cluster.format()
+        self.assertEqual(lines[0], '3 x java.lang.RuntimeException on node1 (2), node2 (1)')
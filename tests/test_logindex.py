@@ -0,0 +1,89 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+
+from ccmlib.logindex import LogIndex
+from . import ccmtest
+
+
+class TestLogIndex(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.temp_dir.name, 'system.log')
+        self.index = LogIndex(self.log_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def append(self, text):
+        with open(self.log_file, 'a') as f:
+            f.write(text)
+            return f.tell()
+
+    def test_grep_is_incremental(self):
+        self.append('INFO 127.0.0.2 is now UP\nINFO nothing\n')
+        self.assertEqual([line for line, _ in self.index.grep('is now UP')], ['INFO 127.0.0.2 is now UP\n'])
+        end = self.index.indexed_offset()
+
+        self.append('INFO 127.0.0.3 is now UP\n')
+        self.assertEqual(len(self.index.grep('is now UP')), 2)
+        self.assertEqual(self.index.grep('is now UP', from_mark=end)[0][0], 'INFO 127.0.0.3 is now UP\n')
+
+    def test_matches_between_marks(self):
+        first = self.append('WARN one\n')
+        second = self.append('WARN two\n')
+        self.append('WARN three\n')
+        self.assertEqual([line for _, line, _ in self.index.matches_between('WARN', first, second)], ['WARN two\n'])
+        # a new expression registered after the file was indexed covers the whole file too
+        self.assertEqual([offset for offset, _, _ in self.index.matches_between('one|three')], [0, second])
+
+    def test_late_mark_before_indexed_range(self):
+        mark = self.append('ERROR early\n')
+        self.append('ERROR late\n')
+        self.assertEqual(len(self.index.grep('ERROR', from_mark=mark)), 1)
+        self.assertEqual(len(self.index.grep('ERROR')), 2)
+
+    def test_partial_line_is_matched_but_not_indexed(self):
+        self.append('INFO complete\nINFO partial')
+        self.assertEqual(len(self.index.grep('INFO')), 2)
+        self.append(' line\n')
+        self.assertEqual([line for line, _ in self.index.grep('INFO')], ['INFO complete\n', 'INFO partial line\n'])
+
+    def test_truncated_file_is_reindexed(self):
+        self.append('INFO old\n' * 10)
+        self.assertEqual(len(self.index.grep('old')), 10)
+        with open(self.log_file, 'w') as f:
+            f.write('INFO new\n')
+        self.assertEqual(self.index.grep('old'), [])
+        self.assertEqual(len(self.index.grep('new')), 1)
+
+    def test_mark_inside_a_line(self):
+        self.append('ERROR one\nWARN two ERROR three\nERROR four\n')
+        mark = len('ERROR one\nWARN two ')
+        self.assertEqual([line for line, _ in self.index.grep('ERROR', from_mark=mark)],
+                         ['ERROR three\n', 'ERROR four\n'])
+        self.assertEqual([line for line, _ in self.index.grep('WARN', from_mark=mark)], [])
+        self.assertEqual(len(self.index.grep('ERROR')), 3)
+
+    def test_only_offsets_are_kept(self):
+        self.append('INFO one\nINFO two\n')
+        self.index.grep('INFO')
+        entry, = self.index._patterns.values()
+        self.assertEqual(list(entry.offsets), [0, len('INFO one\n')])
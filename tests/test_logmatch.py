@@ -0,0 +1,64 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import re
+
+from ccmlib.logmatch import MultiPatternMatcher, required_literal
+from . import ccmtest
+
+
+class TestRequiredLiteral(ccmtest.Tester):
+
+    def assertLiteral(self, expr, literal):
+        self.assertEqual(required_literal(re.compile(expr)), literal)
+
+    def test_longest_literal_run(self):
+        self.assertLiteral('127.0.0.2:7000.* is now UP', ' is now UP')
+        self.assertLiteral(r'Starting listening for CQL clients', 'Starting listening for CQL clients')
+        self.assertLiteral(r'^(Node) \S+ state jump', ' state jump')
+        self.assertLiteral(r'(ab)?cd', 'cd')
+
+    def test_no_literal(self):
+        self.assertLiteral(r'\d+', None)
+        self.assertLiteral(r'foo|bar', None)
+        self.assertLiteral(r'(?i)listening', None)
+
+
+class TestMultiPatternMatcher(ccmtest.Tester):
+
+    def test_reports_every_pattern_matching_a_line(self):
+        matcher = MultiPatternMatcher(['127.0.0.2.* is now UP', 'is now', r'\d+ is', '127.0.0.3.* is now UP'])
+        self.assertEqual(matcher.match('INFO nothing to see here'), [])
+        found = matcher.match('INFO /127.0.0.2:7000 is now UP')
+        self.assertEqual([p.pattern for p, _ in found], ['127.0.0.2.* is now UP', 'is now', r'\d+ is'])
+        self.assertEqual([p.pattern for p in matcher.pending()], ['127.0.0.3.* is now UP'])
+        self.assertFalse(matcher.is_done())
+        self.assertEqual(matcher.match('INFO /127.0.0.2:7000 is now UP'), [])
+        self.assertEqual(len(matcher.match('INFO /127.0.0.3:7000 is now UP')), 1)
+        self.assertTrue(matcher.is_done())
+
+    def test_overlapping_literals(self):
+        matcher = MultiPatternMatcher(['12:7000', '2:7000'])
+        self.assertEqual(len(matcher.match('/127.0.0.12:7000')), 2)
+
+    def test_many_patterns(self):
+        exprs = ['127.0.{}.{}:7000.* is now UP'.format(i // 250, i % 250) for i in range(500)]
+        matcher = MultiPatternMatcher(exprs)
+        for i in reversed(range(500)):
+            line = 'INFO InetAddress /127.0.{}.{}:7000 is now UP'.format(i // 250, i % 250)
+            self.assertEqual([p.pattern for p, _ in matcher.match(line)], [exprs[i]])
+        self.assertTrue(matcher.is_done())
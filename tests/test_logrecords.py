@@ -0,0 +1,148 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import datetime
+
+from ccmlib import logarchive
+from ccmlib.logrecords import LogRecordIndex, mark_at, parse_header, parse_timestamp, seek_log_to, to_timestamp
+from . import ccmtest
+
+LOG = ("INFO  [main] 2023-03-01 10:00:00,100 CassandraDaemon.java:600 - Startup complete\n"
+       "WARN  [CompactionExecutor:1] 2023-03-01 10:00:01,200 CompactionTask.java:250 - Compacting large partition\n"
+       "ERROR [CompactionExecutor:1] 2023-03-01 10:00:02,300 CassandraDaemon.java:244 - Exception in thread\n"
+       "java.lang.RuntimeException: boom\n"
+       "\tat org.apache.cassandra.db.Foo.bar(Foo.java:1)\n"
+       "WARN  [CompactionExecutor:2] 2023-03-01 10:00:03,400 CompactionTask.java:250 - Compacting another one\n")
+
+
+class TestLogRecords(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.temp_dir.name, 'system.log')
+        with open(self.log_file, 'w') as f:
+            f.write(LOG)
+        self.index = LogRecordIndex(self.log_file, node='node1')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parse_header(self):
+        level, thread, timestamp, logger, line_number, message = parse_header(LOG.splitlines()[1])
+        self.assertEqual((level, thread, logger, line_number, message),
+                         ('WARN', 'CompactionExecutor:1', 'CompactionTask', 250, 'Compacting large partition'))
+        self.assertAlmostEqual(timestamp, to_timestamp(datetime(2023, 3, 1, 10, 0, 1, 200000)))
+        self.assertIsNone(parse_header('\tat org.apache.cassandra.db.Foo.bar(Foo.java:1)'))
+
+    def test_parse_timestamp_from_threads(self):
+        dates = ['2023-03-01 10:00:{:02d}'.format(second) for second in range(10)]
+        expected = dict((date, to_timestamp(datetime.strptime(date, '%Y-%m-%d %H:%M:%S'))) for date in dates)
+        wrong = []
+
+        def parse():
+            for _ in range(200):
+                for date in dates:
+                    if parse_timestamp(date) != expected[date]:
+                        wrong.append(date)
+
+        threads = [threading.Thread(target=parse) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(wrong, [])
+
+    def test_queries(self):
+        records = self.index.query(level='WARN', logger='CompactionTask', since=datetime(2023, 3, 1, 10, 0, 2))
+        self.assertEqual([r.message for r in records], ['Compacting another one'])
+        self.assertEqual(records[0].node, 'node1')
+
+        [error] = self.index.query(level=['ERROR'])
+        self.assertEqual(error.thread, 'CompactionExecutor:1')
+        self.assertEqual(error.continuation, ['java.lang.RuntimeException: boom',
+                                              '\tat org.apache.cassandra.db.Foo.bar(Foo.java:1)'])
+
+        self.assertEqual(self.index.query(thread='nope'), [])
+        self.assertEqual(len(self.index.query(thread='CompactionExecutor:1')), 2)
+
+    def test_incremental(self):
+        self.assertEqual(len(self.index.query()), 4)
+        mark = os.path.getsize(self.log_file)
+        with open(self.log_file, 'a') as f:
+            f.write("INFO  [main] 2023-03-01 10:00:05,000 StorageService.java:1 - Node is now part of the cluster\n")
+            f.write("DEBUG [main] 2023-03-01 10:00:06,000 Stor")
+        records = self.index.query(from_mark=mark)
+        self.assertEqual([r.logger for r in records], ['StorageService'])
+        self.assertEqual(len(self.index), 5)
+
+
+class TestSeekLogTo(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.temp_dir.name, 'system.log')
+        self.offsets = []
+        with open(self.log_file, 'w') as f:
+            for i in range(200):
+                self.offsets.append(f.tell())
+                f.write("INFO  [main] 2023-03-01 10:{:02d}:{:02d},000 Foo.java:1 - Event {}\n".format(i // 60, i % 60, i))
+                if i % 7 == 0:
+                    f.write("java.lang.RuntimeException: boom\n\tat Foo.bar(Foo.java:1)\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def seek(self, when):
+        with open(self.log_file, 'rb') as f:
+            offset = seek_log_to(f, when)
+            self.assertEqual(f.tell(), offset)
+            return offset
+
+    def test_finds_first_record_at_or_after(self):
+        for i in (0, 1, 7, 8, 99, 199):
+            self.assertEqual(self.seek(datetime(2023, 3, 1, 10, i // 60, i % 60)), self.offsets[i])
+        self.assertEqual(self.seek(to_timestamp(datetime(2023, 3, 1, 10, 0, 7)) - 0.5), self.offsets[7])
+
+    def test_bounds(self):
+        self.assertEqual(self.seek(datetime(2023, 2, 1)), 0)
+        self.assertEqual(self.seek(datetime(2023, 4, 1)), os.path.getsize(self.log_file))
+
+    def test_mark_at_searches_archives(self):
+        # logback moves the log into a zip and starts a new one
+        archive = self.log_file + '.1.zip'
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(self.log_file, 'system.log')
+        with open(self.log_file, 'w') as f:
+            f.write("INFO  [main] 2023-03-01 11:00:00,000 Foo.java:1 - After rotation\n")
+
+        mark = mark_at(self.log_file, datetime(2023, 3, 1, 10, 1, 40))
+        self.assertEqual(int(mark), self.offsets[100])
+        self.assertTrue(logarchive.was_rotated(self.log_file, mark))
+        self.assertEqual(logarchive.archives_since(self.log_file, mark), [(archive, self.offsets[100])])
+
+        mark = mark_at(self.log_file, datetime(2023, 3, 1, 10, 30))
+        self.assertEqual(int(mark), 0)
+        self.assertFalse(logarchive.was_rotated(self.log_file, mark))
+
+    def test_mark_at_missing_log(self):
+        mark = mark_at(os.path.join(self.temp_dir.name, 'debug.log'), datetime(2023, 3, 1))
+        self.assertIsInstance(mark, logarchive.LogMark)
+        self.assertEqual(int(mark), 0)
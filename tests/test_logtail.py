@@ -0,0 +1,183 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import patch
+
+from ccmlib import logtail
+from ccmlib.node import Node, TimeoutError, watch_logs_for
+from . import ccmtest
+
+
+def _append_later(path, text, delay):
+    def write():
+        time.sleep(delay)
+        with open(path, 'a') as f:
+            f.write(text)
+    t = threading.Thread(target=write)
+    t.start()
+    return t
+
+
+class TestFileChangeWaiter(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.temp_dir.name, 'system.log')
+        open(self.log_file, 'w').close()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_polling_waiter_sleeps(self):
+        with logtail.PollingWaiter([self.log_file]) as waiter:
+            start = time.time()
+            self.assertFalse(waiter.wait(0.2))
+            self.assertGreaterEqual(time.time() - start, 0.2)
+
+    @unittest.skipUnless(logtail.INOTIFY_IS_AVAILABLE, "inotify is not available")
+    def test_inotify_waiter_wakes_on_write(self):
+        with logtail.file_change_waiter([self.log_file]) as waiter:
+            writer = _append_later(self.log_file, 'INFO hello\n', 0.1)
+            start = time.time()
+            self.assertTrue(waiter.wait(5))
+            self.assertLess(time.time() - start, 2)
+            writer.join()
+
+    @unittest.skipUnless(logtail.INOTIFY_IS_AVAILABLE, "inotify is not available")
+    def test_inotify_waiter_ignores_other_files(self):
+        with logtail.file_change_waiter([self.log_file]) as waiter:
+            writer = _append_later(os.path.join(self.temp_dir.name, 'debug.log'), 'DEBUG hello\n', 0)
+            writer.join()
+            self.assertFalse(waiter.wait(0.2))
+
+
+class TestWatchLogFor(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.node = Node.__new__(Node)
+        self.node.name = 'node1'
+        self.log_directory = patch.object(Node, 'log_directory', return_value=self.temp_dir.name)
+        self.log_directory.start()
+        self.log_file = os.path.join(self.temp_dir.name, 'system.log')
+        with open(self.log_file, 'w') as f:
+            f.write('INFO first line\n')
+
+    def tearDown(self):
+        self.log_directory.stop()
+        self.temp_dir.cleanup()
+
+    def test_finds_existing_line(self):
+        line, m = self.node.watch_log_for('first (line)', timeout=5)
+        self.assertEqual(line, 'INFO first line\n')
+        self.assertEqual(m.group(1), 'line')
+
+    def test_finds_appended_lines(self):
+        writer = _append_later(self.log_file, 'INFO second\nINFO third\n', 0.1)
+        matchings = self.node.watch_log_for(['second', 'third'], from_mark=self.node.mark_log(), timeout=5)
+        writer.join()
+        self.assertEqual([line for line, _ in matchings], ['INFO second\n', 'INFO third\n'])
+
+    def test_times_out(self):
+        with self.assertRaises(TimeoutError):
+            self.node.watch_log_for('never', timeout=1)
+
+    def test_timeout_reports_bounded_capture(self):
+        with open(self.log_file, 'a') as f:
+            for i in range(100):
+                f.write('INFO line {}\n'.format(i))
+        with self.assertRaises(TimeoutError) as cm:
+            self.node.watch_log_for('never', timeout=1)
+        self.assertEqual(cm.exception.stats['lines_read'], 101)
+        self.assertEqual(cm.exception.stats['bytes_read'], os.path.getsize(self.log_file))
+        message = str(cm.exception)
+        self.assertIn('INFO first line', message)
+        self.assertIn('INFO line 99', message)
+        self.assertNotIn('INFO line 50\n', message)
+        self.assertIn('[... 76 lines ...]', message)
+
+
+class TestLogCapture(ccmtest.Tester):
+
+    def test_keeps_head_and_tail(self):
+        capture = logtail.LogCapture(head_lines=2, tail_lines=3)
+        for i in range(10):
+            capture.add('{}\n'.format(i))
+        self.assertEqual(capture.head, ['0\n', '1\n'])
+        self.assertEqual(list(capture.tail), ['7\n', '8\n', '9\n'])
+        self.assertEqual(capture.format(), '0\n1\n[... 5 lines ...]\n7\n8\n9\n')
+        self.assertEqual(capture.stats()['bytes_read'], 20)
+
+    def test_short_read_is_kept_whole(self):
+        capture = logtail.LogCapture(head_lines=2, tail_lines=3)
+        for i in range(4):
+            capture.add('{}\n'.format(i))
+        self.assertEqual(capture.format(), '0\n1\n2\n3\n')
+
+
+class _FakeNode(object):
+
+    def __init__(self, name, log_dir):
+        self.name = name
+        self._log_dir = log_dir
+
+    def log_directory(self):
+        return self._log_dir
+
+
+class TestWatchLogsFor(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.nodes = []
+        for i in range(1, 4):
+            log_dir = os.path.join(self.temp_dir.name, 'node{}'.format(i), 'logs')
+            os.makedirs(log_dir)
+            self.nodes.append(_FakeNode('node{}'.format(i), log_dir))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def log_file(self, node):
+        return os.path.join(node.log_directory(), 'system.log')
+
+    def test_resolves_all_expectations_together(self):
+        node1, node2, node3 = self.nodes
+        with open(self.log_file(node1), 'w') as f:
+            f.write('INFO /127.0.0.2:7000 is now UP\n')
+        writers = [_append_later(self.log_file(node1), 'INFO /127.0.0.3:7000 is now UP\n', 0.1),
+                   _append_later(self.log_file(node2), 'INFO /127.0.0.1:7000 is now UP\n', 0.2)]
+        matchings = watch_logs_for([(node1, ['127.0.0.2.* is now UP', '127.0.0.3.* is now UP'], None),
+                                    (node2, '127.0.0.1.* is now UP', None)], timeout=10)
+        for writer in writers:
+            writer.join()
+        self.assertEqual(len(matchings[0]), 2)
+        self.assertEqual(matchings[1][0][0], 'INFO /127.0.0.1:7000 is now UP\n')
+
+    def test_ignores_lines_before_mark(self):
+        node1 = self.nodes[0]
+        with open(self.log_file(node1), 'w') as f:
+            f.write('INFO /127.0.0.2:7000 is now UP\n')
+            mark = f.tell()
+        with self.assertRaisesRegex(TimeoutError, "node1: \\['127.0.0.2.\\* is now UP'\\]"):
+            watch_logs_for([(node1, ['127.0.0.2.* is now UP'], mark)], timeout=1)
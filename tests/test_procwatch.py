@@ -0,0 +1,197 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import patch
+
+from ccmlib import logtail, procwatch
+from ccmlib.node import Node, Status
+from . import ccmtest
+
+
+def _sleeper():
+    return subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+
+
+def _kill_later(process, delay):
+    t = threading.Timer(delay, process.kill)
+    t.start()
+    return t
+
+
+@unittest.skipIf(sys.platform.startswith('win'), "processes are not watched on Windows")
+class TestExitWatcher(ccmtest.Tester):
+
+    def test_wakes_on_exit(self):
+        process = _sleeper()
+        with procwatch.ExitWatcher(process.pid) as watcher:
+            self.assertFalse(watcher.wait(0.1))
+            _kill_later(process, 0.2)
+            start = time.time()
+            self.assertTrue(watcher.wait(30))
+            self.assertLess(time.time() - start, 5)
+        process.wait()
+
+    def test_reaps_children(self):
+        process = _sleeper()
+        with procwatch.ExitWatcher(process.pid, process) as watcher:
+            process.kill()
+            self.assertTrue(watcher.wait(30))
+        self.assertIsNotNone(process.returncode)
+
+    def test_zombies_are_dead(self):
+        process = _sleeper()
+        self.assertTrue(procwatch.is_alive(process.pid))
+        process.kill()
+        # not reaped: a zombie until process.wait()
+        while procwatch.is_alive(process.pid):
+            time.sleep(0.01)
+        start = time.time()
+        self.assertTrue(procwatch.wait_for_exit(process.pid, 30))
+        self.assertLess(time.time() - start, 1)
+        process.wait()
+
+    def test_wait_for_any_exit(self):
+        processes = [_sleeper(), _sleeper()]
+        watchers = [procwatch.ExitWatcher(p.pid) for p in processes]
+        try:
+            self.assertEqual(procwatch.wait_for_any_exit(watchers, 0.1), [])
+            _kill_later(processes[1], 0.1)
+            self.assertEqual(procwatch.wait_for_any_exit(watchers, 30), watchers[1:])
+        finally:
+            for process, watcher in zip(processes, watchers):
+                watcher.close()
+                process.kill()
+                process.wait()
+
+    @unittest.skipUnless(procwatch.PIDFD_IS_AVAILABLE and logtail.INOTIFY_IS_AVAILABLE, "pidfd or inotify is not available")
+    def test_log_waits_wake_on_exit(self):
+        process = _sleeper()
+        with tempfile.TemporaryDirectory() as directory, \
+                logtail.file_change_waiter([os.path.join(directory, 'system.log')]) as waiter, \
+                procwatch.ExitWatcher(process.pid) as watcher:
+            _kill_later(process, 0.1)
+            start = time.time()
+            self.assertFalse(waiter.wait(30, wake_fds=procwatch.exit_fds([watcher])))
+            self.assertLess(time.time() - start, 5)
+        process.wait()
+
+
+def _fake_cassandra(logdir):
+    return subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)',
+                             '-Dcassandra.logdir=' + logdir, procwatch.CASSANDRA_MAIN_CLASS])
+
+
+@unittest.skipIf(sys.platform.startswith('win'), "processes are not watched on Windows")
+class TestProcessScan(ccmtest.Tester):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            process.kill()
+            process.wait()
+        self.temp_dir.cleanup()
+
+    def _node(self, cluster, node, conf=True):
+        cluster_dir = os.path.join(self.temp_dir.name, cluster)
+        logdir = os.path.join(cluster_dir, node, 'logs')
+        os.makedirs(logdir)
+        if conf:
+            open(os.path.join(cluster_dir, 'cluster.conf'), 'w').close()
+        process = _fake_cassandra(logdir)
+        self.processes.append(process)
+        return process
+
+    def _wait_for_scan(self, count):
+        deadline = time.time() + 10
+        while True:
+            mine = [p for p in procwatch.cassandra_processes() if p.logdir.startswith(self.temp_dir.name)]
+            if len(mine) >= count or time.time() > deadline:
+                return mine
+            time.sleep(0.05)
+
+    def test_scan_and_kill(self):
+        node1 = self._node('test', 'node1')
+        node2 = self._node('test', 'node2')
+        processes = self._wait_for_scan(2)
+        self.assertEqual(sorted(p.pid for p in processes), sorted([node1.pid, node2.pid]))
+
+        logdir = os.path.join(self.temp_dir.name, 'test', 'node2', 'logs')
+        killed = procwatch.kill_processes([logdir], signal.SIGKILL, processes)
+        self.assertEqual([p.pid for p in killed], [node2.pid])
+        self.assertTrue(procwatch.wait_for_exit(node2.pid, 30, node2))
+        self.assertIsNone(node1.poll())
+
+    def test_orphans(self):
+        self._node('live', 'node1')
+        removed_cluster = self._node('removed', 'node1', conf=False)
+        removed_node = self._node('live', 'node2')
+        processes = self._wait_for_scan(3)
+        shutil.rmtree(os.path.join(self.temp_dir.name, 'live', 'node2'))
+        orphans = procwatch.orphaned_processes(self.temp_dir.name, processes)
+        self.assertEqual(sorted(p.pid for p in orphans), sorted([removed_cluster.pid, removed_node.pid]))
+
+
+@unittest.skipIf(sys.platform.startswith('win'), "processes are not watched on Windows")
+class TestWaitForRunning(ccmtest.Tester):
+
+    def _node(self, pid):
+        node = Node.__new__(Node)
+        node.name = 'node1'
+        node.pid = pid
+        node.status = Status.UNINITIALIZED
+        # node.conf is not written
+        node._update_config = lambda: None
+        return node
+
+    def _dead_pid(self):
+        process = _sleeper()
+        process.kill()
+        process.wait()
+        return process.pid
+
+    def test_stale_pid_of_a_previous_run(self):
+        # node.conf still holds the pid of a process that died outside ccm
+        node = self._node(self._dead_pid())
+        process = _sleeper()
+        try:
+            with patch.object(Node, '_update_pid', lambda self, p: setattr(self, 'pid', process.pid)):
+                self.assertTrue(node._wait_for_running(None, 5))
+            self.assertEqual(node.pid, process.pid)
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_started_process_exited(self):
+        node = self._node(None)
+        dead = self._dead_pid()
+        with patch.object(Node, '_update_pid', lambda self, p: setattr(self, 'pid', dead)):
+            start = time.time()
+            self.assertFalse(node._wait_for_running(None, 30))
+            self.assertLess(time.time() - start, 5)
@@ -0,0 +1,85 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from ccmlib import timeline
+from ccmlib.logrecords import parse_timestamp
+from . import ccmtest
+
+LOG = """\
+INFO  [main] 2023-03-01 10:00:01,000 CassandraDaemon.java:1 - Hostname: localhost
+INFO  [main] 2023-03-01 10:00:02,300 CommitLog.java:1 - Log replay complete, 0 replayed mutations
+INFO  [main] 2023-03-01 10:00:03,000 StorageService.java:1 - Starting up server gossip
+INFO  [main] 2023-03-01 10:00:04,500 StorageService.java:1 - JOINING: Starting to bootstrap...
+INFO  [main] 2023-03-01 10:00:09,000 StorageService.java:1 - Node /127.0.0.1 state jump to NORMAL
+INFO  [main] 2023-03-01 10:00:09,800 Server.java:1 - Starting listening for CQL clients on /127.0.0.1:9042
+"""
+
+
+class TestStartupTimeline(ccmtest.Tester):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.dir, 'system.log')
+        with open(self.log_file, 'w') as f:
+            f.write(LOG)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _timeline(self):
+        t = timeline.StartupTimeline('node1', self.log_file, cassandra_version='4.1')
+        t.record(timeline.SPAWNED, parse_timestamp('2023-03-01 10:00:00'))
+        return t
+
+    def test_read_log(self):
+        t = self._timeline().read_log()
+        self.assertEqual([timeline.SPAWNED, timeline.FIRST_LOG_LINE, 'commitlog_replayed', 'gossip_started',
+                          'joining_ring', 'normal', 'cql_listening'], list(t.phases))
+        self.assertAlmostEqual(1.0, t.elapsed(timeline.FIRST_LOG_LINE), places=3)
+        self.assertAlmostEqual(2.3, t.elapsed('commitlog_replayed'), places=3)
+        self.assertAlmostEqual(9.8, t.elapsed('cql_listening'), places=3)
+        self.assertIsNone(t.elapsed(timeline.BINARY_READY))
+
+    def test_record_keeps_first(self):
+        t = timeline.StartupTimeline('node1', self.log_file)
+        before = time.time()
+        t.record(timeline.SPAWNED)
+        t.record(timeline.SPAWNED, before + 100)
+        self.assertLess(t.phases[timeline.SPAWNED], before + 100 + t._offset)
+
+    def test_save(self):
+        t = self._timeline()
+        t.record(timeline.BINARY_READY, parse_timestamp('2023-03-01 10:00:09', '900'))
+        t.record(timeline.PID_VISIBLE, parse_timestamp('2023-03-01 10:00:00', '200'))
+        path = os.path.join(self.dir, timeline.TIMELINE_FILE)
+        t.read_log().save(path)
+        with open(path) as f:
+            saved = json.load(f)
+        self.assertEqual('node1', saved['node'])
+        self.assertEqual('4.1', saved['cassandra_version'])
+        phases = [phase['phase'] for phase in saved['phases']]
+        self.assertEqual([timeline.SPAWNED, timeline.PID_VISIBLE, timeline.FIRST_LOG_LINE, 'commitlog_replayed',
+                          'gossip_started', 'joining_ring', 'normal', 'cql_listening', timeline.BINARY_READY], phases)
+        elapsed = [phase['elapsed'] for phase in saved['phases']]
+        self.assertEqual(sorted(elapsed), elapsed)
+        self.assertAlmostEqual(9.9, elapsed[-1], places=3)